@@ -25,6 +25,17 @@ Pyknx is a package that is aimed at providing basic functionality related to com
 
 linknx.py: common module that implements the communication with a linknx server. With this module, one can retrieve linknx objects, read or write their value, read linknx configuration, ...
 communicator.py: this module contains the Communicator daemon, whose purpose is to receive events from linknx, through ioports.  It is then easy to write callbacks to react to object modifications. Additional scripts based on pyknx are provided (see below) in order to make this bidirectional communication with linknx just a few keystrokes away from now!
+eventstorm.py: this module implements a load generator that sends linknx-style events to a communicator and reports how many it absorbed.
+history.py: this module implements ring buffers of past object values, with window statistics, rate of change and resampling. NumPy is used when installed.
+journal.py: this module implements the communicator's event journal, which records received messages and can replay them later.
+metrics.py: this module collects latency histograms and counters of user callbacks and linknx requests, and can serve them in the Prometheus format.
+cli.py: this module implements the "python3 -m pyknx" entry point, which dispatches to the client commands and imports only what they need.
+clientdaemon.py: this module implements a resident daemon that serves the client scripts over a local Unix socket, with a warm connection to linknx.
+diagnostics.py: this module implements a watchdog for slow user callbacks and an on-demand callback profiler.
+framing.py: this module implements the binary frames the communicator accepts next to linknx text messages, for batches of calls with typed arguments.
+snapshot.py: this module implements snapshots of object values, saved to compact files and restored with batched writes.
+rpc.py: this module implements the request/response channel used to call user functions of the communicator and get their results back.
+writescheduler.py: this module implements the optional queue that sends object writes and actions to linknx within KNX bus rate limits, by priority, coalescing pending writes of the same object.
 logger.py: internal module that provides logging functionality for the package.
 tcpsocket.py: an internal module that implements common functionality related to socket communication. The end-user is unlikely to use this module directly.
 """
@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2012-2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+"""
+Single entry point for the command line clients, run with "python3 -m pyknx COMMAND [ARGS]".
+
+Only the module that implements the requested command is imported, so that starting the command costs as little as possible.
+"""
+
+import sys
+
+# Key is command name, value is a tuple (request type of pyknx.client, description).
+COMMANDS = {
+    'read' : ('read', 'Read object values from linknx.'),
+    'write' : ('write', 'Write an object value to linknx.'),
+    'execute' : ('execute', 'Execute an action defined by a XML string. The action is read from standard input unless the --action option is set.'),
+    'batch' : ('batch', 'Execute many read, write or execute commands, one per line, with a single connection to linknx.'),
+    'snapshot' : ('snapshot', 'Save object values to a snapshot file with a single read request.'),
+    'restore' : ('restore', 'Write the values of a snapshot file back to linknx with batched writes.'),
+}
+
+def printUsage(output):
+    output.write('usage: python3 -m pyknx COMMAND [ARGS]\n\ncommands:\n')
+    for command in sorted(COMMANDS):
+        output.write('  {0:<10}{1}\n'.format(command, COMMANDS[command][1]))
+    output.write('\nRun "python3 -m pyknx COMMAND --help" for help on a command.\n')
+
+def main(argv=None):
+    if argv is None: argv = sys.argv[1:]
+    if not argv or argv[0] in ('-h', '--help'):
+        printUsage(sys.stdout if argv else sys.stderr)
+        return 0 if argv else 2
+
+    command = argv[0]
+    if command not in COMMANDS:
+        sys.stderr.write('Unknown command "{0}".\n'.format(command))
+        printUsage(sys.stderr)
+        return 2
+
+    requestType, description = COMMANDS[command]
+    from pyknx import client
+    client.handleRequest(requestType, description, argv[1:], prog='pyknx {0}'.format(command))
+    return 0
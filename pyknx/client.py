@@ -21,22 +21,31 @@
 # knx at aminate dot net
 
 """
-Module that implements functionality common to all client scripts (pyknxread, pyknxwrite, pyknxexecute).
+Module that implements functionality common to all client scripts (pyknxread, pyknxwrite, pyknxexecute, pyknxbatch, pyknxsnapshot, pyknxrestore).
 """
 
 import sys
 import argparse
-import traceback
-import logging
-from xml.dom.minidom import parseString
-from threading import *
 from pyknx import logger
-from pyknx.linknx import *
+from pyknx.clientdaemon import DaemonClient, DaemonError
 
-def handleRequest(requestType, doc):
-    logger.initLogger(None, logging.INFO, usesDetailedLogging=False)
+OUTPUT_FORMATS = ('table', 'json', 'jsonl', 'csv', 'tsv')
 
-    parser = argparse.ArgumentParser(description=doc)
+# pyknx.linknx is only imported when connecting to linknx directly: the
+# client daemon path does not need it and it is the most expensive import of
+# the package.
+
+def handleRequest(requestType, doc, argv=None, prog=None):
+    """
+    Parse the command line and process a client request.
+
+    requestType -- One of 'read', 'write', 'execute', 'batch', 'snapshot' or 'restore'.
+    doc -- Description of the command, displayed by --help.
+    argv -- Command line arguments. Defaults to sys.argv[1:].
+    prog -- Name of the command in usage messages. Defaults to the name of the script.
+
+    """
+    parser = argparse.ArgumentParser(description=doc, prog=prog)
     parser.add_argument('-s', '--server', dest='host', help='Hostname of the machine running the linknx daemon. Default is localhost.', default='localhost')
     parser.add_argument('-p', '--port', dest='port', help='Port linknx listens on. Default is 1028.', default=1028)
     if requestType == 'read':
@@ -44,21 +53,56 @@ def handleRequest(requestType, doc):
         parser.add_argument('-R', '--regex', action='store_true', help='ID in the "object" argument is interpreted as a regex and used to find objects to read. The pattern must comply with the \'re\' python module.')
         parser.add_argument('--value-only', action='store_true', help='Output the value of the queried object but do not prefix it with the object\'s id.')
         parser.add_argument('--expected-value', help='Expected value of the object. This script will exit with a non-zero return code if the value is not the expected one. This is useful when using this script in a "if" test of a shell script.')
+        parser.add_argument('--format', dest='outputFormat', help='output format. "table" (default) outputs objects sorted by id with values aligned on a column. The other formats output objects as soon as they are read, in the order of linknx\'s answer: "json" outputs a single object that maps ids to values, "jsonl" outputs a line {"id": ..., "value": ...} per object, "csv" and "tsv" output a header line followed by a line per object.', choices=OUTPUT_FORMATS, default='table')
+        parser.add_argument('--watch', help='keep reading the objects every SECONDS (2 if omitted) until interrupted and output a JSON line {"time": ..., "id": ..., "value": ...} for each object whose value has changed. All values are output on the first read. The interval stretches while nothing changes or when linknx is slow to answer. Cannot be combined with --format, --value-only or --expected-value.', metavar='SECONDS', nargs='?', type=float, const=2.0)
     elif requestType == 'write':
         parser.add_argument('object', help='ID represents the identifier of the object to write to.', metavar='ID')
         parser.add_argument('value', help='Assigns VALUE to the object identified by ID.', metavar='VALUE')
     elif requestType == 'execute':
         parser.add_argument('--action', help='use the ACTION string as the XML representation of the action to execute rather than reading it from standard input.', metavar='ACTION')
+    elif requestType == 'batch':
+        parser.add_argument('-f', '--file', dest='batchFile', help='read commands from FILE rather than from standard input.', metavar='FILE')
+        parser.add_argument('--batch-size', dest='batchSize', help='maximum number of consecutive objects read with a single request. Default is 1000.', metavar='SIZE', type=int, default=1000)
+    elif requestType == 'snapshot':
+        parser.add_argument('snapshotFile', help='write the snapshot to FILE. The file is gzipped if its name ends with ".gz".', metavar='FILE')
+        parser.add_argument('objectIds', help='ID represents the identifier of an object to save. All objects are saved if no ID is given.', metavar='ID', nargs='*')
+        parser.add_argument('-R', '--regex', action='store_true', help='ID arguments are interpreted as regexes and used to find objects to save. The patterns must comply with the \'re\' python module.')
+    elif requestType == 'restore':
+        parser.add_argument('snapshotFile', help='restore the snapshot saved in FILE.', metavar='FILE')
+        parser.add_argument('--chunk-size', dest='chunkSize', help='maximum number of objects written with a single request. Default is 100.', metavar='SIZE', type=int, default=100)
+        parser.add_argument('--type', dest='typeCategories', help='only restore objects of this type category. Can be repeated.', choices=['bool', 'int', 'float', 'string', 'time', 'date'], action='append', default=None)
+        parser.add_argument('--flags', help='only restore objects that have all these flags, e.g. "w".', metavar='FLAGS', default=None)
+        parser.add_argument('--force', dest='skipsUnchanged', action='store_false', help='write all objects, even those whose current value already equals the snapshot value.')
     else:
         raise Exception('Unsupported request type "{0}".'.format(requestType))
     parser.add_argument('-v', '--verbose', dest='verbosityLevel', help='Set verbosity level. Default is "error".', metavar='LEVEL', choices=[l.lower() for l in logger.getLevelsToString()], default='error')
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if requestType == 'read' and args.value_only and args.outputFormat != 'table':
+        parser.error('--value-only is only supported with the table format.')
+    if requestType == 'read' and args.watch is not None and (args.outputFormat != 'table' or args.value_only or args.expected_value is not None):
+        parser.error('--watch always outputs JSON lines and cannot be combined with --format, --value-only or --expected-value.')
 
     # Configure logger.
     logger.initLogger(None, args.verbosityLevel.upper())
 
+    # Forward the request to the client daemon if one is running for this
+    # linknx instance. It saves connecting and reading the configuration.
+    if requestType in ('read', 'write', 'execute'):
+        daemonClient = DaemonClient.tryConnect(args.host, int(args.port))
+        if daemonClient is not None:
+            try:
+                handleRequestWithDaemon(requestType, args, daemonClient)
+            except (DaemonError, OSError) as e:
+                logger.reportError('Client daemon request failed: {0}'.format(e))
+                sys.exit(3)
+            finally:
+                daemonClient.close()
+            return
+
     # Start linknx.
-    linknx = Linknx(args.host, int(args.port))
+    from pyknx.linknx import Linknx
+    usesPersistentConnection = requestType in ('batch', 'restore') or (requestType == 'read' and args.watch)
+    linknx = Linknx(args.host, int(args.port), usesPersistentConnection=usesPersistentConnection)
     try:
         if requestType == 'read':
             objects = linknx.getObjects(objectIds=args.objectIds) if not args.regex else linknx.getObjects(patterns=args.objectIds)
@@ -68,29 +112,18 @@ def handleRequest(requestType, doc):
                 logger.reportWarning('No such object.')
                 sys.exit(10)
 
-            # Count tabs to align columns.
-            report = objects.getValues()
-            longestId = max([len(obj) for obj in report.keys()])
-            succeeds = True
-            for o in sorted(report):
-                v = report[o]
-                spaceCount = longestId - len(o)
-                spaces=''
-                while spaceCount > 0:
-                    spaces+=' '
-                    spaceCount -= 1
-                if args.value_only:
-                    print('{0}'.format(v))
-                else:
-                    print('{0} {2} {1}'.format(o, v, spaces))
-
-                if args.expected_value != None:
-                    obj = linknx.getObject(o)
-                    convertedExpectedValue = obj.convertValueToString(args.expected_value)
-                    convertedObjectValue = obj.convertValueToString(v)
-                    succeeds = succeeds and convertedExpectedValue == convertedObjectValue
-
-            if not succeeds: exit(100)
+            if args.watch:
+                watchValues(objects.getValues, args.watch)
+                linknx.close()
+                return
+
+            rows = objects.iterValues()
+            mismatchingIds = []
+            if args.expected_value != None:
+                rows = checkValues(rows, objects, args.expected_value, mismatchingIds)
+            writeValues(rows, args.outputFormat, valueOnly=args.value_only)
+
+            if mismatchingIds: exit(100)
 
         elif requestType == 'write':
             linknx.getObject(args.object).value = args.value
@@ -100,9 +133,247 @@ def handleRequest(requestType, doc):
             else:
                 action = args.action
             linknx.executeAction(action)
+        elif requestType == 'batch':
+            if args.batchFile is None:
+                succeeds = runBatch(linknx, sys.stdin, args.batchSize)
+            else:
+                with open(args.batchFile, 'r') as batchFile:
+                    succeeds = runBatch(linknx, batchFile, args.batchSize)
+            linknx.close()
+            if not succeeds: sys.exit(3)
+        elif requestType == 'snapshot':
+            if args.regex:
+                snapshot = linknx.takeSnapshot(patterns=args.objectIds)
+            else:
+                snapshot = linknx.takeSnapshot(objectIds=args.objectIds if args.objectIds else None)
+            if not snapshot:
+                logger.reportWarning('No such object.')
+                sys.exit(10)
+            snapshot.save(args.snapshotFile)
+            print('Saved {0} objects to {1}.'.format(len(snapshot), args.snapshotFile))
+        elif requestType == 'restore':
+            from pyknx.snapshot import Snapshot
+            report = linknx.restoreSnapshot(Snapshot.load(args.snapshotFile), args.chunkSize, args.typeCategories, args.flags, args.skipsUnchanged)
+            linknx.close()
+            print('Restored {0}: {1}.'.format(args.snapshotFile, report))
+            if not report.succeeds: sys.exit(3)
         else:
             raise Exception('Unsupported request type.')
 
     except Exception as e:
         logger.reportException()
         sys.exit(3)
+
+def handleRequestWithDaemon(requestType, args, daemonClient):
+    """ Process a read, write or execute request through the client daemon. """
+    if requestType == 'read' and args.watch:
+        if not watchValues(lambda: dict(daemonClient.read(args.objectIds, args.regex)[0]), args.watch):
+            sys.exit(10)
+    elif requestType == 'read':
+        values, succeeds = daemonClient.read(args.objectIds, args.regex, args.expected_value)
+        if not values:
+            logger.reportWarning('No such object.')
+            sys.exit(10)
+        writeValues(values, args.outputFormat, valueOnly=args.value_only)
+        if not succeeds: exit(100)
+    elif requestType == 'write':
+        daemonClient.write(args.object, args.value)
+    elif requestType == 'execute':
+        if args.action == None:
+            action = ''.join(sys.stdin.readlines())
+        else:
+            action = args.action
+        daemonClient.execute(action)
+
+def writeValues(rows, outputFormat='table', output=None, valueOnly=False):
+    """
+    Output object values.
+
+    rows -- Iterable of tuples (object id, value).
+    outputFormat -- One of OUTPUT_FORMATS. With 'table', rows are sorted by id and values are aligned on a column. Other formats write rows as they come.
+    output -- File to write to. Default is the standard output.
+    valueOnly -- With the table format, output values only.
+
+    """
+    if output is None: output = sys.stdout
+    if outputFormat == 'table':
+        report = dict(rows)
+        longestId = max([len(o) for o in report]) if report else 0
+        for o in sorted(report):
+            if valueOnly:
+                output.write('{0}\n'.format(report[o]))
+            else:
+                output.write('{0} {1} {2}\n'.format(o, ' ' * (longestId - len(o)), report[o]))
+    elif outputFormat == 'json':
+        import json
+        separator = ''
+        output.write('{')
+        for objectId, value in rows:
+            output.write('{0}\n  {1}: {2}'.format(separator, json.dumps(objectId), json.dumps(value)))
+            separator = ','
+        output.write('\n}\n')
+    elif outputFormat == 'jsonl':
+        import json
+        for objectId, value in rows:
+            output.write(json.dumps({'id' : objectId, 'value' : value}) + '\n')
+    elif outputFormat in ('csv', 'tsv'):
+        import csv
+        writer = csv.writer(output, delimiter=',' if outputFormat == 'csv' else '\t', lineterminator='\n')
+        writer.writerow(('id', 'value'))
+        for row in rows:
+            writer.writerow(row)
+    else:
+        raise Exception('Unsupported output format "{0}".'.format(outputFormat))
+    output.flush()
+
+def checkValues(rows, objects, expectedValue, mismatchingIds):
+    """
+    Generator that passes rows through while comparing values to an expected value.
+
+    rows -- Iterable of tuples (object id, value).
+    objects -- The objects the rows are about.
+    expectedValue -- The value to compare to. It is converted once per type of object.
+    mismatchingIds -- List to which ids of objects whose value differs from the expected value are appended.
+
+    """
+    objectsById = dict((obj.id, obj) for obj in objects)
+    convertedExpectedValues = {} # Key is type category, value is the converted expected value.
+    for objectId, value in rows:
+        obj = objectsById[objectId]
+        convertedExpectedValue = convertedExpectedValues.get(obj.typeCategory)
+        if convertedExpectedValue is None:
+            convertedExpectedValue = obj.convertValueToString(expectedValue)
+            convertedExpectedValues[obj.typeCategory] = convertedExpectedValue
+        if obj.convertValueToString(value) != convertedExpectedValue:
+            mismatchingIds.append(objectId)
+        yield objectId, value
+
+def watchValues(readValues, interval, output=None, maxInterval=None, roundCount=None):
+    """
+    Periodically read object values and output those that have changed, as JSON lines.
+
+    readValues -- Function that reads all watched objects at once and returns a dictionary with object ids as keys and values as values.
+    interval -- Nominal time between two reads, in seconds.
+    output -- File to write to. Default is the standard output.
+    maxInterval -- Upper bound of the interval. While values do not change, the interval grows up to this bound. Default is 8 times the nominal interval.
+    roundCount -- Number of reads to perform before returning. Default is to watch until interrupted.
+    Reads are scheduled so that at most half of the time is spent waiting for linknx. Failed reads are reported and retried on next round.
+    Returns False if there is no object to watch, True otherwise.
+
+    """
+    import json
+    import time
+    if output is None: output = sys.stdout
+    if maxInterval is None: maxInterval = interval * 8
+    previousValues = None
+    currentInterval = interval
+    roundIndex = 0
+    try:
+        while roundCount is None or roundIndex < roundCount:
+            roundIndex += 1
+            startTime = time.monotonic()
+            try:
+                values = readValues()
+            except Exception as e:
+                logger.reportWarning('Failed to read objects: {0}'.format(e))
+                values = None
+            readDuration = time.monotonic() - startTime
+
+            if values is not None:
+                if previousValues is None and not values:
+                    logger.reportWarning('No such object.')
+                    return False
+                now = time.time()
+                hasChanged = False
+                for objectId in sorted(values):
+                    value = values[objectId]
+                    if previousValues is None or previousValues.get(objectId) != value:
+                        output.write(json.dumps({'time' : round(now, 3), 'id' : objectId, 'value' : value}) + '\n')
+                        hasChanged = True
+                output.flush()
+                previousValues = values
+
+                # Come back to the nominal pace as soon as something moves,
+                # slow down progressively otherwise.
+                currentInterval = interval if hasChanged else min(currentInterval * 1.5, maxInterval)
+
+            # Do not keep linknx busy more than half of the time.
+            currentInterval = max(currentInterval, 2 * readDuration)
+            if roundCount is None or roundIndex < roundCount:
+                time.sleep(max(0, startTime + currentInterval - time.monotonic()))
+    except KeyboardInterrupt:
+        pass
+    return True
+
+def runBatch(linknx, commandLines, batchSize=1000, output=None):
+    """
+    Execute a sequence of commands, one per line, using a single connection to linknx.
+
+    Supported commands are:
+        read ID [ID [...]]      outputs a line "ID<TAB>VALUE" per object.
+        write ID VALUE          assigns VALUE to the object.
+        execute ACTION          executes the XML action written on the rest of the line.
+    Identifiers and values that contain whitespaces must be quoted. Empty lines and lines starting with # are ignored.
+    Consecutive reads are gathered into a single request to linknx. Results are written as soon as they are available.
+    Failing commands are reported and do not stop the batch.
+    Returns True if all commands succeeded.
+
+    """
+    import shlex
+    from pyknx.linknx import ObjectCollection
+    if output is None: output = sys.stdout
+    succeeds = True
+    pendingReads = [] # List of tuples (line number, object id).
+
+    def flushReads():
+        nonlocal succeeds
+        if not pendingReads: return
+        try:
+            objects = ObjectCollection(linknx, set([objectId for lineNumber, objectId in pendingReads]))
+            values = objects.getValues()
+            for lineNumber, objectId in pendingReads:
+                output.write('{0}\t{1}\n'.format(objectId, values[objectId]))
+            output.flush()
+        except Exception as e:
+            # Read objects one by one to isolate the faulty ones.
+            for lineNumber, objectId in pendingReads:
+                try:
+                    output.write('{0}\t{1}\n'.format(objectId, linknx.getObject(objectId).value))
+                except Exception as e:
+                    logger.reportError('Line {0}: failed to read {1}: {2}'.format(lineNumber, objectId, e))
+                    succeeds = False
+            output.flush()
+        del pendingReads[:]
+
+    lineNumber = 0
+    for line in commandLines:
+        lineNumber += 1
+        line = line.strip()
+        if not line or line.startswith('#'): continue
+        command, sep, remainder = line.partition(' ')
+        remainder = remainder.strip()
+        try:
+            if command == 'read':
+                for objectId in shlex.split(remainder):
+                    pendingReads.append((lineNumber, objectId))
+                if len(pendingReads) >= batchSize:
+                    flushReads()
+                continue
+
+            # Preserve ordering between reads and other commands.
+            flushReads()
+            if command == 'write':
+                tokens = shlex.split(remainder)
+                if len(tokens) != 2:
+                    raise Exception('Expecting an object id and a value.')
+                linknx.getObject(tokens[0]).value = tokens[1]
+            elif command == 'execute':
+                linknx.executeAction(remainder, waitsForAnswer=True)
+            else:
+                raise Exception('Unknown command "{0}".'.format(command))
+        except Exception as e:
+            logger.reportError('Line {0}: {1}'.format(lineNumber, e))
+            succeeds = False
+    flushReads()
+
+    return succeeds
@@ -0,0 +1,279 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2012-2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+"""
+Resident client daemon.
+
+The daemon keeps a Linknx instance, its parsed configuration and a persistent connection to linknx warm, and serves requests
+from the client scripts (pyknxread, pyknxwrite, pyknxexecute) over a local Unix socket. When the daemon is running,
+these scripts forward their request to it rather than connecting to linknx themselves.
+
+Requests and answers are JSON objects, one per line. Several requests can be sent over the same connection. Supported requests are:
+    {"command": "read", "objectIds": [...], "regex": false, "expectedValue": null}
+    {"command": "write", "objectId": "...", "value": "..."}
+    {"command": "execute", "action": "<action .../>"}
+    {"command": "reload"}
+Answers hold a "status" member which is either "success" or "error". Errors are described by the "error" member.
+"""
+
+import os
+import stat
+import json
+import struct
+import socket
+import logging
+from pyknx import logger
+
+def getDefaultSocketDirectory():
+    """ Return the directory of daemon sockets: $PYKNX_DAEMON_DIR if set, $XDG_RUNTIME_DIR if set, a directory private to the current user in /tmp otherwise. """
+    directory = os.environ.get('PYKNX_DAEMON_DIR') or os.environ.get('XDG_RUNTIME_DIR')
+    if directory:
+        return directory
+    return os.path.join('/tmp', 'pyknx-{0}'.format(os.getuid()))
+
+def getDefaultSocketPath(linknxHost='localhost', linknxPort=1028):
+    """ Return the path of the Unix socket of the daemon connected to the given linknx instance. """
+    return os.path.join(getDefaultSocketDirectory(), 'pyknxclientdaemon-{0}-{1}-{2}.sock'.format(os.getuid(), linknxHost, linknxPort))
+
+def _checkSocketDirectory(directory):
+    """ Create directory, private to the current user, if it does not exist and raise if other users could replace the sockets it contains. """
+    if not os.path.isdir(directory):
+        os.makedirs(directory, 0o700)
+    status = os.stat(directory)
+    if status.st_uid not in (os.getuid(), 0):
+        raise Exception('{0} belongs to another user, refusing to create the daemon socket in it.'.format(directory))
+    if status.st_mode & stat.S_IWOTH and not status.st_mode & stat.S_ISVTX:
+        raise Exception('{0} is writable by other users, refusing to create the daemon socket in it.'.format(directory))
+
+class DaemonError(Exception):
+    """ The daemon has processed the request but could not complete it. """
+    pass
+
+class DaemonClient(object):
+    """ Connection to a running client daemon. """
+    def __init__(self, socketPath, timeout=70):
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        self._socket.connect(socketPath)
+        self._file = self._socket.makefile('rwb')
+
+    @staticmethod
+    def tryConnect(linknxHost='localhost', linknxPort=1028, socketPath=None):
+        """ Return a DaemonClient if a daemon is listening for the given linknx instance, None otherwise. """
+        if socketPath is None:
+            socketPath = getDefaultSocketPath(linknxHost, linknxPort)
+        try:
+            status = os.lstat(socketPath)
+        except OSError:
+            return None
+
+        # Only trust a daemon run by the current user, since the daemon
+        # answers with object values.
+        if not stat.S_ISSOCK(status.st_mode) or status.st_uid != os.getuid():
+            logger.reportWarning('Ignoring {0}, which is not a socket of the current user.'.format(socketPath))
+            return None
+        try:
+            client = DaemonClient(socketPath)
+        except OSError:
+            logger.reportDebug('No daemon listening on {0}, falling back to direct mode.'.format(socketPath))
+            return None
+        if hasattr(socket, 'SO_PEERCRED'):
+            pid, uid, gid = struct.unpack('3i', client._socket.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i')))
+            if uid != os.getuid():
+                logger.reportWarning('Ignoring daemon on {0}, which is run by user {1}.'.format(socketPath, uid))
+                client.close()
+                return None
+        return client
+
+    def request(self, command, **arguments):
+        """ Send a request and return the answer as a dictionary. Raises DaemonError if the daemon reports an error. """
+        arguments['command'] = command
+        self._file.write(json.dumps(arguments).encode('utf8') + b'\n')
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionResetError('Connection closed by the client daemon.')
+        answer = json.loads(line.decode('utf8'))
+        if answer.get('status') != 'success':
+            raise DaemonError(answer.get('error'))
+        return answer
+
+    def read(self, objectIds, regex=False, expectedValue=None):
+        """ Return a tuple (values, matches) where values is a list of [objectId, value] sorted by id and matches tells whether all values equal expectedValue. """
+        answer = self.request('read', objectIds=objectIds, regex=regex, expectedValue=expectedValue)
+        return answer['values'], answer.get('matchesExpectedValue', True)
+
+    def write(self, objectId, value):
+        self.request('write', objectId=objectId, value=value)
+
+    def execute(self, action):
+        self.request('execute', action=action)
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+class ClientDaemon(object):
+    """ The daemon itself. """
+    def __init__(self, linknx, socketPath=None):
+        """
+        Initialize the daemon.
+
+        linknx -- The Linknx instance to forward requests to. It should use a persistent connection.
+        socketPath -- Path of the Unix socket to listen on. Defaults to getDefaultSocketPath() for this linknx instance.
+
+        """
+        self._linknx = linknx
+        self._socketPath = socketPath if socketPath else getDefaultSocketPath(linknx.host, linknx.port)
+        self._server = None
+
+    @property
+    def socketPath(self):
+        return self._socketPath
+
+    @staticmethod
+    def run(linknxAddress, socketPath=None, verbosityLevel=logging.INFO, logFile=None, daemonizes=False, pidFile=None):
+        """ Start a daemon connected to linknxAddress, a tuple (hostname, port), and serve requests until SIGINT or SIGTERM is caught. """
+        import signal
+        from threading import Thread
+        from pyknx.linknx import Linknx
+
+        def signal_handler(signal, frame):
+            logger.reportInfo('Terminating...')
+            # shutdown() waits for the serving loop, which runs in this very
+            # thread.
+            Thread(target=daemon.shutdown).start()
+
+        # Init logger.
+        if not logFile is None:
+            logger.initLogger((logFile, verbosityLevel), None)
+        else:
+            logger.initLogger(None, verbosityLevel)
+
+        # Fork if requested.
+        if daemonizes:
+            pid = os.fork()
+        else:
+            pid = os.getpid()
+
+        if pid != 0 and pidFile != None:
+            with open(pidFile, 'w') as f:
+                f.write(str(pid))
+
+        # If we are in the parent process (when forking), there is nothing left
+        # to do. The daemon should run in the child process.
+        if pid != 0 and daemonizes:
+            return
+
+        linknx = Linknx(linknxAddress[0], int(linknxAddress[1]), usesPersistentConnection=True)
+        daemon = ClientDaemon(linknx, socketPath)
+        signal.signal(signal.SIGINT, signal_handler)
+        signal.signal(signal.SIGTERM, signal_handler)
+
+        # Warm the configuration up so that the first request is as fast as
+        # the next ones.
+        try:
+            linknx.objectConfig
+        except Exception as e:
+            logger.reportWarning('Could not read linknx configuration, will retry on first request: {0}'.format(e))
+
+        try:
+            daemon.serveForever()
+        finally:
+            linknx.close()
+            if pidFile != None and os.path.exists(pidFile):
+                os.remove(pidFile)
+
+    def serveForever(self):
+        """ Listen for requests until shutdown() is called. """
+        import socketserver
+        daemon = self
+
+        class RequestHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    answer = daemon.handleRequest(line.decode('utf8'))
+                    self.wfile.write(json.dumps(answer).encode('utf8') + b'\n')
+                    self.wfile.flush()
+
+        _checkSocketDirectory(os.path.dirname(os.path.abspath(self._socketPath)))
+        if os.path.exists(self._socketPath):
+            os.remove(self._socketPath)
+
+        # Create the socket with restricted permissions right away rather than
+        # changing them after bind().
+        previousUmask = os.umask(0o177)
+        try:
+            self._server = socketserver.ThreadingUnixStreamServer(self._socketPath, RequestHandler)
+        finally:
+            os.umask(previousUmask)
+        self._server.daemon_threads = True
+        logger.reportInfo('Client daemon listening on {0}'.format(self._socketPath))
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if os.path.exists(self._socketPath):
+                os.remove(self._socketPath)
+            logger.reportInfo('Client daemon stopped.')
+
+    def shutdown(self):
+        if self._server:
+            self._server.shutdown()
+
+    def handleRequest(self, line):
+        """ Process a JSON request and return the answer as a dictionary. """
+        try:
+            request = json.loads(line)
+            command = request.get('command')
+            logger.reportDebug('Client daemon request: {0}'.format(request))
+            if command == 'read':
+                return self._read(request)
+            elif command == 'write':
+                self._linknx.getObject(request['objectId']).value = request['value']
+            elif command == 'execute':
+                self._linknx.executeAction(request['action'], waitsForAnswer=True)
+            elif command == 'reload':
+                self._linknx.clearCache()
+            else:
+                raise Exception('Unsupported command "{0}".'.format(command))
+            return {'status' : 'success'}
+        except Exception as e:
+            logger.reportException('Client daemon request failed.')
+            return {'status' : 'error', 'error' : str(e)}
+
+    def _read(self, request):
+        from pyknx.client import checkValues
+        if request.get('regex'):
+            objects = self._linknx.getObjects(patterns=request['objectIds'])
+        else:
+            objects = self._linknx.getObjects(objectIds=request['objectIds'])
+        rows = objects.iterValues() if objects else []
+        expectedValue = request.get('expectedValue')
+        mismatchingIds = []
+        if expectedValue is not None:
+            rows = checkValues(rows, objects, expectedValue, mismatchingIds)
+        # Keep the order of linknx's answer, as when reading directly.
+        answer = {'status' : 'success', 'values' : list(rows)}
+        if expectedValue is not None:
+            answer['matchesExpectedValue'] = not mismatchingIds
+        return answer
@@ -27,9 +27,12 @@ import os.path
 import logging
 import importlib
 import signal
+import collections
+import socket
 from threading import *
-from pyknx import tcpsocket, logger
+from pyknx import tcpsocket, logger, metrics, diagnostics, rpc, framing
 from pyknx.linknx import *
+from pyknx.journal import JournalWriter
 
 class CallbackContext(object):
 
@@ -43,7 +46,7 @@ class CallbackContext(object):
 
     """
 
-    def __init__(self, communicator, args={}):
+    def __init__(self, communicator, args={}, objectValue=None):
         # if not args is None and args.has_key('objectId'):
             # self._object = linknx.getObject(args['objectId'])
         # else:
@@ -67,12 +70,35 @@ class CallbackContext(object):
             self._object = self.linknx.getObject(self.objectId)
         else:
             self._object = None
+        self._value = objectValue
 
     @property
     def object(self):
         """ A wrapper of the Linknx object that is related to the event. """
         return self._object
 
+    @property
+    def value(self):
+        """
+        The value of the object related to the event, converted to the Python type of the object.
+
+        Linknx sends it along with the event for grouped rules and for rules generated with pyknxconf.py --embed-values. Otherwise, it is read from linknx on first access.
+
+        """
+        if self._value is None and self._object is not None:
+            eventValue = self._args.get('value') if self._args else None
+            if isinstance(eventValue, str):
+                try:
+                    self._value = self._object.convertStringToValue(eventValue)
+                except ValueError:
+                    logger.reportWarning('Unexpected value "{0}" in event for {1}, reading it from linknx.'.format(eventValue, self._object.id))
+            elif eventValue is not None:
+                # Binary frames carry typed values.
+                self._value = eventValue
+            if self._value is None:
+                self._value = self._object.value
+        return self._value
+
     @property
     def linknx(self):
         """ The instance of the Linknx wrapper the communicator is linked with. """
@@ -110,6 +136,23 @@ class CallbackContext(object):
     def __str__(self):
         return str(self._args)
 
+def parseMessage(data):
+    """
+    Parse a message sent to the communicator, e.g. 'onLightsChanged|objectId=KitchenLights'.
+
+    Returns a tuple (callback name, dictionary of arguments). Arguments keep the order of the message.
+
+    """
+    tokens = data.split('|')
+    callbackName = tokens[0]
+    # Parse arguments. First is object id.
+    args={}
+    for token in tokens[1:]:
+        argName, sep, argValue = token.partition('=')
+        if argValue: argValue = argValue.strip()
+        args[argName.strip()] = argValue
+    return callbackName, args
+
 class Communicator:
 
     """
@@ -129,6 +172,7 @@ class Communicator:
             self._communicator = communicator
             self.linknx = self._communicator.linknx
             self.isReady = False
+            self.readyEvent = Event()
 
         def isListening(self):
             return not self._socket is None and self.isReady
@@ -145,28 +189,45 @@ class Communicator:
                 # Thread loop.
                 while not self._isStopRequested:
                     self.isReady = True
-                    data, conn = self._socket.waitForString(endChar='$')
+                    self.readyEvent.set()
+                    data, isBinary, conn = self._socket.waitForMessage(b'$', framing.MAGIC, (framing.HEADER_LENGTH, framing.decodeHeader))
                     # Throw data away if script has not been initialized yet.
                     # See startListening for details.
                     if data is None or not self._communicator.isUserScriptInitialized:
+                        if conn: conn.close()
                         time.sleep(0.1)
                         continue
 
+                    receivedTime = time.time()
+                    receivedCounter = time.perf_counter()
+                    if isBinary:
+                        # A frame holds a batch of calls whose arguments are
+                        # already typed. Results are not sent back.
+                        try:
+                            calls = framing.decodeCalls(data)
+                        except Exception as e:
+                            logger.reportError('Discarding malformed frame: {0}'.format(e))
+                            calls = []
+                        logger.reportDebug('Frame received: {0}'.format(calls))
+                        for callbackName, args in calls:
+                            callbackStartTime = time.perf_counter()
+                            self._handleCall(callbackName, args, receivedCounter)
+                            if self._communicator.journal:
+                                self._communicator.journal.record(receivedTime, time.perf_counter() - callbackStartTime, framing.toTextMessage(callbackName, args))
+                        conn.close()
+                        continue
+
+                    data = data.decode('utf8')
                     logger.reportDebug('Data received: {0}'.format(data))
 
                     # Handle request.
-                    tokens = data.split('|')
-                    callbackName = tokens[0]
-                    # Parse arguments. First is object id.
-                    args={}
-                    for token in tokens[1:]:
-                        argName, sep, argValue = token.partition('=')
-                        if argValue: argValue = argValue.strip()
-                        args[argName.strip()] = argValue
-                    context = CallbackContext(self, args)
-                    res = self._communicator._executeUserCallback(callbackName, context)
+                    callbackName, args = parseMessage(data)
+                    callbackStartTime = time.perf_counter()
+                    res = self._handleCall(callbackName, args, receivedCounter)
+                    if self._communicator.journal:
+                        self._communicator.journal.record(receivedTime, time.perf_counter() - callbackStartTime, data)
                     if res:
-                        conn.sendall(res + '$')
+                        conn.sendall('{0}$'.format(res).encode('utf8'))
                     conn.close()
             except Exception as e:
                 logger.reportException()
@@ -176,11 +237,30 @@ class Communicator:
                 logger.reportInfo('Socket closed. Listening terminated.')
                 self._socket = None
 
+        def _handleCall(self, callbackName, args, receivedCounter):
+            if 'objectGroup' in args:
+                return self._communicator._executeObjectGroupCallbacks(callbackName, args, receivedCounter=receivedCounter)
+            context = CallbackContext(self, args)
+            if self._communicator._isUnchangedEvent(callbackName, args, context):
+                return None
+            if 'value' in args and context.object is not None:
+                self._communicator._recordEventValue(context)
+            return self._communicator._executeUserCallback(callbackName, context, receivedCounter=receivedCounter)
+
         def stop(self):
             logger.reportInfo('Stopping listener thread...')
             self._isStopRequested = True
 
-    def __init__(self, linknx, userFile, address=('localhost',1029), userScriptArgs={}):
+            # Wake the thread up if it is waiting for a connection, rather
+            # than letting it notice the request when the wait times out.
+            if self.isListening():
+                host, port = self._socket._socket.getsockname()[:2]
+                try:
+                    socket.create_connection(('localhost' if host in ('0.0.0.0', '::') else host, port), timeout=1).close()
+                except OSError:
+                    pass
+
+    def __init__(self, linknx, userFile, address=('localhost',1029), userScriptArgs={}, journalFile=None, metricsAddress=None, callbackBudget=None, profiler=None, rpcAddress=None, changeOnlyCallbacks=None):
 
         """
         Initialize the daemon.
@@ -189,6 +269,12 @@ class Communicator:
         userFile -- The file that implements the user-defined functions to be called when objects which have a callback attribute in the Linknx configuration change.
         address -- The address the communicator will listen on, defined as a tuple (ip address, port). The default is ('localhost', 1029).
         userScriptArgs -- A dictionary of extra arguments to expose in the CallbackContext instance passed to the initializeUserScript function (if implemented in the user file). It defaults to empty.
+        journalFile -- If not None, every message received while listening is appended to this file along with its reception time and callback duration. See the journal module.
+        metricsAddress -- If not None, the address (ip address, port) on which callback and linknx request metrics are served over HTTP in the Prometheus text format. See the metrics module.
+        callbackBudget -- If not None, the maximum duration of a user callback in seconds. Callbacks that run longer are reported with the stack of their thread. See the diagnostics module.
+        profiler -- If not None, a diagnostics.CallbackProfiler that is notified of each user callback execution.
+        rpcAddress -- If not None, the address (ip address, port) on which user functions can be called with request/response semantics. See the rpc module.
+        changeOnlyCallbacks -- Names of the callbacks that are only called when the value of their object has changed since their previous call, "*" standing for all callbacks. See setChangeOnly().
 
         """
         self._address = address
@@ -197,6 +283,20 @@ class Communicator:
         self._linknx = linknx
         self._userModule = None
         self._userScriptArgs = userScriptArgs
+        self._journalFile = journalFile
+        self.journal = None
+        self._metricsAddress = metricsAddress
+        self._metricsServer = None
+        self._callbackBudget = callbackBudget
+        self._watchdog = None
+        self.profiler = profiler
+        self._rpcAddress = rpcAddress
+        self._rpcServer = None
+        self._userCodeLock = RLock() # User functions are not expected to be thread safe: RPC calls and linknx events are serialized.
+        self._objectGroupValues = {} # Key is the id of a grouped rule (see Configurator), value is a dictionary {objectId: last known value}.
+        self._changeOnlyCallbacks = dict((callbackName, True) for callbackName in changeOnlyCallbacks) if changeOnlyCallbacks else {} # Key is callback name or "*", value tells whether it is change-only.
+        self._lastEventValues = {} # Key is a tuple (callback name, object id), value is the object value of the last call.
+        self.droppedEventCounts = collections.Counter() # Key is callback name, value is the number of events dropped because nothing changed.
         self.isUserScriptInitialized = False
 
     @property
@@ -214,6 +314,47 @@ class Communicator:
         """ Return the listening address as a tuple (ip address, port). """
         return self._address
 
+    def setChangeOnly(self, callbackName, isChangeOnly=True):
+        """
+        Tell whether a callback is only called when the value of its object has changed.
+
+        Linknx rules generated by pyknxconf.py trigger on every write of the object, even when the written value is the current one. For change-only
+        callbacks, the communicator remembers the value of each object at the time of the previous call and drops events that carry the same value.
+        The value is taken from the "value" argument of the event if any, otherwise it is read from linknx.
+        callbackName -- Name of the user function, or "*" for all functions.
+        This method is typically called from initializeUserScript, through context.communicator.
+
+        """
+        self._changeOnlyCallbacks[callbackName] = isChangeOnly
+
+    def _isChangeOnly(self, callbackName):
+        return self._changeOnlyCallbacks.get(callbackName, self._changeOnlyCallbacks.get('*', False))
+
+    def _isUnchangedEvent(self, callbackName, args, context=None):
+        """
+        Return True if the event is for a change-only callback and the value of its object is the same as for the previous call.
+
+        context -- The CallbackContext that will be passed to the callback, if any. Its value is used for the comparison, so that the callback does not read it from linknx again.
+
+        """
+        objectId = args.get('objectId')
+        if objectId is None or not self._changeOnlyCallbacks or not self._isChangeOnly(callbackName): return False
+        try:
+            if context is None:
+                context = CallbackContext(self, args)
+            value = context.value
+        except Exception as e:
+            logger.reportWarning('Could not get the value of {0}, event is not filtered: {1}'.format(objectId, e))
+            return False
+
+        key = (callbackName, objectId)
+        isUnchanged = key in self._lastEventValues and self._lastEventValues[key] == value
+        self._lastEventValues[key] = value
+        if isUnchanged:
+            self.droppedEventCounts[callbackName] += 1
+            logger.reportDebug('{0} is still {1}, {2} is not called.'.format(objectId, value, callbackName))
+        return isUnchanged
+
     def _loadUserFile(self):
         # Append the directory that contains the user script to python path.
         if self._userFile:
@@ -230,11 +371,15 @@ class Communicator:
             return False
 
     @staticmethod
-    def run(linknxAddress, userFile, communicatorAddress, userScriptArgs=None, verbosityLevel=logging.INFO, logFile=None, daemonizes=False, pidFile=None):
+    def run(linknxAddress, userFile, communicatorAddress, userScriptArgs=None, verbosityLevel=logging.INFO, logFile=None, daemonizes=False, pidFile=None, journalFile=None, metricsAddress=None, callbackBudget=None, profileMode='cprofile', profileDuration=60, profileDirectory=None, rpcAddress=None, writeRate=None, changeOnlyCallbacks=None, writeBurst=5, lineRate=None, lineBurst=None, writePriorityRules=()):
         def signal_handler(signal, frame):
             logger.reportInfo('Terminating...')
             communicator.stopListening()
 
+        def usr2_signal_handler(signal, frame):
+            logger.reportInfo('USR2 signal caught. Means that callbacks have to be profiled.')
+            communicator.profiler.start()
+
         # Init logger.
         if not logFile is None:
             logger.initLogger((logFile, verbosityLevel), None)
@@ -265,12 +410,17 @@ class Communicator:
         if pid != 0 and daemonizes:
             return
 
+        # Start the scheduler thread in the process that will write.
+        if writeRate:
+            linknx.enableWriteScheduler(rate=writeRate, burst=writeBurst, lineRate=lineRate, lineBurst=lineBurst, priorityRules=writePriorityRules)
+
         # Start communicator.
-        communicator = Communicator(linknx, userFile, communicatorAddress, userScriptArgs=userScriptArgs)
+        communicator = Communicator(linknx, userFile, communicatorAddress, userScriptArgs=userScriptArgs, journalFile=journalFile, metricsAddress=metricsAddress, callbackBudget=callbackBudget, profiler=diagnostics.CallbackProfiler(profileMode, profileDuration, profileDirectory), rpcAddress=rpcAddress, changeOnlyCallbacks=changeOnlyCallbacks)
         communicator.startListening()
 
         signal.signal(signal.SIGINT, signal_handler)
         signal.signal(signal.SIGTERM, signal_handler)
+        signal.signal(signal.SIGUSR2, usr2_signal_handler)
 
         # Main loop.
         while communicator.isListening:
@@ -293,15 +443,22 @@ class Communicator:
         # Make sure linknx is ready.
         self.linknx.waitForRemoteConnectionReady()
 
+        if self._journalFile:
+            self.journal = JournalWriter(self._journalFile)
+            logger.reportInfo('Journaling received messages to {0}'.format(self._journalFile))
+        if self._metricsAddress:
+            self._metricsServer = metrics.MetricsServer(self._metricsAddress)
+            self._metricsServer.start()
+        if self._callbackBudget:
+            self._watchdog = diagnostics.CallbackWatchdog(self._callbackBudget)
+            self._watchdog.start()
+
         # Start listening early to avoid communication errors from linknx. Those
         # errors are never harmful but the user may be surprized and worried
         # about them! 
         self._listenerThread = Communicator.Listener(self._address, self)
         self._listenerThread.start()
-        timeout = time.time() + 4
-        while not self._listenerThread.isReady and time.time() < timeout:
-            time.sleep(0.3)
-        if not self._listenerThread.isReady:
+        if not self._listenerThread.readyEvent.wait(4):
             raise Exception('Could not initialize listening socket.')
 
         # Initialize user-provided script. The purpose of this callback is to
@@ -318,11 +475,21 @@ class Communicator:
                 self.stopListening()
                 return
             logger.reportInfo('User script initialized.')
+        self._primeObjectGroups()
+        self._primeChangeOnlyValues()
         self.isUserScriptInitialized = True
 
+        if self._rpcAddress:
+            self._rpcServer = rpc.RPCServer(self._rpcAddress, self._executeRPCCall)
+            self._rpcServer.start()
+
 
     def stopListening(self):
         """ Stop communicator. No new incoming connection will be possible. """
+        if self._rpcServer:
+            self._rpcServer.stop()
+            self._rpcServer = None
+
         # Notify user script first. This allows linknx to notify a few object
         # changes before communicator really stop listening.
         if self._userFile and self.isUserScriptInitialized:
@@ -334,22 +501,132 @@ class Communicator:
 
         # Wait for listener thread to end (to be sure that no callback
         # request originating from linknx can reach the user script anymore).
-        while not self._listenerThread.isStopped:
-            time.sleep(0.5)
+        self._listenerThread.join()
         self._listenerThread = None
 
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+        if self._metricsServer:
+            self._metricsServer.stop()
+            self._metricsServer = None
+        if self.profiler:
+            self.profiler.stop()
+
         if self._userFile:
             self._executeUserCallback('endUserScript', CallbackContext(self), True)
             logger.reportInfo('User script ended.')
 
-    def _executeUserCallback(self, callbackName, context, isOptional=False):
+        # Send the writes that callbacks have left in the queue.
+        if self.linknx.writeScheduler is not None:
+            self.linknx.disableWriteScheduler()
+
+        if self._watchdog:
+            self._watchdog.stop()
+            self._watchdog = None
+
+    def _primeObjectGroups(self):
+        """
+        Read the current value of the objects of grouped rules.
+
+        Grouped rules send the values of all objects of their group, and the communicator finds out which objects changed by comparing
+        them with the previous ones. Reading values at startup lets the first event of each group be handled the same way.
+
+        """
+        objectIdsByGroup = {}
+        for actionNode in self.linknx.config.getElementsByTagName('action'):
+            data = actionNode.getAttribute('data')
+            if actionNode.getAttribute('type') != 'ioport-tx' or not '|objectGroup=' in data: continue
+            callbackName, args = parseMessage(data.rstrip('$'))
+            objectIdsByGroup[args['objectGroup']] = [argValue for argName, argValue in args.items() if argName[0] == 'o' and argName[1:].isdigit()]
+        if not objectIdsByGroup: return
+
+        objects = self.linknx.getObjects(objectIds=set([objectId for objectIds in objectIdsByGroup.values() for objectId in objectIds]))
+        try:
+            values = objects.getValues()
+        except Exception as e:
+            logger.reportWarning('Could not read initial values of grouped rules, all objects of their first event will be considered as changed: {0}'.format(e))
+            return
+        for groupId, objectIds in objectIdsByGroup.items():
+            self._objectGroupValues[groupId] = dict([(objectId, values[objectId]) for objectId in objectIds])
+        logger.reportInfo('Read initial values of {0} objects in {1} grouped rules.'.format(len(objects), len(objectIdsByGroup)))
+
+    def _recordEventValue(self, context):
+        """ Make the value sent along with an event known to the value history and to the tracker of redundant writes of linknx, if enabled. """
+        history = self.linknx.history
+        tracker = self.linknx.valueTracker
+        if history is None and tracker is None: return
+        try:
+            value = context.value
+            if history is not None:
+                history.record(context.object.id, context.object.typeCategory, value)
+            if tracker is not None:
+                tracker.observe(context.object.id, context.object.convertValueToString(value))
+        except Exception as e:
+            logger.reportWarning('Could not record value of {0}: {1}'.format(context.object.id, e))
+
+    def _primeChangeOnlyValues(self):
+        """ Read the current value of the objects of change-only callbacks with a single request, so that their first event is filtered too. """
+        if not self._changeOnlyCallbacks: return
+        keys = []
+        for actionNode in self.linknx.config.getElementsByTagName('action'):
+            data = actionNode.getAttribute('data')
+            if actionNode.getAttribute('type') != 'ioport-tx' or '|objectGroup=' in data: continue
+            callbackName, args = parseMessage(data.rstrip('$'))
+            if 'objectId' in args and self._isChangeOnly(callbackName):
+                keys.append((callbackName, args['objectId']))
+        if not keys: return
+
+        try:
+            values = self.linknx.getObjects(objectIds=set([objectId for callbackName, objectId in keys])).getValues()
+        except Exception as e:
+            logger.reportWarning('Could not read initial values of change-only callbacks, their first event will not be filtered: {0}'.format(e))
+            return
+        for key in keys:
+            self._lastEventValues[key] = values[key[1]]
+        logger.reportInfo('Read initial values of {0} objects of change-only callbacks.'.format(len(values)))
+
+    def _executeObjectGroupCallbacks(self, callbackName, args, receivedCounter=None):
+        """ Handle an event from a grouped rule: call the callback once for each object whose value changed since the previous event. """
+        groupId = args['objectGroup']
+        currentValues = collections.OrderedDict()
+        index = 0
+        while 'o{0}'.format(index) in args:
+            objectId = args['o{0}'.format(index)]
+            valueString = args.get('v{0}'.format(index), '')
+            try:
+                currentValues[objectId] = self.linknx.getObject(objectId).convertStringToValue(valueString)
+            except ValueError:
+                currentValues[objectId] = valueString
+            index += 1
+
+        history = self.linknx.history
+        if history is not None:
+            receivedTime = time.time()
+            for objectId, value in currentValues.items():
+                history.record(objectId, self.linknx.getObject(objectId).typeCategory, value, receivedTime)
+        tracker = self.linknx.valueTracker
+        if tracker is not None:
+            for index, objectId in enumerate(currentValues):
+                tracker.observe(objectId, self.linknx.getObject(objectId).normalizeValueString(args.get('v{0}'.format(index), '')))
+
+        previousValues = self._objectGroupValues.get(groupId)
+        self._objectGroupValues[groupId] = currentValues
+        if previousValues is None:
+            logger.reportWarning('No previous values for objects of group {0}, all of them are considered as changed.'.format(groupId))
+            changedObjectIds = list(currentValues.keys())
+        else:
+            changedObjectIds = [objectId for objectId, value in currentValues.items() if previousValues.get(objectId) != value]
+
+        res = None
+        for objectId in changedObjectIds:
+            res = self._executeUserCallback(callbackName, CallbackContext(self, {'objectId' : objectId}, currentValues[objectId]), receivedCounter=receivedCounter)
+        return res
+
+    def _executeUserCallback(self, callbackName, context, isOptional=False, receivedCounter=None):
         try:
             if hasattr(self._userModule, callbackName):
-                logger.reportDebug('Calling user callback {0} with context {1}'.format(callbackName, context))
-                callback = getattr(self._userModule, callbackName)
-                res = callback(context)
-                logger.reportDebug('Callback {0} returned {1}'.format(callbackName, res))
-                return res
+                return self._callUserFunction(callbackName, context, receivedCounter)
             else:
                 message='No function {0} defined in {1}'.format(callbackName, self._userFile)
                 if isOptional:
@@ -358,3 +635,33 @@ class Communicator:
                     logger.reportWarning(message)
         except Exception as e:
             logger.reportException('User code execution failed.')
+
+    def _callUserFunction(self, callbackName, context, receivedCounter=None):
+        """ Call a function of the user module and return its result. Exceptions raised by the function are propagated. """
+        logger.reportDebug('Calling user callback {0} with context {1}'.format(callbackName, context))
+        callback = getattr(self._userModule, callbackName)
+        with self._userCodeLock:
+            watchdog = self._watchdog
+            if watchdog: watchdog.enter(callbackName)
+            profilingToken = self.profiler.enter() if self.profiler else None
+            startTime = time.perf_counter()
+            failed = True
+            try:
+                res = callback(context)
+                failed = False
+            finally:
+                endTime = time.perf_counter()
+                if profilingToken: self.profiler.leave(profilingToken)
+                if watchdog: watchdog.leave()
+                metrics.registry.observeCallback(callbackName, endTime - startTime, failed, startTime - receivedCounter if receivedCounter is not None else None)
+        logger.reportDebug('Callback {0} returned {1}'.format(callbackName, res))
+        return res
+
+    def _executeRPCCall(self, functionName, arguments):
+        """ Handler of the RPC server. Returns the result of the user function. """
+        receivedCounter = time.perf_counter()
+        if functionName.startswith('_') or not hasattr(self._userModule, functionName):
+            raise rpc.RPCError('NoSuchFunction', 'No function {0} defined in {1}'.format(functionName, self._userFile))
+        if not isinstance(arguments, dict):
+            raise rpc.RPCError('ProtocolError', 'Arguments must be a JSON object.')
+        return self._callUserFunction(functionName, CallbackContext(self, arguments), receivedCounter)
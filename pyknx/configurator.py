@@ -20,7 +20,7 @@
 # For any question, feature requests or bug reports, feel free to contact me at:
 # knx at aminate dot net
 
-from xml.dom.minidom import parse, parseString
+from xml.dom.minidom import parse, parseString, Document
 from pyknx.linknx import ObjectConfig
 from pyknx import logger
 import sys
@@ -28,14 +28,64 @@ import getopt
 import codecs
 import logging
 import socket
+import collections
+import os.path
+import shutil
+import tempfile
+import xml.sax
+import xml.sax.handler
+
+class ConfigDiff(object):
+    """ Changes applied to a configuration by Configurator.updateConfig(). """
+    def __init__(self):
+        self.addedRules = []
+        self.removedRules = []
+        self.changedRules = []
+        self.ioportChange = None # None, 'added', 'removed' or 'changed'.
+
+    @property
+    def isEmpty(self):
+        return not (self.addedRules or self.removedRules or self.changedRules or self.ioportChange)
+
+    def __str__(self):
+        if self.isEmpty:
+            return 'Configuration is up to date.'
+        lines = []
+        lines.extend(['+ rule {0}'.format(ruleId) for ruleId in self.addedRules])
+        lines.extend(['- rule {0}'.format(ruleId) for ruleId in self.removedRules])
+        lines.extend(['~ rule {0}'.format(ruleId) for ruleId in self.changedRules])
+        if self.ioportChange:
+            lines.append('{0} ioport'.format({'added' : '+', 'removed' : '-', 'changed' : '~'}[self.ioportChange]))
+        return '\n'.join(lines)
 
 class Configurator:
-    """ Object able to automatically patch the linknx configuration xml to add python bindings. """
-    def __init__(self, sourceFile, outputFile, address, communicatorName='pyknx'):
+    """
+    Object able to automatically patch the linknx configuration xml to add python bindings.
+
+    Two rule generation strategies are available:
+    - 'per-object' (the default) generates one rule per object that has a callback. The callback is called each time the object is written.
+    - 'grouped' generates one rule per callback and per group of at most maxGroupSize objects. The rule sends the values of all objects
+    of the group to the communicator, which compares them with the previous ones to find out which objects changed. This divides the
+    number of rules linknx has to load, at the expense of calling callbacks only when the value of an object actually changes.
+
+    With embedsValues, per-object rules also send the new value of the object, substituted by linknx, so that callbacks can read it from
+    CallbackContext.value without a request to linknx. Values of string objects are never embedded since they may contain the characters
+    that delimit messages.
+
+    """
+    RULE_STRATEGIES = ('per-object', 'grouped')
+
+    def __init__(self, sourceFile, outputFile, address, communicatorName='pyknx', ruleStrategy='per-object', maxGroupSize=50, embedsValues=False):
+        if not ruleStrategy in Configurator.RULE_STRATEGIES:
+            raise Exception('Unsupported rule strategy "{0}".'.format(ruleStrategy))
         self._address = address
         self._sourceFile = sourceFile
         self._outputFile = outputFile
         self._communicatorName = communicatorName
+        self._ruleStrategy = ruleStrategy
+        self._maxGroupSize = maxGroupSize
+        self._embedsValues = embedsValues
+        self._stringObjectIds = set() # Ids of objects with a callback whose values are strings.
         self._config = None
 
     @property
@@ -80,8 +130,8 @@ class Configurator:
                 logger.reportInfo('Clean ' + ioportNode.toxml())
                 ioportsNode.removeChild(ioportNode)
 
-    def createActionNode(self, callbackName, args):
-        doc = self.config.ownerDocument
+    def createActionNode(self, callbackName, args, usesVariables=False):
+        doc = self._getDocument()
         actionNode = doc.createElement('action')
         actionNode.setAttribute('type', 'ioport-tx')
         actionNode.setAttribute('ioport', self._communicatorName)
@@ -90,22 +140,36 @@ class Configurator:
             for argName, argValue in args.items():
                 dataStr += '|{0}={1}'.format(argName, argValue)
         actionNode.setAttribute('data', dataStr + '$')
+        if usesVariables:
+            # Let linknx substitute ${objectId} with object values.
+            actionNode.setAttribute('var', 'true')
         return actionNode
 
     def generateConfig(self):
         # Read xml to get pyknx special attributes.
         config = self.config
-        doc = config.ownerDocument
         rulesNode = self._getOrAddConfigElement(config, 'rules')
 
-        # Generate a rule for each object that has a callback in the user file.
-        objectNodes = config.getElementsByTagName('objects')[0]
-        configuredAtLeastOne = False
+        # Generate rules for objects that have a callback in the user file.
+        callbacks = self.getCallbacks()
+        for ruleNode in self.createRuleNodes(callbacks):
+            logger.reportInfo('Generating rule {0}'.format(ruleNode.getAttribute('id')))
+            rulesNode.appendChild(ruleNode)
+
+        if callbacks:
+            # Add an ioport service for the communicator.
+            servicesNode = self._getOrAddConfigElement(config, 'services')
+            ioportsNode = self._getOrAddConfigElement(servicesNode, 'ioports')
+            ioportsNode.appendChild(self._createIOPortNode())
+
+    def getCallbacks(self):
+        """ Return the list of tuples (object id, callback name) for the objects that define a callback attribute, in document order. """
+        objectNodes = self.config.getElementsByTagName('objects')[0]
+        callbacks = []
         definesLegacyCallbackAttribute = False
         callbackAttributeName = self.callbackAttributeName
         for objectNode in objectNodes.getElementsByTagName('object'):
             objectConfig = ObjectConfig(objectNode)
-            objectId = objectConfig.id
             callback = objectNode.getAttribute(callbackAttributeName)
             if callback == None or callback == '':
                 if objectNode.getAttribute('pyknxcallback'):
@@ -113,59 +177,241 @@ class Configurator:
                     definesLegacyCallbackAttribute = True
                 logger.reportDebug('No callback found for object ' + objectConfig.id + ' (no {0} attribute for this object)'.format(callbackAttributeName))
                 continue
+            callbacks.append((objectConfig.id, callback))
+            if objectConfig.typeCategory == 'string':
+                self._stringObjectIds.add(objectConfig.id)
+
+        if not callbacks:
+            logger.reportInfo('Nothing to do. None of the objects does define a callback attribute.')
+            if definesLegacyCallbackAttribute:
+                logger.reportWarning('There is at least one pyknxcallback attribute in the config file. These attributes were recognized by Pyknx before version 2.2. Did you forget to rename them to {0}?'.format(callbackAttributeName))
+        return callbacks
+
+    def updateConfig(self, cleansOnly=False):
+        """
+        Incrementally update the pyknx rules and ioport of the configuration.
+
+        Unlike cleanConfig() followed by generateConfig(), this method only touches the nodes that differ from what the callback attributes imply.
+        cleansOnly -- If True, all pyknx rules and the ioport are removed, as with the --clean option of pyknxconf.py.
+        Returns a ConfigDiff that describes the changes with respect to the current output file, i.e. the configuration linknx loads,
+        or with respect to the source configuration if the output is written to standard output or to the source file.
 
-            configuredAtLeastOne = True
-            ruleNode = doc.createElement('rule')
-            ruleId = '{0}{1}'.format(self._communicatorName, objectId)
-            logger.reportInfo('Generating rule {0}'.format(ruleId))
-            ruleNode.setAttribute('id', ruleId)
-            ruleNode.setAttribute('init', 'false')
+        """
+        expectedRuleNodes = self._getExpectedRuleNodes(cleansOnly)
+        outputConfig = self._parseOutputConfig()
+        if outputConfig is None:
+            diff = self._updateGeneratedNodes(self.config, expectedRuleNodes)
+        else:
+            # Nodes are moved to the configuration they are appended to:
+            # generate them again for the parsed output.
+            diff = self._updateGeneratedNodes(outputConfig, self._getExpectedRuleNodes(cleansOnly))
+            self._updateGeneratedNodes(self.config, expectedRuleNodes)
+
+        for line in str(diff).splitlines():
+            logger.reportInfo(line)
+        return diff
+
+    def _getExpectedRuleNodes(self, cleansOnly):
+        """ Return an ordered dictionary of the rule nodes implied by the callback attributes, with rule ids as keys. """
+        expectedRuleNodes = collections.OrderedDict()
+        if not cleansOnly:
+            for ruleNode in self.createRuleNodes(self.getCallbacks()):
+                expectedRuleNodes[ruleNode.getAttribute('id')] = ruleNode
+        return expectedRuleNodes
+
+    def _parseOutputConfig(self):
+        """ Return the <config> element of the current output file, None if the output is standard output or the source file. """
+        if self._outputFile is None:
+            return None
+        if not os.path.exists(self._outputFile):
+            # Everything will be added.
+            return parseString('<config/>').documentElement
+        if self._sourceFile is not None and os.path.exists(self._sourceFile) and os.path.samefile(self._sourceFile, self._outputFile):
+            return None
+        return parse(self._outputFile).getElementsByTagName('config')[0]
+
+    def _updateGeneratedNodes(self, config, expectedRuleNodes):
+        """ Replace the pyknx rules and ioport of config with the expected ones, touching only those that differ. Returns a ConfigDiff of the changes. """
+        diff = ConfigDiff()
+
+        # Compare with existing rules. Only direct children of <rules> are
+        # inspected.
+        rulesNode = self._findChildElement(config, 'rules')
+        if rulesNode is None and expectedRuleNodes:
+            rulesNode = self._getOrAddConfigElement(config, 'rules')
+        if rulesNode is not None:
+            existingRuleIds = set()
+            for ruleNode in self._getChildElements(rulesNode, 'rule'):
+                ruleId = ruleNode.getAttribute('id')
+                if not self._isGeneratedRuleId(ruleId): continue
+                existingRuleIds.add(ruleId)
+                expectedRuleNode = expectedRuleNodes.get(ruleId)
+                if expectedRuleNode is None:
+                    rulesNode.removeChild(ruleNode)
+                    diff.removedRules.append(ruleId)
+                elif self._canonicalize(expectedRuleNode) != self._canonicalize(ruleNode):
+                    rulesNode.replaceChild(expectedRuleNode, ruleNode)
+                    diff.changedRules.append(ruleId)
+            for ruleId, ruleNode in expectedRuleNodes.items():
+                if not ruleId in existingRuleIds:
+                    rulesNode.appendChild(ruleNode)
+                    diff.addedRules.append(ruleId)
+
+        # Same for the ioport.
+        expectedIOPortNode = self._createIOPortNode() if expectedRuleNodes else None
+        servicesNode = self._findChildElement(config, 'services')
+        ioportsNode = self._findChildElement(servicesNode, 'ioports') if servicesNode is not None else None
+        ioportNode = None
+        if ioportsNode is not None:
+            for node in self._getChildElements(ioportsNode, 'ioport'):
+                if node.getAttribute('id') == self._communicatorName:
+                    ioportNode = node
+                    break
+        if ioportNode is None:
+            if expectedIOPortNode is not None:
+                servicesNode = self._getOrAddConfigElement(config, 'services')
+                self._getOrAddConfigElement(servicesNode, 'ioports').appendChild(expectedIOPortNode)
+                diff.ioportChange = 'added'
+        elif expectedIOPortNode is None:
+            ioportsNode.removeChild(ioportNode)
+            diff.ioportChange = 'removed'
+        elif self._canonicalize(expectedIOPortNode) != self._canonicalize(ioportNode):
+            ioportsNode.replaceChild(expectedIOPortNode, ioportNode)
+            diff.ioportChange = 'changed'
+        return diff
+
+    def _getDocument(self):
+        """ Return the document used to create generated nodes. """
+        return self.config.ownerDocument
+
+    def _isGeneratedRuleId(self, ruleId):
+        return ruleId[:len(self._communicatorName)] == self._communicatorName
+
+    def createRuleNodes(self, callbacks):
+        """ Return the list of rule nodes to generate for the given list of tuples (object id, callback name), according to the rule strategy. """
+        if self._ruleStrategy == 'per-object':
+            return [self._createRuleNode(objectId, callback) for objectId, callback in callbacks]
+
+        # Group objects by callback, preserving document order. Grouped rules
+        # embed values in the message, which string values could break:
+        # string objects keep a rule of their own.
+        objectIdsByCallback = collections.OrderedDict()
+        ruleNodes = []
+        for objectId, callback in callbacks:
+            if objectId in self._stringObjectIds:
+                ruleNodes.append(self._createRuleNode(objectId, callback))
+            else:
+                objectIdsByCallback.setdefault(callback, []).append(objectId)
+        for callback, objectIds in objectIdsByCallback.items():
+            for groupIndex, groupStart in enumerate(range(0, len(objectIds), self._maxGroupSize)):
+                ruleNodes.append(self._createGroupRuleNode(callback, groupIndex, objectIds[groupStart:groupStart + self._maxGroupSize]))
+        return ruleNodes
+
+    def _createGroupRuleNode(self, callback, groupIndex, objectIds):
+        doc = self._getDocument()
+        ruleNode = doc.createElement('rule')
+        ruleId = '{0}group-{1}-{2}'.format(self._communicatorName, callback, groupIndex)
+        ruleNode.setAttribute('id', ruleId)
+        ruleNode.setAttribute('init', 'false')
+        orConditionNode = doc.createElement('condition')
+        orConditionNode.setAttribute('type', 'or')
+        ruleNode.appendChild(orConditionNode)
+        args = collections.OrderedDict()
+        args['objectGroup'] = ruleId
+        for index, objectId in enumerate(objectIds):
             conditionNode = doc.createElement('condition')
             conditionNode.setAttribute('type', 'object')
             conditionNode.setAttribute('id', objectId)
-            # conditionNode.setAttribute('value', objectConfig.defaultValue)
             conditionNode.setAttribute('trigger', 'true')
-            ruleNode.appendChild(conditionNode)
-            actionListNode = doc.createElement('actionlist')
-            actionListNode.setAttribute('type', 'if-true')
-            ruleNode.appendChild(actionListNode)
-            actionNode = self.createActionNode(callback, {'objectId' : objectId})
-            actionListNode.appendChild(actionNode)
-            # actionListIfFalseNode = actionListNode.cloneNode(True)
-            # actionListIfFalseNode.setAttribute('type', 'on-false')
-            # # ruleNode.appendChild(actionListIfFalseNode)
-            rulesNode.appendChild(ruleNode)
+            orConditionNode.appendChild(conditionNode)
+            args['o{0}'.format(index)] = objectId
+            args['v{0}'.format(index)] = '${{{0}}}'.format(objectId)
+        actionListNode = doc.createElement('actionlist')
+        actionListNode.setAttribute('type', 'if-true')
+        ruleNode.appendChild(actionListNode)
+        actionListNode.appendChild(self.createActionNode(callback, args, usesVariables=True))
+        return ruleNode
 
-        if not configuredAtLeastOne:
-            logger.reportInfo('Nothing to do. None of the objects does define a callback attribute.')
-            if definesLegacyCallbackAttribute:
-                logger.reportWarning('There is at least one pyknxcallback attribute in the config file. These attributes were recognized by Pyknx before version 2.2. Did you forget to rename them to {0}?'.format(callbackAttributeName))
-        else:
-            # Add an ioport service for the communicator.
-            servicesNode = self._getOrAddConfigElement(config, 'services')
-            ioportsNode = self._getOrAddConfigElement(servicesNode, 'ioports')
-            ioportNode = doc.createElement('ioport')
-            ioportNode.setAttribute('id', self._communicatorName)
-            try:
-                hostIP = socket.gethostbyname(self._address[0])
-            except:
-                logger.reportWarning('Could not check that {0} is a valid ip address. Please check the output configuration. Linknx does not support hostnames, it requires IP address.'.format(self._address[0]))
-                hostIP = self._address[0]
-            ioportNode.setAttribute('host', hostIP) #gethostbyname converts the hostname into an ip. Linknx does not support ioport hostnames.
-            ioportNode.setAttribute('port', str(self._address[1]))
-            ioportNode.setAttribute('type', 'tcp')
-            ioportsNode.appendChild(ioportNode)
-
-
-    def writeConfig(self):
+    def _createRuleNode(self, objectId, callback):
+        doc = self._getDocument()
+        ruleNode = doc.createElement('rule')
+        ruleId = '{0}{1}'.format(self._communicatorName, objectId)
+        ruleNode.setAttribute('id', ruleId)
+        ruleNode.setAttribute('init', 'false')
+        conditionNode = doc.createElement('condition')
+        conditionNode.setAttribute('type', 'object')
+        conditionNode.setAttribute('id', objectId)
+        # conditionNode.setAttribute('value', objectConfig.defaultValue)
+        conditionNode.setAttribute('trigger', 'true')
+        ruleNode.appendChild(conditionNode)
+        actionListNode = doc.createElement('actionlist')
+        actionListNode.setAttribute('type', 'if-true')
+        ruleNode.appendChild(actionListNode)
+        args = collections.OrderedDict()
+        args['objectId'] = objectId
+        embedsValue = self._embedsValues and not objectId in self._stringObjectIds
+        if embedsValue:
+            args['value'] = '${{{0}}}'.format(objectId)
+        actionNode = self.createActionNode(callback, args, usesVariables=embedsValue)
+        actionListNode.appendChild(actionNode)
+        # actionListIfFalseNode = actionListNode.cloneNode(True)
+        # actionListIfFalseNode.setAttribute('type', 'on-false')
+        # # ruleNode.appendChild(actionListIfFalseNode)
+        return ruleNode
+
+    def _createIOPortNode(self):
+        ioportNode = self._getDocument().createElement('ioport')
+        ioportNode.setAttribute('id', self._communicatorName)
+        try:
+            hostIP = socket.gethostbyname(self._address[0])
+        except:
+            logger.reportWarning('Could not check that {0} is a valid ip address. Please check the output configuration. Linknx does not support hostnames, it requires IP address.'.format(self._address[0]))
+            hostIP = self._address[0]
+        ioportNode.setAttribute('host', hostIP) #gethostbyname converts the hostname into an ip. Linknx does not support ioport hostnames.
+        ioportNode.setAttribute('port', str(self._address[1]))
+        ioportNode.setAttribute('type', 'tcp')
+        return ioportNode
+
+    @staticmethod
+    def _canonicalize(node):
+        """ Return a hashable representation of an element that ignores attribute order and whitespace. """
+        attributes = tuple(sorted(node.attributes.items())) if node.attributes else ()
+        children = tuple(Configurator._canonicalize(child) for child in node.childNodes if child.nodeType == child.ELEMENT_NODE)
+        return (node.tagName, attributes, children)
+
+    def writeConfig(self, skipsIfUnchanged=False):
+        """
+        Write the configuration to the output file, or to standard output if no output file was specified.
+
+        skipsIfUnchanged -- If True, the output file is left untouched when its current content is already up to date. Returns True if the output has been written.
+
+        """
         if self._outputFile != None:
+            if skipsIfUnchanged and self._isOutputUpToDate():
+                logger.reportInfo('Output config ' + self._outputFile + ' is up to date, not written.')
+                return False
             outputXMLFile = codecs.open(self._outputFile, mode='w', encoding='utf-8')
             outputXMLFile.write(self.config.toxml())
             outputXMLFile.close()
             logger.reportInfo('Output config written to ' + self._outputFile)
         else:
             print(self.config.toxml())
+        return True
 
+    def _isOutputUpToDate(self):
+        if not os.path.exists(self._outputFile):
+            return False
+        with codecs.open(self._outputFile, mode='r', encoding='utf-8') as outputXMLFile:
+            return outputXMLFile.read() == self.config.toxml()
+
+    def _findChildElement(self, parent, elementTagName):
+        for node in self._getChildElements(parent, elementTagName):
+            return node
+        return None
+
+    def _getChildElements(self, parent, elementTagName):
+        # Iterate over a copy so that callers can remove or replace nodes.
+        return [node for node in parent.childNodes if node.nodeType == node.ELEMENT_NODE and node.tagName == elementTagName]
 
     def _getOrAddConfigElement(self, parent, elementTagName):
         elementNodes = parent.getElementsByTagName(elementTagName)
@@ -176,3 +422,228 @@ class Configurator:
         else:
             elementNode = elementNodes[0]
         return elementNode
+
+class StreamingConfigurator(Configurator):
+    """
+    Configurator that processes the linknx configuration as a stream, with bounded memory.
+
+    The configuration is parsed twice with SAX: the first pass collects callback attributes, the second one copies
+    everything through unchanged except pyknx rules and ioport, which are dropped and regenerated on the fly.
+    Unlike Configurator, the whole document is never held in memory, which suits very large configurations
+    (e.g. with persistence logs). The output is equivalent to cleanConfig() followed by generateConfig() and writeConfig().
+
+    """
+    class _CallbackCollector(xml.sax.handler.ContentHandler):
+        """ First pass: collect callback attributes of objects. """
+        def __init__(self, callbackAttributeName):
+            xml.sax.handler.ContentHandler.__init__(self)
+            self.callbackAttributeName = callbackAttributeName
+            self.callbacks = []
+            self.stringObjectIds = set()
+            self.definesLegacyCallbackAttribute = False
+            self._path = []
+
+        def startElement(self, name, attrs):
+            self._path.append(name)
+            if name == 'object' and self._path[-3:-1] == ['config', 'objects'] and len(self._path) == 3:
+                callback = attrs.get(self.callbackAttributeName)
+                if callback:
+                    self.callbacks.append((attrs.get('id'), callback))
+                    if ObjectConfig.getTypeCategory(attrs.get('type', '')) == 'string':
+                        self.stringObjectIds.add(attrs.get('id'))
+                elif attrs.get('pyknxcallback'):
+                    logger.reportError('pyknxcallback found on object {0}'.format(attrs.get('id')))
+                    self.definesLegacyCallbackAttribute = True
+
+        def endElement(self, name):
+            self._path.pop()
+
+    class _Rewriter(xml.sax.handler.ContentHandler):
+        """ Second pass: copy the configuration through, replacing pyknx rules and ioport. """
+        def __init__(self, configurator, output, callbacks):
+            xml.sax.handler.ContentHandler.__init__(self)
+            self._configurator = configurator
+            self._output = output
+            self._callbacks = callbacks
+            self._path = []
+            self._pendingStartTag = None
+            self._skippedDepth = 0
+            self._seenChildren = set() # Names of elements met as children of <config> or <services>.
+            self.cleanedRuleCount = 0
+
+        def _escape(self, data):
+            # Same escaping as minidom.
+            return data.replace('&', '&amp;').replace('<', '&lt;').replace('"', '&quot;').replace('>', '&gt;')
+
+        def _flushStartTag(self):
+            if self._pendingStartTag is not None:
+                self._output.write(self._pendingStartTag + '>')
+                self._pendingStartTag = None
+
+        def _writeGenerated(self, node):
+            self._flushStartTag()
+            self._output.write(node.toxml())
+            node.unlink()
+
+        def _isSkipped(self, name, attrs):
+            path = self._path
+            if name == 'rule' and path == ['config', 'rules']:
+                ruleId = attrs.get('id', '')
+                if self._configurator._isGeneratedRuleId(ruleId):
+                    logger.reportInfo('Clean rule ' + ruleId + ' coming from a previous configure.')
+                    self.cleanedRuleCount += 1
+                    return True
+            elif name == 'ioport' and path == ['config', 'services', 'ioports']:
+                if attrs.get('id') == self._configurator._communicatorName:
+                    logger.reportInfo('Clean ioport ' + attrs.get('id'))
+                    return True
+            return False
+
+        def startElement(self, name, attrs):
+            if self._skippedDepth or self._isSkipped(name, attrs):
+                self._skippedDepth += 1
+                return
+            if len(self._path) in (1, 2):
+                self._seenChildren.add('/'.join(self._path + [name]))
+            self._flushStartTag()
+            self._pendingStartTag = '<' + name + ''.join([' {0}="{1}"'.format(attrName, self._escape(attrValue)) for attrName, attrValue in attrs.items()])
+            self._path.append(name)
+
+        def endElement(self, name):
+            if self._skippedDepth:
+                self._skippedDepth -= 1
+                return
+            path = self._path
+            if path == ['config', 'rules']:
+                self._writeRules()
+            elif path == ['config', 'services', 'ioports']:
+                self._writeIOPort()
+            elif path == ['config', 'services']:
+                if not 'config/services/ioports' in self._seenChildren:
+                    self._writeMissingElement('ioports')
+            elif path == ['config']:
+                if not 'config/rules' in self._seenChildren:
+                    self._writeMissingElement('rules')
+                if not 'config/services' in self._seenChildren:
+                    self._writeMissingElement('services')
+            path.pop()
+            if self._pendingStartTag is not None:
+                self._output.write(self._pendingStartTag + '/>')
+                self._pendingStartTag = None
+            else:
+                self._output.write('</{0}>'.format(name))
+
+        def _writeMissingElement(self, name):
+            # Generated content is written when the element ends.
+            logger.reportInfo('No <' + name + '> element in config, creating one.')
+            self.startElement(name, {})
+            self.endElement(name)
+
+        def _writeRules(self):
+            for ruleNode in self._configurator.createRuleNodes(self._callbacks):
+                logger.reportInfo('Generating rule {0}'.format(ruleNode.getAttribute('id')))
+                self._writeGenerated(ruleNode)
+
+        def _writeIOPort(self):
+            if self._callbacks:
+                self._writeGenerated(self._configurator._createIOPortNode())
+
+        def characters(self, content):
+            if self._skippedDepth or not self._path: return
+            self._flushStartTag()
+            self._output.write(self._escape(content))
+
+        def ignorableWhitespace(self, content):
+            self.characters(content)
+
+        def processingInstruction(self, target, data):
+            if self._skippedDepth or not self._path: return
+            self._flushStartTag()
+            self._output.write('<?{0} {1}?>'.format(target, data))
+
+        # Lexical handler interface, to preserve comments.
+        def comment(self, content):
+            if self._skippedDepth or not self._path: return
+            self._flushStartTag()
+            self._output.write('<!--{0}-->'.format(content))
+
+        def startCDATA(self): pass
+        def endCDATA(self): pass
+        def startDTD(self, name, publicId, systemId): pass
+        def endDTD(self): pass
+        def startEntity(self, name): pass
+        def endEntity(self, name): pass
+
+    def __init__(self, sourceFile, outputFile, address, communicatorName='pyknx', ruleStrategy='per-object', maxGroupSize=50, embedsValues=False):
+        Configurator.__init__(self, sourceFile, outputFile, address, communicatorName, ruleStrategy, maxGroupSize, embedsValues)
+        self._document = Document()
+        self._callbacks = None
+
+    @property
+    def config(self):
+        raise Exception('The streaming configurator does not load the configuration in memory.')
+
+    def _getDocument(self):
+        return self._document
+
+    def getCallbacks(self):
+        if self._callbacks is None:
+            collector = StreamingConfigurator._CallbackCollector(self.callbackAttributeName)
+            self._parse(collector)
+            self._callbacks = collector.callbacks
+            self._stringObjectIds = collector.stringObjectIds
+            if not self._callbacks:
+                logger.reportInfo('Nothing to do. None of the objects does define a callback attribute.')
+                if collector.definesLegacyCallbackAttribute:
+                    logger.reportWarning('There is at least one pyknxcallback attribute in the config file. These attributes were recognized by Pyknx before version 2.2. Did you forget to rename them to {0}?'.format(self.callbackAttributeName))
+        return self._callbacks
+
+    def process(self, cleansOnly=False):
+        """
+        Rewrite the configuration from the source to the output.
+
+        cleansOnly -- If True, pyknx rules and ioport are removed but not regenerated, as with the --clean option of pyknxconf.py.
+
+        """
+        spooledFile = None
+        if self._sourceFile is None:
+            # Standard input can only be read once: spool it to a temporary
+            # file to allow for two passes.
+            spooledFile = tempfile.NamedTemporaryFile(mode='wb', suffix='.xml', delete=False)
+            shutil.copyfileobj(sys.stdin.buffer, spooledFile)
+            spooledFile.close()
+            self._sourceFile = spooledFile.name
+
+        try:
+            callbacks = [] if cleansOnly else self.getCallbacks()
+            if self._outputFile is None:
+                rewriter = StreamingConfigurator._Rewriter(self, sys.stdout, callbacks)
+                self._parse(rewriter)
+                sys.stdout.write('\n')
+            else:
+                # Write to a temporary file first, in case the output is also
+                # the source.
+                outputDirectory = os.path.dirname(os.path.abspath(self._outputFile))
+                temporaryOutput = tempfile.NamedTemporaryFile(mode='w', encoding='utf-8', dir=outputDirectory, suffix='.tmp', delete=False)
+                try:
+                    with temporaryOutput:
+                        rewriter = StreamingConfigurator._Rewriter(self, temporaryOutput, callbacks)
+                        self._parse(rewriter)
+                    os.replace(temporaryOutput.name, self._outputFile)
+                except:
+                    os.remove(temporaryOutput.name)
+                    raise
+                logger.reportInfo('Output config written to ' + self._outputFile)
+            if rewriter.cleanedRuleCount == 0:
+                logger.reportInfo('Input XML config does not define any pyknx rule. Nothing to clean.')
+        finally:
+            if spooledFile is not None:
+                os.remove(spooledFile.name)
+                self._sourceFile = None
+
+    def _parse(self, handler):
+        parser = xml.sax.make_parser()
+        parser.setContentHandler(handler)
+        if hasattr(handler, 'comment'):
+            parser.setProperty(xml.sax.handler.property_lexical_handler, handler)
+        parser.parse(self._sourceFile)
@@ -0,0 +1,213 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2012-2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+"""
+Diagnostic tools for user callbacks executed by the communicator.
+
+CallbackWatchdog reports callbacks that run longer than a given budget, along with the current stack of the thread that executes them.
+CallbackProfiler profiles callbacks (with cProfile or tracemalloc) during a time window and writes a report to disk when the window ends.
+The communicator starts the profiler when it receives the USR2 signal.
+"""
+
+import os
+import sys
+import time
+import traceback
+from threading import Thread, Lock, Condition, Timer, get_ident
+from pyknx import logger
+
+class CallbackWatchdog(Thread):
+    """ Thread that periodically checks the duration of running callbacks. """
+    def __init__(self, budget, checkPeriod=None):
+        """
+        Initialize the watchdog.
+
+        budget -- Maximum duration of a callback, in seconds. Callbacks that run longer are reported.
+        checkPeriod -- Period of the checks, in seconds. Defaults to a quarter of the budget.
+
+        """
+        Thread.__init__(self, name='Callback Watchdog Thread')
+        self.daemon = True
+        self._budget = budget
+        self._checkPeriod = checkPeriod if checkPeriod else budget / 4.0
+        self._runningCallbacks = {} # Key is thread identifier, value is a list [callbackName, startTime, isReported].
+        self._lock = Lock()
+        self._isStopRequested = False
+        self.overrunCount = 0
+
+    @property
+    def budget(self):
+        return self._budget
+
+    def enter(self, callbackName):
+        """ Notify the watchdog that the current thread starts executing a callback. """
+        with self._lock:
+            self._runningCallbacks[get_ident()] = [callbackName, time.time(), False]
+
+    def leave(self):
+        """ Notify the watchdog that the current thread is done with its callback. """
+        with self._lock:
+            callbackName, startTime, isReported = self._runningCallbacks.pop(get_ident(), (None, None, False))
+        if isReported:
+            logger.reportWarning('Slow callback {0} eventually completed after {1:.3f}s.'.format(callbackName, time.time() - startTime))
+
+    def run(self):
+        while not self._isStopRequested:
+            time.sleep(self._checkPeriod)
+            self.check()
+
+    def check(self):
+        """ Report callbacks that exceed the budget. Each call is reported only once. """
+        now = time.time()
+        overruns = []
+        with self._lock:
+            for threadId, runningCallback in self._runningCallbacks.items():
+                callbackName, startTime, isReported = runningCallback
+                if not isReported and now - startTime > self._budget:
+                    runningCallback[2] = True
+                    overruns.append((threadId, callbackName, now - startTime))
+
+        if not overruns: return
+        frames = sys._current_frames()
+        for threadId, callbackName, duration in overruns:
+            self.overrunCount += 1
+            frame = frames.get(threadId)
+            stack = ''.join(traceback.format_stack(frame)) if frame else '<unavailable>\n'
+            logger.reportWarning('Callback {0} has been running for {1:.3f}s, which exceeds the budget of {2}s. Current stack is:\n{3}'.format(callbackName, duration, self._budget, stack))
+
+    def stop(self):
+        self._isStopRequested = True
+
+class CallbackProfiler(object):
+    """
+    Profiles user callbacks during a time window and writes a report to disk when the window ends.
+
+    In 'cprofile' mode, only the execution of callbacks is profiled. In 'tracemalloc' mode, allocations of the whole process are traced,
+    including those of the threads that receive messages from linknx, since tracemalloc cannot be restricted to some frames.
+
+    """
+    def __init__(self, mode='cprofile', duration=60, outputDirectory=None):
+        """
+        Initialize the profiler. Profiling starts when calling start().
+
+        mode -- 'cprofile' to profile execution time of callbacks, 'tracemalloc' to profile memory allocations of the whole process.
+        duration -- Length of the profiling window, in seconds.
+        outputDirectory -- Directory the report is written to. Defaults to the system's temporary directory.
+
+        """
+        if mode not in ('cprofile', 'tracemalloc'):
+            raise Exception('Unsupported profiling mode {0}.'.format(mode))
+        if outputDirectory is None:
+            import tempfile
+            outputDirectory = tempfile.gettempdir()
+        self._mode = mode
+        self._duration = duration
+        self._outputDirectory = outputDirectory
+        self._profile = None
+        self._hasProfiled = False # Whether a callback has been profiled in the current window.
+        self._timer = None
+        self._lock = Lock()
+        self._inFlightCount = 0 # Number of callbacks being profiled.
+        self._idle = Condition(self._lock)
+        self.lastReportFile = None
+
+    @property
+    def isActive(self):
+        return self._timer is not None
+
+    def start(self):
+        """ Start a profiling window. Does nothing if a window is already in progress. """
+        with self._lock:
+            if self.isActive:
+                logger.reportInfo('Profiling is already in progress.')
+                return
+            if self._mode == 'cprofile':
+                import cProfile
+                self._profile = cProfile.Profile()
+                self._hasProfiled = False
+            else:
+                import tracemalloc
+                tracemalloc.start(25)
+            self._timer = Timer(self._duration, self.stop)
+            self._timer.daemon = True
+            self._timer.start()
+        logger.reportInfo('Profiling callbacks with {0} during {1}s.'.format(self._mode, self._duration))
+
+    def stop(self):
+        """ End the profiling window and write the report. """
+        with self._lock:
+            if not self.isActive: return
+            self._timer.cancel()
+            self._timer = None
+            profile = self._profile
+            self._profile = None
+            hasProfiled = self._hasProfiled
+
+            # A profile only records the thread that enabled it: wait for
+            # callbacks to disable it before reading its statistics.
+            while self._inFlightCount:
+                self._idle.wait()
+            reportFile = os.path.join(self._outputDirectory, 'pyknx-{0}-{1}.txt'.format(self._mode, time.strftime('%Y%m%d-%H%M%S')))
+            with open(reportFile, 'w') as report:
+                if self._mode == 'cprofile':
+                    # pstats cannot load a profile that has never been
+                    # enabled.
+                    if hasProfiled:
+                        import pstats
+                        stats = pstats.Stats(profile, stream=report)
+                        stats.sort_stats('cumulative').print_stats(50)
+                    else:
+                        report.write('No callback executed during the profiling window.\n')
+                else:
+                    import tracemalloc
+                    snapshot = tracemalloc.take_snapshot()
+                    tracemalloc.stop()
+                    report.write('Allocations of the whole process, not only of callbacks.\n')
+                    for stat in snapshot.statistics('traceback')[:50]:
+                        report.write('{0}\n'.format(stat))
+                        for line in stat.traceback.format():
+                            report.write(line + '\n')
+            self.lastReportFile = reportFile
+        logger.reportInfo('Profiling report written to {0}'.format(reportFile))
+
+    def enter(self):
+        """ Called before a callback is executed. Returns a token to pass to leave(). """
+        with self._lock:
+            profile = self._profile
+            if profile is None: return None
+            try:
+                profile.enable()
+            except ValueError:
+                # Another thread is currently being profiled.
+                return None
+            self._hasProfiled = True
+            self._inFlightCount += 1
+            return profile
+
+    def leave(self, token):
+        """ Called after a callback has been executed. token is the value returned by enter(). """
+        if token is None: return
+        token.disable()
+        with self._lock:
+            self._inFlightCount -= 1
+            if not self._inFlightCount:
+                self._idle.notify_all()
@@ -0,0 +1,222 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2012-2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+
+"""
+Load generator for the communicator.
+
+The EventStorm class sends linknx-style messages ("callback|objectId=...$", one connection per message) to a running communicator at a
+configurable rate and concurrency, with a choice of object distributions and burst shapes. It reports how many messages the communicator
+accepted, how many failed and why, and the latency of each message, i.e. the time between connecting and the communicator closing the
+connection once the callback has returned.
+"""
+
+import math
+import time
+import random
+import socket
+import collections
+from threading import Thread, Lock
+from xml.dom.minidom import parse
+from pyknx import logger
+
+DISTRIBUTIONS = ('uniform', 'zipf', 'sequential')
+SHAPES = ('constant', 'poisson', 'burst')
+
+def readTargets(configFile, communicatorName='pyknx'):
+    """ Return the list of tuples (callback name, object id) for the objects that have a callback in the given linknx configuration file. """
+    callbackAttributeName = '{0}callback'.format(communicatorName)
+    targets = []
+    for objectNode in parse(configFile).getElementsByTagName('object'):
+        callbackName = objectNode.getAttribute(callbackAttributeName)
+        if callbackName:
+            targets.append((callbackName, objectNode.getAttribute('id')))
+    return targets
+
+class StormStatistics(object):
+    """ Outcome of an event storm. Latencies are in seconds. """
+    def __init__(self):
+        self.acceptedCount = 0
+        self.failedCount = 0
+        self.errors = collections.Counter() # Key is exception class name.
+        self.latencies = []
+        self.maxLag = 0.0 # Largest delay between scheduled and actual sending times. A large lag means the concurrency is too low for the rate.
+        self.elapsed = 0.0
+
+    @property
+    def sentCount(self):
+        return self.acceptedCount + self.failedCount
+
+    @property
+    def rate(self):
+        """ Achieved number of accepted messages per second. """
+        return self.acceptedCount / self.elapsed if self.elapsed else 0.0
+
+    def getLatencyPercentile(self, percentile):
+        """ Return the given percentile (between 0 and 100) of the latencies of accepted messages, using the nearest-rank method. """
+        if not self.latencies: return None
+        latencies = sorted(self.latencies)
+        rank = max(1, int(math.ceil(len(latencies) * percentile / 100.0)))
+        return latencies[rank - 1]
+
+    def toDict(self):
+        return {
+            'sent' : self.sentCount,
+            'accepted' : self.acceptedCount,
+            'failed' : self.failedCount,
+            'errors' : dict(self.errors),
+            'elapsed' : self.elapsed,
+            'rate' : self.rate,
+            'maxLag' : self.maxLag,
+            'latency' : dict(('p{0}'.format(p), self.getLatencyPercentile(p)) for p in (50, 90, 99, 100))}
+
+class EventStorm(object):
+    """ Sends a storm of linknx-style messages to a communicator. """
+    def __init__(self, communicatorAddress, targets, rate=100.0, concurrency=4, distribution='uniform', zipfExponent=1.0, shape='constant', burstSize=10, timeout=5.0, seed=None):
+        """
+        Initialize the storm.
+
+        communicatorAddress -- Address of the communicator, as a tuple (ip address, port).
+        targets -- List of tuples (callback name, object id) that messages are built from.
+        rate -- Average number of messages per second. 0 sends messages as fast as the concurrency allows.
+        concurrency -- Maximum number of messages being sent at the same time, like the ioport-tx connections of linknx.
+        distribution -- How targets are picked: 'uniform', 'zipf' (the first targets are much more frequent, according to zipfExponent) or 'sequential'.
+        zipfExponent -- Exponent of the zipf distribution. The higher, the more skewed.
+        shape -- How messages are spread over time: 'constant' (evenly spaced), 'poisson' (random arrivals) or 'burst' (burstSize messages at once, bursts being spaced so as to keep the average rate).
+        burstSize -- Number of messages per burst for the 'burst' shape.
+        timeout -- Time to wait for the communicator to accept the connection and to close it, in seconds.
+        seed -- Seed of the random generator, for reproducible storms.
+
+        """
+        if not targets:
+            raise Exception('No target to send messages to.')
+        if distribution not in DISTRIBUTIONS:
+            raise Exception('Unsupported distribution "{0}".'.format(distribution))
+        if shape not in SHAPES:
+            raise Exception('Unsupported shape "{0}".'.format(shape))
+        if rate < 0 or concurrency < 1 or burstSize < 1:
+            raise Exception('Rate must be positive, concurrency and burst size must be at least 1.')
+        self._communicatorAddress = communicatorAddress
+        self._targets = list(targets)
+        self._rate = rate
+        self._concurrency = concurrency
+        self._distribution = distribution
+        self._zipfExponent = zipfExponent
+        self._shape = shape
+        self._burstSize = burstSize
+        self._timeout = timeout
+        self._random = random.Random(seed)
+
+    def iterSchedule(self, eventCount=None, duration=None):
+        """ Yield tuples (time offset in seconds, callback name, object id) of the messages to send, in chronological order. """
+        if self._distribution == 'zipf':
+            cumulativeWeights = []
+            total = 0.0
+            for rank in range(1, len(self._targets) + 1):
+                total += 1.0 / rank ** self._zipfExponent
+                cumulativeWeights.append(total)
+        startTime = time.time()
+        offset = 0.0
+        index = 0
+        while (eventCount is None or index < eventCount) and (duration is None or offset < duration):
+            if self._distribution == 'uniform':
+                target = self._random.choice(self._targets)
+            elif self._distribution == 'zipf':
+                target = self._random.choices(self._targets, cum_weights=cumulativeWeights)[0]
+            else:
+                target = self._targets[index % len(self._targets)]
+            yield offset, target[0], target[1]
+
+            index += 1
+            if self._rate:
+                if self._shape == 'constant':
+                    offset = index / self._rate
+                elif self._shape == 'poisson':
+                    offset += self._random.expovariate(self._rate)
+                else:
+                    offset = (index // self._burstSize) * self._burstSize / self._rate
+            elif duration is not None and index % 100 == 0:
+                # Sending as fast as possible: the schedule has no time
+                # reference, stop on the actual elapsed time.
+                offset = time.time() - startTime
+
+    def run(self, eventCount=None, duration=None):
+        """
+        Send messages until eventCount messages have been sent or duration seconds have elapsed, whichever comes first, and return a StormStatistics.
+
+        At least one of eventCount and duration must be given.
+
+        """
+        if eventCount is None and duration is None:
+            raise Exception('Either an event count or a duration is required.')
+        statistics = StormStatistics()
+        lock = Lock()
+        startTime = time.time()
+        schedule = self.iterSchedule(eventCount, duration)
+
+        def send():
+            while True:
+                with lock:
+                    item = next(schedule, None)
+                if item is None: return
+                offset, callbackName, objectId = item
+                delay = startTime + offset - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                # Without rate, all messages are due immediately.
+                lag = -delay if self._rate else 0.0
+                error = None
+                sendStartTime = time.perf_counter()
+                try:
+                    self._send('{0}|objectId={1}'.format(callbackName, objectId))
+                    latency = time.perf_counter() - sendStartTime
+                except (OSError, ConnectionError) as e:
+                    error = e
+                with lock:
+                    statistics.maxLag = max(statistics.maxLag, lag)
+                    if error is None:
+                        statistics.acceptedCount += 1
+                        statistics.latencies.append(latency)
+                    else:
+                        statistics.failedCount += 1
+                        statistics.errors[error.__class__.__name__] += 1
+
+        threads = [Thread(target=send, name='Event Storm Thread {0}'.format(i)) for i in range(self._concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        statistics.elapsed = time.time() - startTime
+        logger.reportInfo('Sent {0} messages in {1:.3f}s: {2} accepted, {3} failed.'.format(statistics.sentCount, statistics.elapsed, statistics.acceptedCount, statistics.failedCount))
+        return statistics
+
+    def _send(self, data):
+        # Mimic linknx: one connection per message. The communicator closes it
+        # once the callback has returned.
+        connection = socket.create_connection(self._communicatorAddress, timeout=self._timeout)
+        try:
+            connection.sendall((data + '$').encode('utf8'))
+            connection.shutdown(socket.SHUT_WR)
+            while connection.recv(4096):
+                pass
+        finally:
+            connection.close()
@@ -0,0 +1,171 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2012-2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+"""
+Compact binary framing of communicator messages.
+
+Besides the linknx-compatible text messages ('callback|name=value$'), the communicator accepts binary frames. A frame carries a batch of calls
+whose arguments keep their type, and values may contain any character. A frame is made of:
+    MAGIC (1 byte), VERSION (1 byte), payload length (4 bytes), payload.
+The payload is a sequence of calls:
+    call := name, argument count (2 bytes), arguments
+    argument := name, type code (1 byte), value
+    name := length (2 bytes), UTF-8 bytes
+Values are encoded according to their type code: 'N' (None, no value), 'T' (True, no value), 'F' (False, no value), 'i' (8-byte signed integer),
+'d' (8-byte float), 's' (4-byte length followed by UTF-8 bytes). All integers are big endian.
+MAGIC is a byte that cannot start a text message, which lets the communicator tell both formats apart.
+Payloads longer than MAX_PAYLOAD_LENGTH are rejected, so that a bogus header cannot make the communicator allocate gigabytes.
+"""
+
+import struct
+import socket
+
+MAGIC = b'\xfb'
+VERSION = 1
+HEADER_LENGTH = 6
+MAX_PAYLOAD_LENGTH = 16 * 1024 * 1024
+
+_header = struct.Struct('>cBI')
+_uint16 = struct.Struct('>H')
+_uint32 = struct.Struct('>I')
+_int64 = struct.Struct('>q')
+_float64 = struct.Struct('>d')
+
+def encodeCalls(calls):
+    """
+    Encode calls into a frame.
+
+    calls -- Iterable of tuples (function name, dictionary of arguments). Argument values must be None, bool, int (64 bits), float or str.
+    Returns the frame as bytes.
+
+    """
+    chunks = []
+    append = chunks.append
+    for functionName, arguments in calls:
+        _appendString(append, functionName)
+        arguments = arguments or {}
+        append(_uint16.pack(len(arguments)))
+        for argName, argValue in arguments.items():
+            _appendString(append, argName)
+            if argValue is None:
+                append(b'N')
+            elif argValue is True:
+                append(b'T')
+            elif argValue is False:
+                append(b'F')
+            elif isinstance(argValue, int):
+                append(b'i')
+                append(_int64.pack(argValue))
+            elif isinstance(argValue, float):
+                append(b'd')
+                append(_float64.pack(argValue))
+            elif isinstance(argValue, str):
+                data = argValue.encode('utf8')
+                append(b's')
+                append(_uint32.pack(len(data)))
+                append(data)
+            else:
+                raise Exception('Unsupported type {0} for argument {1}.'.format(type(argValue).__name__, argName))
+    payload = b''.join(chunks)
+    if len(payload) > MAX_PAYLOAD_LENGTH:
+        raise Exception('Frame payload of {0} bytes exceeds the maximum of {1} bytes.'.format(len(payload), MAX_PAYLOAD_LENGTH))
+    return _header.pack(MAGIC, VERSION, len(payload)) + payload
+
+def _appendString(append, string):
+    data = string.encode('utf8')
+    append(_uint16.pack(len(data)))
+    append(data)
+
+def decodeHeader(header):
+    """ Return the payload length announced by a frame header (HEADER_LENGTH bytes). """
+    magic, version, payloadLength = _header.unpack(header)
+    if magic != MAGIC:
+        raise Exception('Not a binary frame.')
+    if version != VERSION:
+        raise Exception('Unsupported frame version {0}.'.format(version))
+    if payloadLength > MAX_PAYLOAD_LENGTH:
+        raise Exception('Frame payload of {0} bytes exceeds the maximum of {1} bytes.'.format(payloadLength, MAX_PAYLOAD_LENGTH))
+    return payloadLength
+
+def decodeCalls(payload):
+    """ Decode the payload of a frame into a list of tuples (function name, dictionary of arguments). """
+    view = memoryview(payload)
+    end = len(view)
+    offset = 0
+    calls = []
+    try:
+        while offset < end:
+            length, = _uint16.unpack_from(view, offset)
+            offset += 2
+            functionName = str(view[offset:offset + length], 'utf8')
+            offset += length
+            argCount, = _uint16.unpack_from(view, offset)
+            offset += 2
+            arguments = {}
+            for i in range(argCount):
+                length, = _uint16.unpack_from(view, offset)
+                offset += 2
+                argName = str(view[offset:offset + length], 'utf8')
+                offset += length
+                typeCode = view[offset]
+                offset += 1
+                if typeCode == 0x4e: # N
+                    argValue = None
+                elif typeCode == 0x54: # T
+                    argValue = True
+                elif typeCode == 0x46: # F
+                    argValue = False
+                elif typeCode == 0x69: # i
+                    argValue, = _int64.unpack_from(view, offset)
+                    offset += 8
+                elif typeCode == 0x64: # d
+                    argValue, = _float64.unpack_from(view, offset)
+                    offset += 8
+                elif typeCode == 0x73: # s
+                    length, = _uint32.unpack_from(view, offset)
+                    offset += 4
+                    argValue = str(view[offset:offset + length], 'utf8')
+                    offset += length
+                else:
+                    raise Exception('Unknown type code {0!r} for argument {1}.'.format(chr(typeCode), argName))
+                arguments[argName] = argValue
+            if offset > end:
+                raise Exception('Truncated frame.')
+            calls.append((functionName, arguments))
+    except (struct.error, IndexError):
+        raise Exception('Truncated frame.')
+    return calls
+
+def toTextMessage(functionName, arguments):
+    """ Return the text message equivalent to a call, e.g. for journaling. Types are lost and values are not escaped. """
+    message = functionName
+    for argName, argValue in arguments.items():
+        message += '|{0}={1}'.format(argName, argValue)
+    return message
+
+def sendCalls(address, calls, timeout=5):
+    """ Send a batch of calls to a communicator in a single frame. address is a tuple (hostname, port). """
+    connection = socket.create_connection(address, timeout=timeout)
+    try:
+        connection.sendall(encodeCalls(calls))
+    finally:
+        connection.close()
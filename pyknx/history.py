@@ -0,0 +1,285 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2012-2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+
+"""
+History of object values.
+
+A HistoryStore keeps the last values of each numeric object (type categories 'bool', 'int' and 'float') in a preallocated ring buffer of
+timestamps and values, so that user scripts can compute trends without keeping lists of past values themselves. It is fed by the reads
+and writes of a Linknx instance (see Linknx.enableHistory()) and by the events of grouped rules received by the communicator.
+
+Buffers are NumPy arrays when NumPy is installed, array.array of doubles otherwise. Queries return sequences of the same kind and work
+on whole arrays rather than looping over values in Python whenever NumPy is available.
+"""
+
+import time
+import array
+import bisect
+import operator
+import itertools
+from threading import Lock
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Type categories whose values are recorded. Booleans are stored as 0 and 1,
+# so that their mean is a duty cycle.
+NUMERIC_TYPE_CATEGORIES = ('bool', 'int', 'float')
+
+AGGREGATIONS = ('mean', 'min', 'max', 'last')
+
+class ValueHistory(object):
+    """ Ring buffer of the last (timestamp, value) pairs of an object. Timestamps are epoch times in seconds. Values are kept sorted by timestamp even if they are appended out of order. """
+    def __init__(self, capacity, usesNumPy=None):
+        """
+        Initialize an empty history.
+
+        capacity -- Maximum number of values kept. The oldest values are overwritten once the history is full.
+        usesNumPy -- Whether to store values in NumPy arrays. Defaults to True if NumPy is installed.
+
+        """
+        if capacity < 1:
+            raise Exception('History capacity must be at least 1.')
+        if usesNumPy is None:
+            usesNumPy = numpy is not None
+        elif usesNumPy and numpy is None:
+            raise Exception('NumPy is not installed.')
+        self._capacity = capacity
+        self._usesNumPy = usesNumPy
+        if usesNumPy:
+            self._timestamps = numpy.zeros(capacity)
+            self._values = numpy.zeros(capacity)
+        else:
+            self._timestamps = array.array('d', bytes(8 * capacity))
+            self._values = array.array('d', bytes(8 * capacity))
+        self._start = 0 # Index of the oldest value.
+        self._count = 0
+        self._lock = Lock()
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def usesNumPy(self):
+        return self._usesNumPy
+
+    def __len__(self):
+        return self._count
+
+    def append(self, timestamp, value):
+        """
+        Record a value.
+
+        Callers stamp values before taking the lock, so a concurrent append may already have recorded a later value. Such a value is
+        inserted at its place in time. If the history is full and the value is older than all the ones kept, it is dropped.
+
+        """
+        with self._lock:
+            position = self._count
+            while position and self._timestamps[self._getIndex(position - 1)] > timestamp:
+                position -= 1
+            if self._count == self._capacity:
+                if not position: return
+                # Overwrite the oldest value.
+                self._start = self._getIndex(1)
+                self._count -= 1
+                position -= 1
+            for later in range(self._count, position, -1):
+                destination = self._getIndex(later)
+                source = self._getIndex(later - 1)
+                self._timestamps[destination] = self._timestamps[source]
+                self._values[destination] = self._values[source]
+            index = self._getIndex(position)
+            self._timestamps[index] = timestamp
+            self._values[index] = value
+            self._count += 1
+
+    def _getIndex(self, position):
+        """ Return the buffer index of the value at the given position, the oldest value being at position 0. """
+        index = self._start + position
+        return index - self._capacity if index >= self._capacity else index
+
+    @property
+    def last(self):
+        """ Return the last tuple (timestamp, value) or None if the history is empty. """
+        with self._lock:
+            if not self._count: return None
+            index = (self._start + self._count - 1) % self._capacity
+            return (float(self._timestamps[index]), float(self._values[index]))
+
+    def getWindow(self, duration=None, now=None):
+        """
+        Return a tuple (timestamps, values) of the values recorded in the last duration seconds before now, in chronological order.
+
+        duration -- Length of the window in seconds. All values are returned if None.
+        now -- End of the window. Defaults to the current time.
+
+        """
+        with self._lock:
+            timestamps = self._getOrdered(self._timestamps)
+            values = self._getOrdered(self._values)
+        if duration is not None:
+            startTime = (time.time() if now is None else now) - duration
+            if self._usesNumPy:
+                first = int(numpy.searchsorted(timestamps, startTime, 'left'))
+            else:
+                first = bisect.bisect_left(timestamps, startTime)
+            timestamps = timestamps[first:]
+            values = values[first:]
+        return timestamps, values
+
+    def _getOrdered(self, buffer):
+        """ Return a copy of the used part of buffer, oldest value first. """
+        end = self._start + self._count
+        if end <= self._capacity:
+            return buffer[self._start:end]
+        if self._usesNumPy:
+            return numpy.concatenate((buffer[self._start:], buffer[:end - self._capacity]))
+        return buffer[self._start:] + buffer[:end - self._capacity]
+
+    def min(self, duration=None, now=None):
+        """ Return the minimum value over the window (see getWindow()), None if the window is empty. """
+        timestamps, values = self.getWindow(duration, now)
+        if not len(values): return None
+        return float(values.min()) if self._usesNumPy else min(values)
+
+    def max(self, duration=None, now=None):
+        """ Return the maximum value over the window (see getWindow()), None if the window is empty. """
+        timestamps, values = self.getWindow(duration, now)
+        if not len(values): return None
+        return float(values.max()) if self._usesNumPy else max(values)
+
+    def mean(self, duration=None, now=None):
+        """ Return the mean of the values over the window (see getWindow()), None if the window is empty. Values are not weighted by their duration. """
+        timestamps, values = self.getWindow(duration, now)
+        if not len(values): return None
+        return float(values.mean()) if self._usesNumPy else sum(values) / len(values)
+
+    def getRateOfChange(self, duration=None, now=None):
+        """ Return the slope of the least squares line through the values of the window (see getWindow()), in units per second. Returns None if there are less than two distinct timestamps. """
+        timestamps, values = self.getWindow(duration, now)
+        count = len(values)
+        if count < 2: return None
+        if self._usesNumPy:
+            t = timestamps - timestamps.mean()
+            denominator = float((t * t).sum())
+            if not denominator: return None
+            return float((t * (values - values.mean())).sum()) / denominator
+
+        # Center timestamps to preserve precision, epoch times being large.
+        origin = timestamps[0]
+        t = array.array('d', map(operator.sub, timestamps, itertools.repeat(origin, count)))
+        sumT = sum(t)
+        sumV = sum(values)
+        denominator = count * sum(map(operator.mul, t, t)) - sumT * sumT
+        if not denominator: return None
+        return (count * sum(map(operator.mul, t, values)) - sumT * sumV) / denominator
+
+    def resample(self, period, aggregation='mean', duration=None, now=None):
+        """
+        Aggregate the values of the window (see getWindow()) into periods of the given length.
+
+        period -- Length of each period in seconds. Periods are aligned on multiples of period since the epoch.
+        aggregation -- How the values of a period are aggregated: one of 'mean', 'min', 'max' or 'last'.
+        Returns a tuple (period start times, aggregated values). Periods without any value are omitted.
+
+        """
+        if aggregation not in AGGREGATIONS:
+            raise Exception('Unsupported aggregation "{0}".'.format(aggregation))
+        if period <= 0:
+            raise Exception('Resampling period must be positive.')
+        timestamps, values = self.getWindow(duration, now)
+        if not len(values):
+            return timestamps, values
+
+        if self._usesNumPy:
+            buckets = numpy.floor(timestamps / period)
+            starts = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(buckets)) + 1))
+            if aggregation == 'mean':
+                counts = numpy.diff(numpy.append(starts, len(values)))
+                aggregated = numpy.add.reduceat(values, starts) / counts
+            elif aggregation == 'min':
+                aggregated = numpy.minimum.reduceat(values, starts)
+            elif aggregation == 'max':
+                aggregated = numpy.maximum.reduceat(values, starts)
+            else:
+                aggregated = values[numpy.append(starts[1:] - 1, len(values) - 1)]
+            return buckets[starts] * period, aggregated
+
+        bucketTimes = array.array('d')
+        aggregated = array.array('d')
+        aggregate = {'mean' : lambda v: sum(v) / len(v), 'min' : min, 'max' : max, 'last' : lambda v: v[-1]}[aggregation]
+        for bucket, group in itertools.groupby(zip(timestamps, values), lambda item: item[0] // period):
+            bucketTimes.append(bucket * period)
+            aggregated.append(aggregate([value for timestamp, value in group]))
+        return bucketTimes, aggregated
+
+class HistoryStore(object):
+    """ Histories of numeric objects, by object id. """
+    def __init__(self, capacity=1024, usesNumPy=None):
+        """
+        Initialize the store.
+
+        capacity -- Number of values kept for each object.
+        usesNumPy -- Whether to store values in NumPy arrays. Defaults to True if NumPy is installed.
+
+        """
+        self._capacity = capacity
+        self._usesNumPy = usesNumPy
+        self._histories = {} # Key is object id, value is a ValueHistory.
+        self._lock = Lock()
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def objectIds(self):
+        """ Return the ids of the objects that have a history. """
+        return list(self._histories.keys())
+
+    def __contains__(self, objectId):
+        return objectId in self._histories
+
+    def get(self, objectId):
+        """ Return the ValueHistory of an object, None if no value has been recorded for it. """
+        return self._histories.get(objectId)
+
+    def record(self, objectId, typeCategory, value, timestamp=None):
+        """ Record the value of an object. Values of objects whose type category is not numeric, or that are not numbers, are ignored. """
+        if typeCategory not in NUMERIC_TYPE_CATEGORIES or not isinstance(value, (int, float)): return
+        history = self._histories.get(objectId)
+        if history is None:
+            with self._lock:
+                history = self._histories.get(objectId)
+                if history is None:
+                    history = ValueHistory(self._capacity, self._usesNumPy)
+                    self._histories[objectId] = history
+        history.append(time.time() if timestamp is None else timestamp, value)
+
+    def clear(self):
+        with self._lock:
+            self._histories = {}
@@ -0,0 +1,145 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2012-2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+"""
+Event journal of the communicator.
+
+A journal is an append-only text file that records every raw message received by the communicator, one message per line.
+Each line is a JSON array [receivedTime, callbackDuration, data] where receivedTime is the epoch time at which the message was received,
+callbackDuration is the time spent in the user callback in seconds and data is the raw message without its trailing '$'.
+The JournalPlayer class sends the messages of a journal back to a communicator, either at original or accelerated speed.
+"""
+
+import json
+import time
+import socket
+from threading import Lock
+from pyknx import logger
+
+class JournalEntry(object):
+    """ A message recorded in a journal. """
+    def __init__(self, receivedTime, callbackDuration, data):
+        self.receivedTime = receivedTime
+        self.callbackDuration = callbackDuration
+        self.data = data
+
+    def __repr__(self):
+        return 'JournalEntry({0}, {1}, {2})'.format(self.receivedTime, self.callbackDuration, self.data)
+
+class JournalWriter(object):
+    """ Appends messages received by the communicator to a journal file. """
+    def __init__(self, filename):
+        self._filename = filename
+        self._file = open(filename, 'a', encoding='utf-8', buffering=1)
+        self._lock = Lock()
+
+    @property
+    def filename(self):
+        return self._filename
+
+    def record(self, receivedTime, callbackDuration, data):
+        """
+        Append a message to the journal.
+
+        receivedTime -- Epoch time at which the message was received.
+        callbackDuration -- Time spent in the user callback, in seconds.
+        data -- The raw message, as received by the communicator.
+
+        """
+        line = json.dumps([round(receivedTime, 6), round(callbackDuration, 6), data], ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            if self._file is None: return
+            self._file.write(line + '\n')
+
+    def close(self):
+        with self._lock:
+            if self._file is None: return
+            self._file.close()
+            self._file = None
+
+def readJournal(filename):
+    """ Generator that yields the JournalEntry instances stored in a journal file. Malformed lines (e.g. a truncated last line) are skipped. """
+    with open(filename, 'r', encoding='utf-8') as journalFile:
+        for lineNumber, line in enumerate(journalFile, 1):
+            line = line.strip()
+            if not line: continue
+            try:
+                receivedTime, callbackDuration, data = json.loads(line)
+            except ValueError:
+                logger.reportWarning('Skipping malformed line #{0} in journal {1}.'.format(lineNumber, filename))
+                continue
+            yield JournalEntry(receivedTime, callbackDuration, data)
+
+class JournalPlayer(object):
+    """ Replays a journal against a running communicator, the same way linknx does with its ioport. """
+    def __init__(self, filename, communicatorAddress=('localhost', 1029), speed=1.0):
+        """
+        Initialize the player.
+
+        filename -- The journal file to replay.
+        communicatorAddress -- Address of the communicator, as a tuple (ip address, port).
+        speed -- Replay speed factor. 1 preserves the original timing, 10 replays ten times faster. 0 sends messages as fast as possible.
+
+        """
+        if speed < 0:
+            raise Exception('Replay speed must be positive.')
+        self._filename = filename
+        self._communicatorAddress = communicatorAddress
+        self._speed = speed
+        self.sentCount = 0
+        self.failedCount = 0
+        self.recordedCallbackDuration = 0.0
+
+    def play(self):
+        """ Send all messages of the journal. Returns the elapsed time in seconds. """
+        startTime = time.time()
+        firstReceivedTime = None
+        for entry in readJournal(self._filename):
+            if firstReceivedTime is None:
+                firstReceivedTime = entry.receivedTime
+
+            # Respect the original timing, scaled by the speed factor.
+            if self._speed:
+                delay = startTime + (entry.receivedTime - firstReceivedTime) / self._speed - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+            self.recordedCallbackDuration += entry.callbackDuration
+            try:
+                self._send(entry.data)
+                self.sentCount += 1
+            except socket.error:
+                logger.reportException('Could not send {0} to the communicator.'.format(entry.data))
+                self.failedCount += 1
+
+        elapsed = time.time() - startTime
+        logger.reportInfo('Replayed {0} messages in {1:.3f}s ({2} failed).'.format(self.sentCount, elapsed, self.failedCount))
+        return elapsed
+
+    def _send(self, data):
+        # Mimic linknx: one connection per message, closed right after
+        # sending.
+        connection = socket.create_connection(self._communicatorAddress, timeout=5)
+        try:
+            connection.sendall((data + '$').encode('utf8'))
+        finally:
+            connection.close()
@@ -25,27 +25,36 @@ import re
 import getopt
 import time
 import collections
+import socket
 from xml.dom.minidom import parseString, Document, Element
+from xml.parsers.expat import ExpatError
 from threading import *
-from pyknx import tcpsocket, logger
+from pyknx import tcpsocket, logger, metrics
 
 class Linknx:
     class SendMessageThread(Thread):
-        def __init__(self, name, message, commandName, linknx):
+        def __init__(self, name, message, commandName, linknx, metricName=None, socket=None):
             Thread.__init__(self, name='SendMessageThread {1} (id={0})'.format(id(self), name))
-            self.socket = tcpsocket.Socket()
+            # When a connected socket is provided, it is reused and left open.
+            self.ownsSocket = socket is None
+            self.socket = tcpsocket.Socket() if self.ownsSocket else socket
             self.linknx = linknx
             self.messageWithEncodingHeader = '<?xml version="1.0" encoding="utf-8"?>' + message
             self.commandName = commandName
+            self.metricName = metricName if metricName else commandName
             self.finalStatus = None
             self.answerDom = None
             self.error = None
 
         def run(self):
+            startTime = time.perf_counter()
             try:
-                self.socket.connect((self.linknx.host, self.linknx.port))
+                if self.ownsSocket:
+                    self.socket.connect((self.linknx.host, self.linknx.port))
                 logger.reportDebug('Message sent to linknx: ' + self.messageWithEncodingHeader)
                 answer = self.socket.sendString(self.messageWithEncodingHeader, encoding='utf8')
+                if not answer:
+                    raise ConnectionResetError('Connection closed by linknx.')
                 while True:
                     logger.reportDebug('Linknx answered ' + answer)
                     answerDom = parseString(answer[0:answer.rfind(chr(4))])
@@ -63,7 +72,9 @@ class Linknx:
                         self.answerDom = answerDom
                         break
             finally:
-                self.socket.close()
+                if self.ownsSocket:
+                    self.socket.close()
+                metrics.registry.observeCommand(self.metricName, time.perf_counter() - startTime, self.finalStatus != 'success')
                 if self.is_alive(): logger.reportDebug('Thread is now stopped.')
 
         @property
@@ -94,13 +105,27 @@ class Linknx:
         def __repr__(self):
             return 'InvalidObjectIdException({0})'.format(self._objectId)
 
-    def __init__(self, hostname='localhost', port=1028):
-        """ Initialize a Linknx wrapper. """
+    def __init__(self, hostname='localhost', port=1028, usesPersistentConnection=False):
+        """
+        Initialize a Linknx wrapper.
+
+        hostname -- Hostname of the machine running linknx.
+        port -- Port of the linknx XML server.
+        usesPersistentConnection -- If True, synchronous requests share a single connection to linknx instead of opening a new one each time. Call close() to release it.
+
+        """
         self._host = hostname
         self._port = port
         self._config = None
         self._objectConfig = None
         self._objects = {}
+        self._usesPersistentConnection = usesPersistentConnection
+        self._connection = None
+        self._connectionLock = Lock()
+        self._history = None
+        self._writeScheduler = None
+        self._valueTracker = None
+        self._readCoalescer = None
 
     @property
     def host(self):
@@ -137,7 +162,7 @@ class Linknx:
         """
 
         if self._config is None:
-            xmlConfig = self._sendMessage('Read Config', "<read><config></config></read>", 'read').getElementsByTagName('read')[0]
+            xmlConfig = self._sendMessage('Read Config', "<read><config></config></read>", 'read', metricName='config').getElementsByTagName('read')[0]
             self._config = xmlConfig.getElementsByTagName('config')[0]
 
         return self._config
@@ -154,7 +179,128 @@ class Linknx:
 
         return self._objectConfig
 
-    def executeAction(self, actionDetails):
+    @property
+    def history(self):
+        """ Return the HistoryStore fed by the values read from and written to linknx, None if history is not enabled (see enableHistory()). """
+        return self._history
+
+    def enableHistory(self, capacity=1024, usesNumPy=None):
+        """
+        Start recording the values of numeric objects each time they are read or written, and return the pyknx.history.HistoryStore that holds them.
+
+        capacity -- Number of values kept for each object.
+        usesNumPy -- Whether to store values in NumPy arrays. Defaults to True if NumPy is installed.
+        Calling this method again returns the existing store.
+
+        """
+        if self._history is None:
+            from pyknx.history import HistoryStore
+            self._history = HistoryStore(capacity, usesNumPy)
+        return self._history
+
+    @property
+    def writeScheduler(self):
+        """ Return the WriteScheduler that queues writes and actions, None if writes are sent immediately (see enableWriteScheduler()). """
+        return self._writeScheduler
+
+    def enableWriteScheduler(self, rate=20, burst=5, lineRate=None, lineBurst=None, priorityRules=(), maxBatchSize=20):
+        """
+        Queue writes of object values and actions in a pyknx.writescheduler.WriteScheduler, which sends them within rate limits, and return it.
+
+        rate -- Maximum number of telegrams per second on average, over the whole bus.
+        burst -- Number of telegrams that can be sent at once after a quiet period.
+        lineRate -- If set, maximum number of telegrams per second to each line of group addresses.
+        lineBurst -- Burst allowed to each line. Defaults to lineRate.
+        priorityRules -- List of tuples (regex, priority), where priority is 'high', 'normal' or 'low', that give the priority of writes to objects whose id matches regex.
+        maxBatchSize -- Maximum number of writes sent with a single request to linknx.
+        Once enabled, setting Object.value returns as soon as the write is queued and failures are only logged. Calling this method again returns the existing scheduler.
+
+        """
+        if self._writeScheduler is None:
+            from pyknx.writescheduler import WriteScheduler
+            scheduler = WriteScheduler(self, rate, burst, lineRate, lineBurst, priorityRules, maxBatchSize)
+            scheduler.start()
+            self._writeScheduler = scheduler
+        return self._writeScheduler
+
+    def disableWriteScheduler(self, timeout=None):
+        """ Send the writes and actions still queued, then send the next ones immediately again. """
+        scheduler = self._writeScheduler
+        if scheduler is None: return
+        scheduler.stop(timeout=timeout)
+        self._writeScheduler = None
+
+    @property
+    def valueTracker(self):
+        """ Return the ValueTracker used to skip redundant writes, None if they are not skipped (see enableWriteSuppression()). """
+        return self._valueTracker
+
+    def enableWriteSuppression(self, refreshInterval=None, refreshIntervals=None):
+        """
+        Skip writes of object values that linknx already has, and return the ValueTracker that remembers them.
+
+        The last value written to or read from each object is remembered, in the linknx string format (see Object.convertValueToString()). Writing the same value again does not send anything to linknx.
+        refreshInterval -- If set, a redundant write is sent anyway when the value was last written or read more than this number of seconds ago, so that the bus is refreshed periodically.
+        refreshIntervals -- Dictionary with object ids as keys and refresh intervals as values, to override refreshInterval for some objects.
+        Calling this method again returns the existing tracker.
+
+        """
+        if self._valueTracker is None:
+            self._valueTracker = ValueTracker(refreshInterval, refreshIntervals)
+        return self._valueTracker
+
+    @property
+    def readCoalescer(self):
+        """ Return the ReadCoalescer that merges concurrent reads, None if each read sends its own request (see enableReadCoalescing()). """
+        return self._readCoalescer
+
+    def enableReadCoalescing(self, window=0.005):
+        """
+        Merge the reads of object values issued concurrently by several threads into shared requests, and return the ReadCoalescer that does it.
+
+        window -- Time in seconds during which a read waits for other reads to join its request. With 0, reads are not delayed but a read still shares the request already sent for the same objects, if any.
+        A read that joins a request sent before it was issued may get values that are a few milliseconds old. If a shared request fails, all reads that share it fail.
+        Calling this method again returns the existing coalescer.
+
+        """
+        if self._readCoalescer is None:
+            self._readCoalescer = ReadCoalescer(self, window)
+        return self._readCoalescer
+
+    def takeSnapshot(self, patterns=None, objectIds=None):
+        """ Read the objects selected as in getObjects() with a single request and return their values as a pyknx.snapshot.Snapshot. """
+        from pyknx.snapshot import Snapshot
+        objects = self.getObjects(patterns, objectIds)
+        readTime = time.time()
+        return Snapshot(objects.getValues() if objects else {}, readTime)
+
+    def restoreSnapshot(self, snapshot, chunkSize=100, typeCategories=None, flags=None, skipsUnchanged=True):
+        """
+        Write the values of a pyknx.snapshot.Snapshot back to linknx with batched writes and return a pyknx.snapshot.RestoreReport.
+
+        chunkSize -- Maximum number of objects written with a single request.
+        typeCategories -- If set, only objects whose type category is in this list are restored.
+        flags -- If set, only objects that have all these flags (e.g. "w") are restored.
+        skipsUnchanged -- If True, objects whose current value already equals the snapshot value are not written.
+
+        """
+        from pyknx import snapshot as snapshotModule
+        return snapshotModule.restore(self, snapshot, chunkSize, typeCategories, flags, skipsUnchanged)
+
+    def close(self):
+        """ Close the persistent connection to linknx, if any. It is reopened on demand. """
+        with self._connectionLock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def clearCache(self):
+        """ Forget the configuration and objects read so far, so that they are read again from linknx next time they are needed. """
+        self._config = None
+        self._objectConfig = None
+        self._objects = {}
+
+    def executeAction(self, actionDetails, waitsForAnswer=False):
         if isinstance(actionDetails, str):
             actionXML = actionDetails
         elif isinstance(actionDetails, Document):
@@ -164,8 +310,14 @@ class Linknx:
         else:
             raise Exception('Unsupported action details: must be a minidom XML document or element or an XML string.')
 
+        if self._writeScheduler is not None:
+            self._writeScheduler.execute(actionXML, waits=waitsForAnswer)
+        else:
+            self._executeAction(actionXML, waitsForAnswer)
+
+    def _executeAction(self, actionXML, waitsForAnswer):
         # Build XML document to send to linknx.
-        self._sendMessage('Execute {0}'.format(actionXML), '<execute>{action}</execute>'.format(action=actionXML), 'execute', waitsForAnswer=False)
+        self._sendMessage('Execute {0}'.format(actionXML), '<execute>{action}</execute>'.format(action=actionXML), 'execute', waitsForAnswer=waitsForAnswer)
         logger.reportDebug('Action execution has been sent to linknx.')
 
     def waitForRemoteConnectionReady(self):
@@ -242,7 +394,21 @@ class Linknx:
             objects.extend([self.getObject(id) for id in self.objectConfig.keys()])
         return objects
 
-    def _sendMessage(self, purpose, message, commandName, waitsForAnswer=True):
+    def _iterValueStrings(self, objectIds):
+        """ Read objects with a single request and yield tuples (object id, value string) in the order of linknx's answer. """
+        objectRequests = ['<object id="{id}"/>'.format(id=objectId) for objectId in objectIds]
+        message = '<read><objects>{objects}</objects></read>'.format(objects=''.join(objectRequests))
+
+        answerDom = self._sendMessage('Read {0}'.format(', '.join(objectIds)), message, 'read')
+
+        # Walk the direct children of <objects> rather than collecting all
+        # <object> elements beforehand.
+        objectsNode = answerDom.getElementsByTagName("read")[0].getElementsByTagName("objects")[0]
+        for objectNode in objectsNode.childNodes:
+            if objectNode.nodeType != objectNode.ELEMENT_NODE or objectNode.tagName != 'object': continue
+            yield objectNode.getAttribute("id"), objectNode.getAttribute("value")
+
+    def _sendMessage(self, purpose, message, commandName, waitsForAnswer=True, metricName=None):
         """
         Sends an XML message to Linknx.
 
@@ -250,12 +416,11 @@ class Linknx:
         message -- An XML request that follows Linknx XML protocol.
         commandName -- The name of the XML command that is sent.
         waitsForAnswer -- If True, this method blocks until linknx has sent its final status. Otherwise, the method returns immediately. Linknx's answer would then be logged when it arrives.
+        metricName -- The name under which the round trip time is recorded in the metrics module. Defaults to commandName.
         Returns an XML document that corresponds to Linknx answer if waitsForAnswer is False, None otherwise.
 
         """
         # logger.reportDebug('Sending message to linknx: ' + message)
-        messagingThread = Linknx.SendMessageThread(purpose, message, commandName, self)
-
         if waitsForAnswer:
             # CAUTION - PERFORMANCE WARNING
             # Call run() directly to avoid starting Thread. That will let the
@@ -269,7 +434,11 @@ class Linknx:
             # Thread's work implementation may have been extracted into another
             # object to make things cleaner but reusing the Thread object is
             # quite straightforward.
-            messagingThread.run()
+            if self._usesPersistentConnection:
+                messagingThread = self._sendMessageOnPersistentConnection(purpose, message, commandName, metricName)
+            else:
+                messagingThread = Linknx.SendMessageThread(purpose, message, commandName, self, metricName)
+                messagingThread.run()
 
             if messagingThread.finalStatus != 'success':
                 raise Exception(messagingThread.error)
@@ -280,9 +449,36 @@ class Linknx:
             # Do not care about final status here. Error would be logged by
             # messaging thread. Client does not want to wait for answer so not
             # notifying the error with an exception makes sense.
+            messagingThread = Linknx.SendMessageThread(purpose, message, commandName, self, metricName)
             messagingThread.start()
             return None
 
+    def _sendMessageOnPersistentConnection(self, purpose, message, commandName, metricName):
+        with self._connectionLock:
+            # Try twice, in case linknx has closed the connection in the
+            # meantime.
+            for attempt in (1, 2):
+                isNewConnection = self._connection is None
+                if isNewConnection:
+                    self._connection = tcpsocket.Socket()
+                    self._connection.connect(self.address)
+                messagingThread = Linknx.SendMessageThread(purpose, message, commandName, self, metricName, self._connection)
+                try:
+                    messagingThread.run()
+                    return messagingThread
+                except socket.timeout:
+                    # Linknx may have processed the request: do not send it
+                    # again.
+                    self._connection.close()
+                    self._connection = None
+                    raise
+                except (OSError, ExpatError):
+                    # The connection is in an unknown state, do not reuse it.
+                    self._connection.close()
+                    self._connection = None
+                    if isNewConnection or attempt == 2: raise
+                    logger.reportDebug('Persistent connection to linknx lost, reconnecting.')
+
 class ObjectConfig:
     def __init__(self, configNode):
         """    Configuration of an object in Linknx. """
@@ -295,25 +491,31 @@ class ObjectConfig:
         self.init = configNode.getAttribute('init') if configNode.hasAttribute('init') else 'request'
         self.flags = configNode.getAttribute('flags') if configNode.hasAttribute('flags') else 'cwtu'
         self.caption = ObjectConfig.getTextInElement(configNode, mustFind=False).strip('\n\t ')
-        firstTypeDigit = self.type[0:self.type.find('.')]
+        self.typeCategory = ObjectConfig.getTypeCategory(self.type)
+        if self.typeCategory == 'unknown':
+            logger.reportWarning('Object ' + self.id + ' has an unsupported type ' + self.type)
+
+    @staticmethod
+    def getTypeCategory(objectType):
+        """ Return the category of a linknx object type, e.g. 'float' for '9.001': one of 'bool', 'int', 'float', 'string', 'date', 'time' or 'unknown'. """
+        firstTypeDigit = objectType[0:objectType.find('.')]
         if firstTypeDigit == '1':
-            self.typeCategory = 'bool'
+            return 'bool'
         elif firstTypeDigit in ['5', '6', '7', '8', '9', '12', '13', '29']:
-            if self.type in ('5.001', '5.003') or firstTypeDigit == '9':
-                self.typeCategory='float'
+            if objectType in ('5.001', '5.003') or firstTypeDigit == '9':
+                return 'float'
             else:
-                self.typeCategory = 'int'
+                return 'int'
         elif firstTypeDigit == '14':
-            self.typeCategory = 'float'
+            return 'float'
         elif firstTypeDigit in ('4', '16', '28'):
-            self.typeCategory = 'string'
+            return 'string'
         elif firstTypeDigit == '10':
-            self.typeCategory = 'time'
+            return 'time'
         elif firstTypeDigit == '11':
-            self.typeCategory = 'date'
+            return 'date'
         else:
-            logger.reportWarning('Object ' + self.id + ' has an unsupported type ' + self.type)
-            self.typeCategory = 'unknown'
+            return 'unknown'
 
     @staticmethod
     def getTextInElement(elt, mustFind = True):
@@ -328,6 +530,153 @@ class ObjectConfig:
             raise Exception('Missing text in element {0}'.format(elt.nodeName))
         return text
 
+class ValueTracker(object):
+    """ Last known value of each object, used to skip writes that would not change it. See Linknx.enableWriteSuppression(). """
+    def __init__(self, refreshInterval=None, refreshIntervals=None):
+        self.refreshInterval = refreshInterval
+        self.refreshIntervals = dict(refreshIntervals) if refreshIntervals else {}
+        self._values = {} # Key is object id, value is a tuple (value string, monotonic time at which it was known).
+        self._versions = collections.Counter() # Key is object id, value is the number of writes observed so far.
+        self._suppressedCounts = collections.Counter() # Key is object id.
+        self._lock = Lock()
+
+    @property
+    def suppressedCount(self):
+        """ Total number of writes skipped so far. """
+        with self._lock:
+            return sum(self._suppressedCounts.values())
+
+    @property
+    def suppressedCounts(self):
+        """ Return a dictionary with object ids as keys and the number of writes skipped so far as values. """
+        with self._lock:
+            return dict(self._suppressedCounts)
+
+    def getValue(self, objectId):
+        """ Return the last known value string of an object, None if unknown. """
+        with self._lock:
+            knownValue = self._values.get(objectId)
+        return knownValue[0] if knownValue is not None else None
+
+    def getVersion(self, objectId):
+        """ Return the number of writes to the object observed so far. Take it before reading a value, to pass it to observe(). """
+        with self._lock:
+            return self._versions[objectId]
+
+    def observe(self, objectId, valueString, now=None, version=None):
+        """
+        Remember that the object has the given value, in the linknx string format (see Object.convertValueToString()).
+
+        version -- Value of getVersion() before the value was read. If a write has been observed since then, the value may predate it and is ignored.
+
+        """
+        with self._lock:
+            if version is not None and self._versions[objectId] != version:
+                return
+            self._values[objectId] = (valueString, time.monotonic() if now is None else now)
+
+    def observeWrite(self, objectId, valueString, now=None):
+        """ Remember that the given value has been written to the object. Values being read concurrently are then ignored. """
+        with self._lock:
+            self._versions[objectId] += 1
+            self._values[objectId] = (valueString, time.monotonic() if now is None else now)
+
+    def invalidateReads(self, objectId):
+        """ Ignore values of the object that are being read concurrently, without changing its known value. Used when a queued write is sent. """
+        with self._lock:
+            self._versions[objectId] += 1
+
+    def forget(self, objectId=None):
+        """ Forget the value of an object, or of all objects if objectId is None, so that the next write is sent. """
+        with self._lock:
+            if objectId is None:
+                self._values.clear()
+            else:
+                self._values.pop(objectId, None)
+
+    def isRedundant(self, objectId, valueString, now=None):
+        """ Return True and count a suppressed write if the object is known to have this value and does not need a refresh yet. """
+        if now is None: now = time.monotonic()
+        refreshInterval = self.refreshIntervals.get(objectId, self.refreshInterval)
+        with self._lock:
+            knownValue = self._values.get(objectId)
+            if knownValue is None or knownValue[0] != valueString:
+                return False
+            if refreshInterval is not None and now - knownValue[1] >= refreshInterval:
+                return False
+            self._suppressedCounts[objectId] += 1
+            return True
+
+class ReadCoalescer(object):
+    """ Single-flight reads of object values. See Linknx.enableReadCoalescing(). """
+    class _Batch(object):
+        def __init__(self):
+            self.objectIds = set()
+            self.valueStrings = None # Dictionary with object ids as keys, once read.
+            self.error = None
+            self.doneEvent = Event()
+
+    def __init__(self, linknx, window=0.005):
+        self._linknx = linknx
+        self.window = window
+        self._lock = Lock()
+        self._collectingBatch = None # Batch that reads can still join, not sent yet.
+        self._batches = {} # Key is object id, value is the batch that is collecting or reading it.
+        self._counts = collections.Counter() # Keys are 'reads', 'sharedReads' and 'requests'.
+
+    def getStatistics(self):
+        """ Return a dictionary with the number of 'reads', of 'sharedReads' (reads that did not send their own request) and of 'requests' sent to linknx. """
+        with self._lock:
+            return dict((key, self._counts[key]) for key in ('reads', 'sharedReads', 'requests'))
+
+    def read(self, objectIds):
+        """ Return a dictionary with object ids as keys and value strings as values. Objects missing from linknx's answer are missing from the dictionary. """
+        batches = set()
+        isLeader = False
+        with self._lock:
+            self._counts['reads'] += 1
+            for objectId in objectIds:
+                batch = self._batches.get(objectId)
+                if batch is None:
+                    if self._collectingBatch is None:
+                        self._collectingBatch = ReadCoalescer._Batch()
+                        isLeader = True
+                    batch = self._collectingBatch
+                    batch.objectIds.add(objectId)
+                    self._batches[objectId] = batch
+                batches.add(batch)
+            if not isLeader:
+                self._counts['sharedReads'] += 1
+
+        if isLeader:
+            # Let other reads join, then send the batch on their behalf.
+            if self.window > 0:
+                time.sleep(self.window)
+            with self._lock:
+                batch = self._collectingBatch
+                self._collectingBatch = None
+                self._counts['requests'] += 1
+            try:
+                batch.valueStrings = dict(self._linknx._iterValueStrings(sorted(batch.objectIds)))
+            except Exception as e:
+                batch.error = e
+            finally:
+                with self._lock:
+                    for objectId in batch.objectIds:
+                        if self._batches.get(objectId) is batch:
+                            del self._batches[objectId]
+                batch.doneEvent.set()
+
+        valueStrings = {}
+        for batch in batches:
+            batch.doneEvent.wait()
+            if batch.error is not None:
+                raise Exception('Shared read failed: {0}'.format(batch.error))
+            for objectId in objectIds:
+                if objectId in batch.valueStrings:
+                    valueStrings[objectId] = batch.valueStrings[objectId]
+        return valueStrings
+
 class Object(object):
 
     """ Linknx object. """
@@ -376,6 +725,17 @@ class Object(object):
         """ Return the string corresponding to the type attribute in XML configuration. """
         self._objectConfig.type
 
+    @property
+    def typeCategory(self):
+        """ Return the category of the object's type: one of 'bool', 'int', 'float', 'string', 'date', 'time'. """
+        return self._objectConfig.typeCategory
+
+    @property
+    def history(self):
+        """ Return the ValueHistory of the object, None if history is not enabled on the Linknx instance or if no value has been recorded yet. """
+        history = self._linknx.history
+        return history.get(self._id) if history is not None else None
+
     @property
     def value(self):
         """ Read object's value from linknx. """
@@ -401,6 +761,13 @@ class Object(object):
 
         return objectValue
 
+    def normalizeValueString(self, valueString):
+        """ Return the canonical form of a value in the linknx string format, e.g. "20.0" for "20" if the object is a float, so that values can be compared. """
+        try:
+            return self.convertValueToString(self.convertStringToValue(valueString))
+        except (ValueError, TypeError):
+            return valueString
+
     def convertStringToValue(self, valueString):
         if self._objectConfig.typeCategory == 'bool':
             return valueString in ['on', '1', 'yes', 'true']
@@ -421,6 +788,19 @@ class Object(object):
         if not objValue is objectValue:
             logger.reportDebug('Value has been converted to ' + str(objectValue))
 
+        tracker = self._linknx.valueTracker
+        if tracker is not None:
+            trackedValue = self.normalizeValueString(objectValue)
+            if tracker.isRedundant(self._id, trackedValue):
+                logger.reportDebug('{0} already is {1}, write is skipped.'.format(self._id, objectValue))
+                return
+
+        scheduler = self._linknx.writeScheduler
+        if scheduler is not None:
+            scheduler.write(self, objectValue)
+            if tracker is not None: tracker.observeWrite(self._id, trackedValue)
+            return
+
         # Initialize DOM with a simple string, then use minidom to write
         # attributes so that special characters are properly encoded (for
         # instance, &ampersand; in place of &, etc).
@@ -429,6 +809,10 @@ class Object(object):
         objectNode.setAttribute('id', self._id)
         objectNode.setAttribute('value', objectValue)
         answerDom = self._linknx._sendMessage('Write {0}={1}'.format(self.id, objValue), messageDom.toxml(), 'write')
+        if tracker is not None: tracker.observeWrite(self._id, trackedValue)
+        history = self._linknx.history
+        if history is not None:
+            history.record(self._id, self._objectConfig.typeCategory, self.convertStringToValue(objectValue))
 
     def __repr__(self):
         return self.id
@@ -443,27 +827,72 @@ class ObjectCollection(list):
 
     def getValues(self):
         """ Returns a dictionary with object identifiers as keys and object values as values. """
-        objectRequests = ['<object id="{id}"/>'.format(id=object.id) for object in self]
-        message = '<read><objects>{objects}</objects></read>'.format(objects=''.join(objectRequests))
+        return dict(self.iterValues())
 
-        answerDom = self._linknx._sendMessage('Read {0}'.format(self), message, 'read')
+    def setValues(self, values, tracksValues=True):
+        """
+        Write the values of all objects with a single request.
 
-        # Extract all object values from linknx's answer and store them by
-        # object id.
-        readNodes = answerDom.getElementsByTagName("read")
-        valueStr = None
-        objectValueStringsById = {}
-        objectsNodes = readNodes[0].getElementsByTagName("objects")
-        objectNodes = objectsNodes[0].getElementsByTagName("object")
-        for objectNode in objectNodes:
-            objectId = objectNode.getAttribute("id")
-            objectValueStringsById[objectId] = objectNode.getAttribute("value")
+        values -- Dictionary with object ids as keys and values as values. It must provide a value for each object of the collection.
+        tracksValues -- If False, the values are not remembered by the tracker of redundant writes (see Linknx.enableWriteSuppression()), e.g. because they have been when the writes were queued.
 
-        # Make sure we have a value for each requested object.
-        objectValues = {}
+        """
+        messageDom = parseString('<write/>')
+        writeNode = messageDom.documentElement
+        convertedValues = []
         for obj in self:
-            if not obj.id in objectValueStringsById:
-                raise Exception("Failed to evaluate object {0}.".format(obj))
-            objectValues[obj.id] = obj.convertStringToValue(objectValueStringsById[obj.id]) 
+            objectValue = obj.convertValueToString(values[obj.id])
+            objectNode = messageDom.createElement('object')
+            objectNode.setAttribute('id', obj.id)
+            objectNode.setAttribute('value', objectValue)
+            writeNode.appendChild(objectNode)
+            convertedValues.append((obj, objectValue))
+        self._linknx._sendMessage('Write {0}'.format(self), messageDom.toxml(), 'write')
+        tracker = self._linknx.valueTracker
+        if tracker is not None and tracksValues:
+            for obj, objectValue in convertedValues:
+                tracker.observeWrite(obj.id, obj.normalizeValueString(objectValue))
+        history = self._linknx.history
+        if history is not None:
+            writeTime = time.time()
+            for obj, objectValue in convertedValues:
+                history.record(obj.id, obj.typeCategory, obj.convertStringToValue(objectValue), writeTime)
+
+    def iterValues(self):
+        """
+        Read all objects with a single request and yield tuples (object id, value) in the order of linknx's answer.
 
-        return objectValues
+        Values are converted one at a time, as the answer is walked through. An exception is raised after the last tuple if linknx did not return a value for each object.
+        When read coalescing is enabled (see Linknx.enableReadCoalescing()), the request may be shared with other threads and tuples come in the order of the collection.
+
+        """
+        # Values read while objects are being written may be stale: only
+        # remember those of objects that have not been written in the meantime.
+        tracker = self._linknx.valueTracker
+        versions = dict((obj.id, tracker.getVersion(obj.id)) for obj in self) if tracker is not None else None
+
+        coalescer = self._linknx.readCoalescer
+        if coalescer is not None:
+            valueStrings = coalescer.read([obj.id for obj in self])
+            answer = [(obj.id, valueStrings[obj.id]) for obj in self if obj.id in valueStrings]
+        else:
+            answer = self._linknx._iterValueStrings([obj.id for obj in self])
+
+        objectsById = dict((obj.id, obj) for obj in self)
+        missingIds = set(objectsById)
+        history = self._linknx.history
+        readTime = time.time()
+        for objectId, valueString in answer:
+            obj = objectsById.get(objectId)
+            if obj is None: continue
+            missingIds.discard(objectId)
+            value = obj.convertStringToValue(valueString)
+            if tracker is not None:
+                tracker.observe(objectId, obj.normalizeValueString(valueString), version=versions[objectId])
+            if history is not None:
+                history.record(objectId, obj.typeCategory, value, readTime)
+            yield objectId, value
+
+        # Make sure we have a value for each requested object.
+        if missingIds:
+            raise Exception("Failed to evaluate object {0}.".format(', '.join(sorted(missingIds))))
@@ -28,7 +28,6 @@ This module automatically adds a handler for signal USR1, which should be sent t
 """
 
 import logging
-import traceback
 import os.path
 import sys
 import signal
@@ -124,9 +123,15 @@ def _usr1SignalHandler(signalNumber, frame):
         _setHandlers(fileLog, stdOutLog)
 
 def _reportMessage(message, level):
-    stack = traceback.extract_stack()
-    frame = stack[len(stack) -3]
-    extraDict={'callerfilename' : os.path.basename(frame[0]), 'callerlineno' : frame[1]}
+    # Skip messages that no handler would output. This is the common case
+    # for debug messages and saves inspecting the caller.
+    handlers = logging.getLogger().handlers
+    if handlers and all(level < handler.level for handler in handlers):
+        return
+
+    # The frame of the caller of reportXXX().
+    frame = sys._getframe(2)
+    extraDict={'callerfilename' : os.path.basename(frame.f_code.co_filename), 'callerlineno' : frame.f_lineno}
     logging.getLogger().log(level, message, extra=extraDict)
 
 def reportDebug(message):
@@ -150,5 +155,6 @@ def reportInfo(message):
 
 def reportException(message=None):
     """ Reports an exception. Exception info is gotten from sys.exc_info(). """
+    import traceback
     if not message: message = 'Exception caught.'
     _reportMessage(message + ' Traceback is:\n' + traceback.format_exc(), logging.ERROR)
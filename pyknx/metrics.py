@@ -0,0 +1,234 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2012-2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+"""
+Instrumentation of pyknx.
+
+This module collects counters and latency histograms for user callbacks executed by the communicator and for requests sent to linknx.
+Metrics are gathered in the module-level 'registry' object. They can be read from Python (see Metrics.getSnapshot()) or exposed in the
+Prometheus text exposition format through a small HTTP server (see MetricsServer).
+Recording a sample costs a bisection and a few additions under a lock, so that instrumentation can be left on in production.
+"""
+
+import time
+from bisect import bisect_left
+from threading import Lock, Thread
+from pyknx import logger
+
+# Upper bounds of histogram buckets, in seconds.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram(object):
+    """ A cumulative histogram in the spirit of Prometheus histograms. """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # Last one is +Inf.
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def getCumulativeCounts(self):
+        """ Return a list of tuples (upper bound, count of samples lower or equal to the bound). The last bound is float('inf'). """
+        cumulativeCounts = []
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            cumulativeCounts.append((bound, total))
+        return cumulativeCounts
+
+    def getQuantile(self, quantile):
+        """ Estimate a quantile (between 0 and 1) by linear interpolation within buckets. Returns None if the histogram is empty. """
+        if self.count == 0: return None
+        rank = quantile * self.count
+        lowerBound = 0.0
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            if count and total + count >= rank:
+                return lowerBound + (bound - lowerBound) * (rank - total) / count
+            total += count
+            lowerBound = bound
+        return self.buckets[-1]
+
+class Metrics(object):
+    """ Set of counters and histograms about communicator callbacks and linknx requests. """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.isEnabled = True
+        self._buckets = buckets
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._callbackDurations = {} # Key is callback name, value is a Histogram.
+            self._callbackQueueTimes = {} # Key is callback name, value is a Histogram.
+            self._callbackErrors = {} # Key is callback name, value is the error count.
+            self._commandDurations = {} # Key is command name, value is a Histogram.
+            self._commandErrors = {} # Key is command name, value is the error count.
+
+    def observeCallback(self, callbackName, duration, failed=False, queueTime=None):
+        """
+        Record the execution of a user callback.
+
+        callbackName -- Name of the user function.
+        duration -- Execution time of the function, in seconds.
+        failed -- True if the function raised an exception.
+        queueTime -- Time elapsed between the reception of the message that triggered the call and the beginning of the call, if relevant.
+
+        """
+        if not self.isEnabled: return
+        with self._lock:
+            self._observe(self._callbackDurations, callbackName, duration)
+            if queueTime is not None:
+                self._observe(self._callbackQueueTimes, callbackName, queueTime)
+            if failed:
+                self._callbackErrors[callbackName] = self._callbackErrors.get(callbackName, 0) + 1
+
+    def observeCommand(self, commandName, duration, failed=False):
+        """
+        Record a round trip to linknx.
+
+        commandName -- One of 'read', 'write', 'execute' or 'config'.
+        duration -- Time elapsed between connection to linknx and reception of the final status, in seconds.
+        failed -- True if linknx did not answer with a success status.
+
+        """
+        if not self.isEnabled: return
+        with self._lock:
+            self._observe(self._commandDurations, commandName, duration)
+            if failed:
+                self._commandErrors[commandName] = self._commandErrors.get(commandName, 0) + 1
+
+    def _observe(self, histograms, name, value):
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = Histogram(self._buckets)
+            histograms[name] = histogram
+        histogram.observe(value)
+
+    def getSnapshot(self):
+        """
+        Return a dictionary that summarizes all metrics.
+
+        The 'callbacks' and 'commands' keys map callback or command names to dictionaries with the count, error count,
+        total duration and estimated 50th/90th/99th percentiles of the duration.
+
+        """
+        def summarize(histograms, errors):
+            summary = {}
+            for name, histogram in histograms.items():
+                summary[name] = {'count' : histogram.count, 'errors' : errors.get(name, 0), 'sum' : histogram.sum,
+                                 'p50' : histogram.getQuantile(0.5), 'p90' : histogram.getQuantile(0.9), 'p99' : histogram.getQuantile(0.99)}
+            return summary
+
+        with self._lock:
+            return {'callbacks' : summarize(self._callbackDurations, self._callbackErrors),
+                    'callbackQueueTimes' : summarize(self._callbackQueueTimes, {}),
+                    'commands' : summarize(self._commandDurations, self._commandErrors)}
+
+    def toPrometheus(self):
+        """ Return all metrics in the Prometheus text exposition format. """
+        lines = []
+        with self._lock:
+            self._appendCounter(lines, 'pyknx_callback_calls_total', 'Number of user callback calls.', 'callback', dict((name, h.count) for name, h in self._callbackDurations.items()))
+            self._appendCounter(lines, 'pyknx_callback_errors_total', 'Number of user callback calls that raised an exception.', 'callback', self._callbackErrors)
+            self._appendHistograms(lines, 'pyknx_callback_duration_seconds', 'Execution time of user callbacks.', 'callback', self._callbackDurations)
+            self._appendHistograms(lines, 'pyknx_callback_queue_seconds', 'Time between reception of a message and the start of its callback.', 'callback', self._callbackQueueTimes)
+            self._appendCounter(lines, 'pyknx_linknx_requests_total', 'Number of requests sent to linknx.', 'command', dict((name, h.count) for name, h in self._commandDurations.items()))
+            self._appendCounter(lines, 'pyknx_linknx_errors_total', 'Number of requests that linknx did not complete successfully.', 'command', self._commandErrors)
+            self._appendHistograms(lines, 'pyknx_linknx_request_duration_seconds', 'Round trip time of requests sent to linknx.', 'command', self._commandDurations)
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _escapeLabel(value):
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def _appendCounter(self, lines, metricName, help, labelName, values):
+        lines.append('# HELP {0} {1}'.format(metricName, help))
+        lines.append('# TYPE {0} counter'.format(metricName))
+        for name in sorted(values):
+            lines.append('{0}{{{1}="{2}"}} {3}'.format(metricName, labelName, self._escapeLabel(name), values[name]))
+
+    def _appendHistograms(self, lines, metricName, help, labelName, histograms):
+        lines.append('# HELP {0} {1}'.format(metricName, help))
+        lines.append('# TYPE {0} histogram'.format(metricName))
+        for name in sorted(histograms):
+            histogram = histograms[name]
+            label = self._escapeLabel(name)
+            for bound, count in histogram.getCumulativeCounts():
+                boundStr = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('{0}_bucket{{{1}="{2}",le="{3}"}} {4}'.format(metricName, labelName, label, boundStr, count))
+            lines.append('{0}_sum{{{1}="{2}"}} {3}'.format(metricName, labelName, label, repr(histogram.sum)))
+            lines.append('{0}_count{{{1}="{2}"}} {3}'.format(metricName, labelName, label, histogram.count))
+
+# Default registry used throughout pyknx.
+registry = Metrics()
+
+class MetricsServer(Thread):
+    """ Thread that serves the metrics of a registry over HTTP, in the Prometheus text format. """
+    def __init__(self, address=('localhost', 9129), metrics=None):
+        Thread.__init__(self, name='Metrics Server Thread')
+        self.daemon = True
+        self._address = address
+        self._metrics = metrics if metrics is not None else registry
+        self._server = None
+
+    @property
+    def address(self):
+        """ Return the actual listening address. Useful when binding to port 0. """
+        return self._server.server_address if self._server else self._address
+
+    def start(self):
+        # Bind synchronously so that errors are reported to the caller.
+        from http.server import HTTPServer, BaseHTTPRequestHandler
+        metrics = self._metrics
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = metrics.toPrometheus().encode('utf8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.reportDebug('Metrics server: ' + format % args)
+
+        self._server = HTTPServer(self._address, RequestHandler)
+        logger.reportInfo('Serving metrics on {0}'.format(self.address))
+        Thread.start(self)
+
+    def run(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        if self._server is None: return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
@@ -0,0 +1,238 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2012-2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+"""
+Request/response channel to call user functions of the communicator.
+
+Unlike the linknx-compatible text messages, each call carries an identifier and gets an answer that holds either the value returned by
+the function or the error it raised. A connection can carry any number of calls, and calls can be pipelined: several requests can be
+sent before reading the answers, which come back in completion order.
+
+Requests and answers are JSON objects, one per line:
+    {"id": 1, "function": "onEvent", "arguments": {"eventId": 3}, "timeout": 10}
+    {"id": 1, "result": true}
+    {"id": 1, "error": {"type": "ValueError", "message": "..."}}
+Arguments and results are JSON values, so that their type is preserved. A call that is still queued when its timeout expires is not
+executed and is answered with a "Timeout" error. Timeouts are also enforced by RPCClient while waiting for answers.
+"""
+
+import json
+import time
+import socket
+from threading import Thread, Lock
+from pyknx import logger
+
+class RPCError(Exception):
+    """ The remote function raised an exception, or the call could not be performed. """
+    def __init__(self, type, message):
+        Exception.__init__(self, '{0}: {1}'.format(type, message))
+        self.type = type
+        self.message = message
+
+class RPCTimeoutError(RPCError):
+    """ No answer was received in time. """
+    def __init__(self, message):
+        RPCError.__init__(self, 'Timeout', message)
+
+class RPCServer(object):
+    """ Serves calls to a handler function over TCP. """
+    def __init__(self, address, handler, maxWorkers=4):
+        """
+        Initialize the server. Call start() to start serving.
+
+        address -- Address to listen on, as a tuple (ip address, port).
+        handler -- Function called as handler(functionName, arguments) for each request. Its return value is sent back to the caller.
+        maxWorkers -- Maximum number of calls executed concurrently.
+
+        """
+        self._address = address
+        self._handler = handler
+        self._maxWorkers = maxWorkers
+        self._server = None
+        self._executor = None
+
+    @property
+    def address(self):
+        """ Return the actual listening address. Useful when binding to port 0. """
+        return self._server.server_address if self._server else self._address
+
+    def start(self):
+        # Bind synchronously so that errors are reported to the caller.
+        import socketserver
+        from concurrent.futures import ThreadPoolExecutor
+        rpcServer = self
+
+        class RequestHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                writeLock = Lock()
+                for line in self.rfile:
+                    receivedTime = time.monotonic()
+                    try:
+                        request = json.loads(line.decode('utf8'))
+                    except ValueError as e:
+                        self._sendAnswer(writeLock, {'id' : None, 'error' : {'type' : 'ProtocolError', 'message' : 'Malformed request: {0}'.format(e)}})
+                        continue
+                    rpcServer._executor.submit(rpcServer._processRequest, request, receivedTime, lambda answer: self._sendAnswer(writeLock, answer))
+
+            def _sendAnswer(self, writeLock, answer):
+                data = json.dumps(answer).encode('utf8') + b'\n'
+                with writeLock:
+                    try:
+                        self.wfile.write(data)
+                        self.wfile.flush()
+                    except OSError:
+                        logger.reportDebug('Could not send answer {0}, caller is gone.'.format(answer.get('id')))
+
+        class Server(socketserver.ThreadingTCPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+
+        self._executor = ThreadPoolExecutor(max_workers=self._maxWorkers, thread_name_prefix='RPC Worker')
+        self._server = Server(self._address, RequestHandler)
+        thread = Thread(target=self._server.serve_forever, name='RPC Server Thread')
+        thread.daemon = True
+        thread.start()
+        logger.reportInfo('Serving RPC calls on {0}'.format(self.address))
+
+    def stop(self):
+        if self._server is None: return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    def _processRequest(self, request, receivedTime, sendAnswer):
+        requestId = request.get('id')
+        functionName = request.get('function')
+        timeout = request.get('timeout')
+        try:
+            if not isinstance(functionName, str):
+                raise RPCError('ProtocolError', 'Missing function name.')
+            if timeout is not None and time.monotonic() - receivedTime > timeout:
+                raise RPCTimeoutError('Call to {0} waited more than {1}s in queue.'.format(functionName, timeout))
+            result = self._handler(functionName, request.get('arguments') or {})
+            try:
+                json.dumps(result)
+            except (TypeError, ValueError):
+                raise RPCError('TypeError', 'Result of type {0} cannot be serialized.'.format(type(result).__name__))
+            answer = {'id' : requestId, 'result' : result}
+        except RPCError as e:
+            answer = {'id' : requestId, 'error' : {'type' : e.type, 'message' : e.message}}
+        except Exception as e:
+            logger.reportException('RPC call to {0} failed.'.format(functionName))
+            answer = {'id' : requestId, 'error' : {'type' : type(e).__name__, 'message' : str(e)}}
+        sendAnswer(answer)
+
+class RPCClient(object):
+    """ Connection to an RPC server. Not thread safe: use a client per thread. """
+    def __init__(self, address=('localhost', 1030), timeout=30):
+        """
+        Connect to a server.
+
+        address -- Address of the server, as a tuple (hostname, port).
+        timeout -- Default time to wait for an answer, in seconds.
+
+        """
+        self._timeout = timeout
+        self._socket = socket.create_connection(address, timeout=timeout)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._buffer = b''
+        self._nextId = 1
+        self._pendingIds = set()
+        self._answers = {} # Answers received while waiting for another one. Key is request id.
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def call(self, functionName, arguments=None, timeout=None):
+        """ Call a function and return its result. Raises RPCError if the function raised an exception, RPCTimeoutError if no answer came in time. """
+        result = self.callMany([(functionName, arguments)], timeout)[0]
+        if isinstance(result, RPCError):
+            raise result
+        return result
+
+    def callMany(self, calls, timeout=None):
+        """
+        Send several calls at once and wait for all answers.
+
+        calls -- Iterable of tuples (function name, dictionary of arguments).
+        timeout -- Time to wait for all answers, in seconds. Defaults to the timeout given to the constructor.
+        Returns the list of results, in the order of calls. Failed calls have an RPCError instance in place of their result.
+
+        """
+        if timeout is None: timeout = self._timeout
+        requestIds = []
+        requests = []
+        for functionName, arguments in calls:
+            requestId = self._nextId
+            self._nextId += 1
+            requestIds.append(requestId)
+            requests.append(json.dumps({'id' : requestId, 'function' : functionName, 'arguments' : arguments or {}, 'timeout' : timeout}))
+        self._pendingIds.update(requestIds)
+        self._socket.sendall(('\n'.join(requests) + '\n').encode('utf8'))
+
+        deadline = time.monotonic() + timeout
+        results = []
+        for requestId in requestIds:
+            answer = self._waitForAnswer(requestId, deadline)
+            if answer is None:
+                results.append(RPCTimeoutError('No answer received within {0}s.'.format(timeout)))
+            elif 'error' in answer and answer['error'].get('type') == 'Timeout':
+                # The call waited in the queue of the server past its timeout.
+                results.append(RPCTimeoutError(answer['error'].get('message')))
+            elif 'error' in answer:
+                results.append(RPCError(answer['error'].get('type'), answer['error'].get('message')))
+            else:
+                results.append(answer.get('result'))
+        return results
+
+    def _waitForAnswer(self, requestId, deadline):
+        while not requestId in self._answers:
+            # Read from the socket directly rather than through a file object,
+            # which would be unusable after a timeout.
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._pendingIds.discard(requestId)
+                return None
+            self._socket.settimeout(remaining)
+            try:
+                chunk = self._socket.recv(65536)
+            except socket.timeout:
+                continue
+            if not chunk:
+                raise ConnectionResetError('Connection closed by the RPC server.')
+            lines = (self._buffer + chunk).split(b'\n')
+            self._buffer = lines.pop()
+            for line in lines:
+                answer = json.loads(line.decode('utf8'))
+                # Answers to calls that already timed out are dropped.
+                if answer.get('id') in self._pendingIds:
+                    self._answers[answer['id']] = answer
+        self._pendingIds.discard(requestId)
+        return self._answers.pop(requestId)
+
+    def close(self):
+        self._socket.close()
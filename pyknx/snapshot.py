@@ -0,0 +1,150 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2012-2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+"""
+Snapshots of object values.
+
+A snapshot holds the values of many objects, read with a single request (see Linknx.takeSnapshot()). It is saved as a compact JSON
+document, gzipped if the file name ends with ".gz", and can be written back to linknx later with batched writes (see
+Linknx.restoreSnapshot()).
+"""
+
+import time
+import json
+import gzip
+from pyknx import logger
+
+FORMAT_VERSION = 1
+
+class Snapshot(object):
+    """ Values of a set of objects at a given time. """
+    def __init__(self, values, takenTime=None):
+        """
+        Initialize a snapshot.
+
+        values -- Dictionary with object ids as keys and object values, as returned by ObjectCollection.getValues(), as values.
+        takenTime -- Epoch time at which values were read. Defaults to now.
+
+        """
+        self._values = dict(values)
+        self._takenTime = takenTime if takenTime is not None else time.time()
+
+    @property
+    def values(self):
+        return self._values
+
+    @property
+    def takenTime(self):
+        return self._takenTime
+
+    def __len__(self):
+        return len(self._values)
+
+    def save(self, fileName):
+        """ Write the snapshot to fileName. The file is gzipped if its name ends with ".gz". """
+        document = {'version' : FORMAT_VERSION, 'time' : self._takenTime, 'objects' : sorted(self._values.items())}
+        data = json.dumps(document, separators=(',', ':')).encode('utf8')
+        with _open(fileName, 'wb') as f:
+            f.write(data)
+
+    @staticmethod
+    def load(fileName):
+        """ Read a snapshot written by save(). """
+        with _open(fileName, 'rb') as f:
+            document = json.loads(f.read().decode('utf8'))
+        if document.get('version') != FORMAT_VERSION:
+            raise Exception('Unsupported snapshot version {0} in {1}.'.format(document.get('version'), fileName))
+        return Snapshot(document['objects'], document['time'])
+
+def _open(fileName, mode):
+    return gzip.open(fileName, mode) if fileName.endswith('.gz') else open(fileName, mode)
+
+class RestoreReport(object):
+    """ Outcome of a restore. Each member is a sorted list of object ids. """
+    def __init__(self):
+        self.writtenIds = []
+        self.unchangedIds = [] # Objects whose current value already equals the snapshot.
+        self.filteredIds = [] # Objects excluded by the type category or flags filter.
+        self.missingIds = [] # Objects that do not exist in linknx anymore.
+        self.failedIds = []
+
+    @property
+    def succeeds(self):
+        return not self.failedIds
+
+    def __str__(self):
+        return '{0} written, {1} unchanged, {2} filtered out, {3} missing, {4} failed'.format(len(self.writtenIds), len(self.unchangedIds), len(self.filteredIds), len(self.missingIds), len(self.failedIds))
+
+def restore(linknx, snapshot, chunkSize=100, typeCategories=None, flags=None, skipsUnchanged=True):
+    """
+    Write the values of a snapshot back to linknx and return a RestoreReport.
+
+    linknx -- The Linknx instance to write to.
+    snapshot -- The Snapshot to restore.
+    chunkSize -- Maximum number of objects written with a single request.
+    typeCategories -- If set, only objects whose type category is in this list are restored.
+    flags -- If set, only objects that have all these flags (e.g. "w") are restored.
+    skipsUnchanged -- If True, current values are read with a single request and objects that already have the snapshot value are not written.
+    When writing a chunk fails, its objects are written one by one to isolate the faulty ones.
+
+    """
+    from pyknx.linknx import ObjectCollection
+    report = RestoreReport()
+    objects = ObjectCollection(linknx)
+    objectConfig = linknx.objectConfig
+    for objectId in sorted(snapshot.values):
+        config = objectConfig.get(objectId)
+        if config is None:
+            report.missingIds.append(objectId)
+        elif (typeCategories is not None and config.typeCategory not in typeCategories) or (flags and not set(flags) <= set(config.flags)):
+            report.filteredIds.append(objectId)
+        else:
+            objects.append(linknx.getObject(objectId))
+    if report.missingIds:
+        logger.reportWarning('Objects {0} do not exist anymore and are not restored.'.format(', '.join(report.missingIds)))
+
+    if skipsUnchanged and objects:
+        currentValues = objects.getValues()
+        changedObjects = ObjectCollection(linknx)
+        for obj in objects:
+            if obj.convertValueToString(currentValues[obj.id]) == obj.convertValueToString(snapshot.values[obj.id]):
+                report.unchangedIds.append(obj.id)
+            else:
+                changedObjects.append(obj)
+        objects = changedObjects
+
+    for chunkStart in range(0, len(objects), chunkSize):
+        chunk = ObjectCollection(linknx, objects[chunkStart:chunkStart + chunkSize])
+        try:
+            chunk.setValues(snapshot.values)
+            report.writtenIds.extend(obj.id for obj in chunk)
+        except Exception as e:
+            logger.reportWarning('Failed to write {0} objects at once ({1}), writing them one by one.'.format(len(chunk), e))
+            for obj in chunk:
+                try:
+                    obj.value = snapshot.values[obj.id]
+                    report.writtenIds.append(obj.id)
+                except Exception as e:
+                    logger.reportError('Failed to restore {0}: {1}'.format(obj.id, e))
+                    report.failedIds.append(obj.id)
+    logger.reportInfo('Snapshot restored: {0}.'.format(report))
+    return report
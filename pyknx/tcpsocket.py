@@ -77,6 +77,63 @@ class Socket:
                 return None, None
         return (data, conn)
 
+    def waitForMessage(self, endChar=b'$', binaryMagic=None, readHeaderLength=None):
+        """
+        Wait for a connection and read either a text message terminated by endChar or a binary frame.
+
+        binaryMagic -- First byte of binary frames. If the first byte received is not this one, the message is read as text.
+        readHeaderLength -- Tuple (header length, function) where function returns the payload length given the header bytes of a binary frame.
+        Returns a tuple (data, isBinary, connection). data is the payload of the frame or the message without its end character. (None, False, None) is returned if no connection came in time or if reading failed.
+
+        """
+        try:
+            conn, address = self._socket.accept()
+        except socket.timeout:
+            return (None, False, None)
+
+        try:
+            first = conn.recv(1)
+            if not first:
+                # The peer has closed the connection without sending
+                # anything, e.g. to wake the listener up.
+                conn.close()
+                return (None, False, None)
+            if binaryMagic is not None and first == binaryMagic:
+                headerLength, getPayloadLength = readHeaderLength
+                header = first + self._receiveExactly(conn, headerLength - 1)
+                return (self._receiveExactly(conn, getPayloadLength(header)), True, conn)
+
+            data = first
+            isComplete = endChar in first
+            while data and not isComplete:
+                chunk = conn.recv(4096)
+                if not chunk: break
+                data += chunk
+                isComplete = endChar in chunk
+            endCharIx = data.find(endChar)
+            if endCharIx == -1:
+                raise Exception('Connection closed before end of message.')
+            return (data[:endCharIx], False, conn)
+        except:
+            logger.reportException('Exception when waiting for incoming data.')
+            try:
+                conn.close()
+            except:
+                logger.reportException('Could not close connection. Connection is discarded and process continues.')
+            return (None, False, None)
+
+    @staticmethod
+    def _receiveExactly(conn, length):
+        buffer = bytearray(length)
+        view = memoryview(buffer)
+        received = 0
+        while received < length:
+            count = conn.recv_into(view[received:])
+            if count == 0:
+                raise Exception('Connection closed after {0} bytes out of {1}.'.format(received, length))
+            received += count
+        return bytes(buffer)
+
     def sendString(self, string, encoding = 'utf8', endChar = chr(4)):
         # Encode the passed string to get raw bytes ready for transfer.
         bytes = string.encode(encoding)
@@ -30,12 +30,24 @@ import inspect
 import stat
 import pwd, grp
 import shutil
+import socket
 import tempfile
 import importlib
+import threading
+from xml.dom.minidom import parse
 
 from pyknx import logger, linknx, configurator, communicator
 import logging
 
+def getFreePort(host='localhost'):
+    """ Return a TCP port that is free on host. Each test binds its servers to such ports so that tests can run in parallel. """
+    s = socket.socket()
+    try:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+    finally:
+        s.close()
+
 class AssertionsHandle(object):
     def __init__(self, test, assertions):
         self.test = test
@@ -68,12 +80,24 @@ class PatchHandle(object):
 class TestCaseBase(unittest.TestCase):
     def setUp(self):
         self.name = self.id()[len(self.__module__) + 1:]
-        logFile = 'test_files/{0}.log'.format(self.name)
-        if os.path.exists(logFile):
-            os.remove(logFile)
+
+        # Tests refer to resources relative to their directory, whatever the
+        # directory the test runner was started from. The working directory
+        # is restored even if a subclass does not call tearDown().
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.getTestDirectory())
+
+        # Each test writes to its own directory so that tests can run in
+        # parallel. The directory is kept after the test for investigation.
+        self.outputDirectory = os.path.join(self.getTestDirectory(), 'test_files', self.name)
+        if os.path.exists(self.outputDirectory):
+            shutil.rmtree(self.outputDirectory)
+        os.makedirs(self.outputDirectory)
+        logFile = os.path.join(self.outputDirectory, '{0}.log'.format(self.name))
         logger.initLogger((logFile, logging.DEBUG), logging.INFO)
         logger.reportInfo('*******Start {0}*************'.format(self.name))
         self.currentAssertions = []
+        self._stateChanged = threading.Condition()
         self.pyknxScriptsDirectory = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', '..'))
         self.pyknxModulesDirectory = os.path.normpath(os.path.join(os.path.dirname(__file__), '..'))
 
@@ -89,7 +113,7 @@ class TestCaseBase(unittest.TestCase):
         return self._getFileFullName('resources', resourceSuffix, appendsTestName)
 
     def getOutputFullName(self, outputSuffix, appendsTestName=True):
-        return self._getFileFullName('test_files', outputSuffix, appendsTestName)
+        return os.path.join(self.outputDirectory, os.path.basename(self._getFileFullName('test_files', outputSuffix, appendsTestName)))
 
     def getTestDirectory(self):
         return os.path.dirname(self.getTestFileFullName())
@@ -104,6 +128,30 @@ class TestCaseBase(unittest.TestCase):
         resourceFile = '{testClass}.{prefix}{sep}{suffix}'.format(testClass=self.__class__.__name__, prefix=prefix, suffix=suffix, sep=separator)
         return os.path.join(self.getTestDirectory(), directory, resourceFile)
 
+    def notifyStateChanged(self):
+        """ Wake up waitFor() so that it evaluates its condition immediately. Callbacks patched by tests should call this. """
+        with self._stateChanged:
+            self._stateChanged.notify_all()
+
+    def waitFor(self, condition, reason, timeout=5, pollInterval=0.05):
+        """
+        Wait until condition returns a true value and fail the test if it does not within timeout seconds.
+
+        The condition is evaluated each time notifyStateChanged() is called, and every pollInterval seconds for changes that are not notified (e.g. in another process).
+        Returns the last value returned by condition.
+
+        """
+        endTime = time.time() + timeout
+        with self._stateChanged:
+            while True:
+                result = condition()
+                remaining = endTime - time.time()
+                if result or remaining <= 0: break
+                self._stateChanged.wait(min(pollInterval, remaining))
+        if not result:
+            self.fail('Timeout ({0}s) while {1}'.format(timeout, reason))
+        return result
+
     def waitDuring(self, duration, reason, assertions=[], assertStartMargin=0, assertEndMargin=0):
         self.assertTrue(duration >= 0, 'Duration is negative, is it intended?')
         self.waitUntil(time.time() + duration, reason, assertions, assertStartMargin, assertEndMargin)
@@ -143,8 +191,10 @@ class TestCaseBase(unittest.TestCase):
                         logger.reportInfo('Exception caught in waitUntil after {0}s'.format(time.time() - startTime))
                         raise
 
-                # Sleep until optimal end of iteration.
-                time.sleep(0.1)
+                # Check again as soon as a callback notifies a change, or after
+                # a while for changes that are not notified.
+                with self._stateChanged:
+                    self._stateChanged.wait(max(0, min(0.1, endTime - time.time())))
 
     def assertShellCommand(self, command, expectedStdOut=None, expectedStdErr=None, expectedReturnCode=None, stdin=None):
 
@@ -239,43 +289,57 @@ class TestCaseBase(unittest.TestCase):
             self.assertEqual(fileStat.st_gid, gid, 'Wrong group for {0}'.format(path))
 
 class WithLinknxTestCase(TestCaseBase):
-    def setUp(self, linknxConfFile='linknx_test_conf.xml', communicatorAddr=('localhost', 1031), patchLinknxConfig=True, userScript='linknxuserfile.py', userScriptArgs=None):
+    def setUp(self, linknxConfFile='linknx_test_conf.xml', communicatorAddr=('localhost', 0), patchLinknxConfig=True, userScript='linknxuserfile.py', userScriptArgs=None):
+        """
+        Start linknx and a communicator for the test.
+
+        linknxConfFile -- Configuration of linknx. Its xmlserver port is replaced by a free port. If None, linknx is not started.
+        communicatorAddr -- Address of the communicator. Port 0 stands for a free port. If None, no communicator is started.
+        patchLinknxConfig -- If True, the pyknx rules and ioport for the communicator are generated in the linknx configuration.
+
+        """
         TestCaseBase.setUp(self)
         self.linknxProcess = None
         self.linknx = None
         self.communicator = None
         self.linknxOutputFDs = None
         self.linknxXMLConfig = linknxConfFile
+        if communicatorAddr != None and communicatorAddr[1] == 0:
+            communicatorAddr = (communicatorAddr[0], getFreePort(communicatorAddr[0]))
         self.communicatorAddress = communicatorAddr
         try:
 
             # Patch config.
             if self.linknxXMLConfig != None:
-                testDir = 'test_files'
-                if not os.path.exists(testDir):
-                    os.mkdir(testDir)
+                linknxPort = getFreePort()
+                linknxPatchedConfigFile = os.path.join(self.outputDirectory, 'autogenlinknx.conf.xml')
                 if self.communicatorAddress != None and patchLinknxConfig:
-                    linknxPatchedConfigFile = os.path.join(testDir, 'autogenlinknx.conf.xml')
-                    if os.path.exists(linknxPatchedConfigFile):
-                        os.remove(linknxPatchedConfigFile)
                     self.configurator = configurator.Configurator(self.linknxXMLConfig, linknxPatchedConfigFile, self.communicatorAddress)
                     self.configurator.cleanConfig()
                     self.configurator.generateConfig()
+                    configNode = self.configurator.config
+                else:
+                    configNode = parse(self.linknxXMLConfig).getElementsByTagName('config')[0]
+                for xmlServerNode in configNode.getElementsByTagName('xmlserver'):
+                    xmlServerNode.setAttribute('port', str(linknxPort))
+                if self.communicatorAddress != None and patchLinknxConfig:
                     self.configurator.writeConfig()
                 else:
-                    linknxPatchedConfigFile = self.linknxXMLConfig
+                    with open(linknxPatchedConfigFile, 'w', encoding='utf-8') as f:
+                        f.write(configNode.toxml())
 
                 # Start linknx.
-                linknxErrFilename = 'test_files/{0}.linknx.err'.format(self.name)
-                linknxOutFilename = 'test_files/{0}.linknx.out'.format(self.name)
+                linknxErrFilename = os.path.join(self.outputDirectory, '{0}.linknx.err'.format(self.name))
+                linknxOutFilename = os.path.join(self.outputDirectory, '{0}.linknx.out'.format(self.name))
                 efdw = open(linknxErrFilename, 'w')
                 efdr = open(linknxErrFilename, 'r')
                 ofdw = open(linknxOutFilename, 'w')
                 self.linknxOutputFDs = (efdr, efdw, ofdw)
                 self.linknxProcess = subprocess.Popen( ['linknx', '--config={0}'.format(linknxPatchedConfigFile)], stdout=self.linknxOutputFDs[2], stderr=self.linknxOutputFDs[1])
                 logger.reportInfo('linknx started with pid {0}'.format(self.linknxProcess.pid))
-                self.linknx = linknx.Linknx('localhost', 1030)
+                self.linknx = linknx.Linknx('localhost', linknxPort)
                 self.currentAssertions.append(self.checkLinknx)
+                self.waitFor(self.isLinknxReady, 'waiting for linknx to accept connections.', timeout=10)
 
             # Start pyknx.
             if self.communicatorAddress != None:
@@ -285,13 +349,21 @@ class WithLinknxTestCase(TestCaseBase):
                 self.communicator = None
 
             logger.reportInfo('Set up finished.')
-            self.waitDuring(0.5, 'Pause to make sure everything gets ready.')
         except:
             logger.reportException('Error in setUp.')
             self.tearDown()
             self.fail('Test setup failed.')
             raise
 
+    def isLinknxReady(self):
+        """ Tell whether linknx accepts connections on its XML server. Fails the test if linknx has terminated. """
+        self.checkLinknx()
+        try:
+            socket.create_connection(self.linknx.address, timeout=1).close()
+            return True
+        except ConnectionRefusedError:
+            return False
+
     def tearDown(self):
         logger.reportInfo('Tearing down...')
 
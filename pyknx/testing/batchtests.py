@@ -0,0 +1,121 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+import sys
+sys.path.append('../')
+from pyknx import linknx, client, logger
+from pyknx.testing import base
+from pyknx.testing.fakelinknx import FakeLinknxServer
+import io
+import unittest
+
+class BatchTestCase(base.TestCaseBase):
+    def setUp(self):
+        base.TestCaseBase.setUp(self)
+        self.server = FakeLinknxServer('linknx_test_conf.xml')
+        self.server.start()
+        self.linknx = linknx.Linknx(*self.server.address, usesPersistentConnection=True)
+        self.linknx.objectConfig
+
+    def tearDown(self):
+        self.linknx.close()
+        self.server.stop()
+        base.TestCaseBase.tearDown(self)
+
+    def runBatch(self, commandLines, batchSize=1000):
+        """ Return a tuple (succeeds, output lines). """
+        output = io.StringIO()
+        succeeds = client.runBatch(self.linknx, commandLines, batchSize, output)
+        return succeeds, output.getvalue().splitlines()
+
+    def testMixedCommands(self):
+        succeeds, lines = self.runBatch([
+            '# Comments and empty lines are ignored.',
+            '',
+            'read Boolean Int16',
+            'write Int16 5',
+            'read Int16 "Float16"',
+            'execute <action type="set-value" id="Boolean" value="on"/>',
+            'read Boolean'])
+        self.assertTrue(succeeds)
+        self.assertEqual(lines, ['Boolean\tFalse', 'Int16\t0', 'Int16\t5', 'Float16\t0.0', 'Boolean\tTrue'])
+        self.assertEqual(self.server.requestCounts['read'], 4) # Configuration, then one per group of consecutive reads.
+        self.assertEqual(self.server.requestCounts['write'], 1)
+        self.assertEqual(self.server.requestCounts['execute'], 1)
+
+        # Everything went through a single connection.
+        self.assertEqual(self.server.connectionCount, 1)
+
+    def testReadBatching(self):
+        succeeds, lines = self.runBatch(['read Boolean', 'read Int16 Int32', 'read Float16', 'read Byte'], batchSize=2)
+        self.assertTrue(succeeds)
+        self.assertEqual(lines, ['Boolean\tFalse', 'Int16\t0', 'Int32\t0', 'Float16\t0.0', 'Byte\t0'])
+        # Reads are sent as soon as batchSize objects are pending, lines are
+        # not split.
+        self.assertEqual(self.server.requestCounts['read'], 3) # Configuration, then 2 batches.
+
+    def testBadObject(self):
+        succeeds, lines = self.runBatch(['read Boolean NoSuchObject Int16', 'write NoSuchObject 1', 'unknown command', 'write Int16 2', 'read Int16'])
+        self.assertFalse(succeeds)
+
+        # Objects are read one by one when the batched read fails.
+        self.assertEqual(lines, ['Boolean\tFalse', 'Int16\t0', 'Int16\t2'])
+        self.assertEqual(self.server.getValue('Int16'), '2')
+
+    def testScript(self):
+        host, port = self.server.address
+        batchFile = self.getOutputFullName('commands.txt')
+        with open(batchFile, 'w') as f:
+            f.write('write Int16 3\nread Int16 Boolean\n')
+        stdout = io.StringIO()
+        # Keep logging to the test's log file.
+        with base.PatchHandle(logger, {'initLogger' : lambda *args: None}), base.PatchHandle(sys, {'stdout' : stdout}):
+            client.handleRequest('batch', None, ['-s', host, '-p', str(port), '-f', batchFile])
+        self.assertEqual(stdout.getvalue(), 'Int16\t3\nBoolean\tFalse\n')
+
+        with open(batchFile, 'w') as f:
+            f.write('read NoSuchObject\n')
+        with base.PatchHandle(logger, {'initLogger' : lambda *args: None}), base.PatchHandle(sys, {'stdout' : io.StringIO()}):
+            with self.assertRaises(SystemExit) as context:
+                client.handleRequest('batch', None, ['-s', host, '-p', str(port), '-f', batchFile])
+        self.assertEqual(context.exception.code, 3)
+
+    def testReconnection(self):
+        self.assertFalse(self.linknx.getObject('Boolean').value)
+        self.assertEqual(self.server.connectionCount, 1)
+
+        # Linknx closes the persistent connection, e.g. because it restarted.
+        self.server.dropConnections()
+        self.server.setValue('Boolean', 'on')
+        self.assertTrue(self.linknx.getObject('Boolean').value)
+        self.assertEqual(self.server.connectionCount, 2)
+
+        # Requests are sent twice at most.
+        self.server.disconnectRate = 1
+        with self.assertRaises(Exception):
+            self.linknx.getObject('Boolean').value
+        self.assertEqual(self.server.requestCounts['read'], 5)
+        self.server.disconnectRate = 0
+        self.assertTrue(self.linknx.getObject('Boolean').value)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,325 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+
+"""
+Benchmarks the hot paths of the client and of the communicator against an in-process fake linknx (see pyknx.testing.fakelinknx): single and
+batched object reads, object writes, action execution, configuration load, object lookup by pattern and end-to-end event dispatch to a user
+callback. Throughput, latency percentiles and memory allocations are reported for each benchmark.
+
+Results can be written to a JSON file and compared against such a file recorded earlier: the script exits with a non-zero code if a
+benchmark is slower than its baseline by more than the tolerance, so that it can be used to catch performance regressions.
+"""
+
+import sys
+import os
+import gc
+import json
+import time
+import argparse
+import platform
+import tempfile
+import threading
+import tracemalloc
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+import pyknx
+from pyknx import logger, configurator
+from pyknx.linknx import Linknx
+from pyknx.testing.fakelinknx import FakeLinknxServer
+from pyknx.testing import configgenerator
+from pyknx.testing.base import getFreePort
+
+# Size of the configuration the benchmarks run against, except config load
+# benchmarks that have their own.
+DEFAULT_OBJECT_COUNT = 1000
+BATCH_SIZE = 100
+CONFIG_SIZES = (100, 1000, 10000)
+
+# Maximum number of calls measured under tracemalloc, which slows calls down
+# too much to be used for timing.
+ALLOCATION_CALL_COUNT = 50
+
+# Metrics compared against the baseline. The boolean tells whether a higher
+# value is better.
+COMPARED_METRICS = (('throughput', True), ('p50', False), ('p90', False))
+
+def getPercentile(sortedValues, percentile):
+    """ Return the given percentile (between 0 and 100) of a sorted list, using the nearest-rank method. """
+    rank = max(1, -(-len(sortedValues) * percentile // 100))
+    return sortedValues[int(rank) - 1]
+
+def measure(operation, iterationCount, operationsPerCall=1):
+    """
+    Call operation repeatedly and return its statistics as a dictionary.
+
+    operation -- Callable that takes no argument.
+    iterationCount -- Number of timed calls. A few untimed calls are made beforehand to warm caches and connections up.
+    operationsPerCall -- Number of elementary operations (e.g. objects read) a call performs, used to compute the throughput.
+
+    Latencies are in milliseconds per call, throughput is in operations per second. peakAllocatedBytes is the largest amount of memory a
+    single call had allocated at any time, retainedBytes is the memory still allocated after ALLOCATION_CALL_COUNT calls.
+
+    """
+    for i in range(max(1, iterationCount // 20)):
+        operation()
+
+    durations = []
+    startTime = time.perf_counter()
+    for i in range(iterationCount):
+        callStartTime = time.perf_counter()
+        operation()
+        durations.append(time.perf_counter() - callStartTime)
+    totalDuration = time.perf_counter() - startTime
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        peakAllocatedBytes = 0
+        startSize = tracemalloc.get_traced_memory()[0]
+        for i in range(min(iterationCount, ALLOCATION_CALL_COUNT)):
+            callStartSize = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            operation()
+            peakAllocatedBytes = max(peakAllocatedBytes, tracemalloc.get_traced_memory()[1] - callStartSize)
+        gc.collect()
+        retainedBytes = tracemalloc.get_traced_memory()[0] - startSize
+    finally:
+        tracemalloc.stop()
+
+    durations.sort()
+    return {
+        'iterations' : iterationCount,
+        'operationsPerCall' : operationsPerCall,
+        'throughput' : iterationCount * operationsPerCall / totalDuration,
+        'mean' : totalDuration / iterationCount * 1000,
+        'p50' : getPercentile(durations, 50) * 1000,
+        'p90' : getPercentile(durations, 90) * 1000,
+        'p99' : getPercentile(durations, 99) * 1000,
+        'max' : durations[-1] * 1000,
+        'peakAllocatedBytes' : peakAllocatedBytes,
+        'retainedBytes' : retainedBytes}
+
+class BenchmarkEnvironment(object):
+    """ Fake linknx instances and temporary files shared by the benchmarks of a run. """
+    def __init__(self, directory, usesPersistentConnection):
+        self._directory = directory
+        self._usesPersistentConnection = usesPersistentConnection
+        self._servers = {} # Key is object count.
+        self.communicatorAddress = ('127.0.0.1', getFreePort('127.0.0.1'))
+
+    def getServer(self, objectCount):
+        """ Return a running fake linknx whose configuration has objectCount objects, with the rules that notify the communicator. """
+        server = self._servers.get(objectCount)
+        if server is None:
+            sourceFile = os.path.join(self._directory, 'source{0}.xml'.format(objectCount))
+            configFile = os.path.join(self._directory, 'config{0}.xml'.format(objectCount))
+            configgenerator.writeConfig(sourceFile, objectCount, callbackCount=20)
+            conf = configurator.Configurator(sourceFile, configFile, self.communicatorAddress)
+            conf.cleanConfig()
+            conf.generateConfig()
+            conf.writeConfig()
+            server = FakeLinknxServer(configFile, address=('127.0.0.1', 0))
+            server.start()
+            self._servers[objectCount] = server
+        return server
+
+    def createLinknx(self, objectCount=DEFAULT_OBJECT_COUNT):
+        server = self.getServer(objectCount)
+        return Linknx(server.address[0], server.address[1], usesPersistentConnection=self._usesPersistentConnection)
+
+    def writeUserFile(self):
+        """ Write a communicator user file whose callbacks do nothing and return its name. """
+        fileName = os.path.join(self._directory, 'pyknxbenchmarkuserfile.py')
+        with open(fileName, 'w') as f:
+            for i in range(20):
+                f.write('def onObject{0}Changed(context):\n    pass\n'.format(i))
+        return fileName
+
+    def close(self):
+        for server in self._servers.values():
+            server.stop()
+
+def benchmarkSingleRead(environment, iterationCount):
+    linknx = environment.createLinknx()
+    objects = linknx.getObjects(objectIds=['Object0'])
+    try:
+        return measure(objects.getValues, iterationCount)
+    finally:
+        linknx.close()
+
+def benchmarkBatchedRead(environment, iterationCount):
+    linknx = environment.createLinknx()
+    objects = linknx.getObjects(objectIds=['Object{0}'.format(i) for i in range(BATCH_SIZE)])
+    try:
+        return measure(objects.getValues, iterationCount, BATCH_SIZE)
+    finally:
+        linknx.close()
+
+def benchmarkWrite(environment, iterationCount):
+    linknx = environment.createLinknx()
+    # Write alternate values so that each write is an actual change.
+    obj = linknx.getObject('Object0')
+    values = [False, True]
+    def write():
+        values.reverse()
+        obj.value = values[0]
+    try:
+        return measure(write, iterationCount)
+    finally:
+        linknx.close()
+
+def benchmarkExecute(environment, iterationCount):
+    linknx = environment.createLinknx()
+    # Object19 is a boolean, see configgenerator.OBJECT_TYPES.
+    action = '<action type="set-value" id="Object19" value="on"/>'
+    try:
+        return measure(lambda: linknx.executeAction(action, waitsForAnswer=True), iterationCount)
+    finally:
+        linknx.close()
+
+def makeConfigLoadBenchmark(objectCount):
+    def benchmarkConfigLoad(environment, iterationCount):
+        linknx = environment.createLinknx(objectCount)
+        def load():
+            linknx.clearCache()
+            linknx.objectConfig
+        try:
+            return measure(load, iterationCount, objectCount)
+        finally:
+            linknx.close()
+    return benchmarkConfigLoad
+
+def benchmarkPatternLookup(environment, iterationCount):
+    linknx = environment.createLinknx()
+    # Configuration is loaded once, only lookup is measured.
+    linknx.objectConfig
+    patterns = ['^Object1[0-9]$', 'Object9[0-9]{2}']
+    return measure(lambda: linknx.getObjects(patterns=patterns), iterationCount)
+
+def benchmarkEventDispatch(environment, iterationCount):
+    """ Measure the time between an object change in linknx and the call of the corresponding callback in the communicator. """
+    from pyknx.communicator import Communicator
+    server = environment.getServer(DEFAULT_OBJECT_COUNT)
+    communicator = Communicator(environment.createLinknx(), environment.writeUserFile(), environment.communicatorAddress)
+    communicator.startListening()
+    callbackEvent = threading.Event()
+    setattr(communicator._userModule, 'onObject0Changed', lambda context: callbackEvent.set())
+    # Deliveries queued by the previous benchmarks must not be measured.
+    server.waitForDeliveries()
+    values = ['on', 'off'] if server.getValue('Object0') == 'on' else ['off', 'on']
+    def dispatch():
+        values.reverse()
+        callbackEvent.clear()
+        server.setValue('Object0', values[0])
+        if not callbackEvent.wait(5):
+            raise Exception('Callback has not been called.')
+    try:
+        return measure(dispatch, iterationCount)
+    finally:
+        communicator.stopListening()
+
+# Benchmarks by name, along with their default number of iterations.
+BENCHMARKS = [
+    ('read.single', benchmarkSingleRead, 500),
+    ('read.batched{0}'.format(BATCH_SIZE), benchmarkBatchedRead, 200),
+    ('write', benchmarkWrite, 500),
+    ('execute', benchmarkExecute, 300),
+    ] + [('configload.{0}'.format(size), makeConfigLoadBenchmark(size), max(3, 20000 // size)) for size in CONFIG_SIZES] + [
+    ('getobjects.patterns', benchmarkPatternLookup, 200),
+    ('communicator.dispatch', benchmarkEventDispatch, 200),
+    ]
+
+def runBenchmarks(names=None, scale=1.0, usesPersistentConnection=False):
+    """ Run the benchmarks whose name is in names (all if None) and return the results as a dictionary that can be serialized to JSON. """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        environment = BenchmarkEnvironment(directory, usesPersistentConnection)
+        try:
+            for name, benchmark, iterationCount in BENCHMARKS:
+                if names and name not in names: continue
+                results[name] = benchmark(environment, max(1, int(iterationCount * scale)))
+        finally:
+            environment.close()
+    return {
+        'pyknx' : str(pyknx.version),
+        'python' : platform.python_version(),
+        'platform' : platform.platform(),
+        'time' : time.time(),
+        'persistentConnection' : usesPersistentConnection,
+        'benchmarks' : results}
+
+def compareResults(results, baseline, tolerance):
+    """
+    Compare results against baseline, both returned by runBenchmarks().
+
+    tolerance -- Relative degradation allowed before a metric is considered as a regression, e.g. 0.2 for 20%.
+    Returns a list of tuples (benchmark name, metric, baseline value, value, is regression), for the metrics of COMPARED_METRICS of the benchmarks found in both.
+
+    """
+    comparisons = []
+    for name, stats in sorted(results['benchmarks'].items()):
+        baselineStats = baseline['benchmarks'].get(name)
+        if baselineStats is None: continue
+        for metric, isHigherBetter in COMPARED_METRICS:
+            value = stats[metric]
+            baselineValue = baselineStats[metric]
+            if isHigherBetter:
+                isRegression = value < baselineValue * (1 - tolerance)
+            else:
+                isRegression = value > baselineValue * (1 + tolerance)
+            comparisons.append((name, metric, baselineValue, value, isRegression))
+    return comparisons
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('benchmarks', help='benchmarks to run. Default is to run all of them: {0}.'.format(', '.join(b[0] for b in BENCHMARKS)), metavar='BENCHMARK', nargs='*')
+    parser.add_argument('-o', '--output', help='write results to FILE in the JSON format.', metavar='FILE', default=None)
+    parser.add_argument('-b', '--baseline', help='compare results against FILE, previously written with --output, and exit with code 1 if any benchmark regressed.', metavar='FILE', default=None)
+    parser.add_argument('-t', '--tolerance', help='relative degradation allowed before reporting a regression. Default is 0.2 (20%%).', type=float, default=0.2)
+    parser.add_argument('-s', '--scale', help='multiply the number of iterations of each benchmark by FACTOR. Default is 1.', metavar='FACTOR', type=float, default=1.0)
+    parser.add_argument('-p', '--persistent', dest='usesPersistentConnection', help='use a persistent connection to linknx.', action='store_true', default=False)
+    args = parser.parse_args()
+
+    logger.initLogger(None, 'ERROR', usesDetailedLogging=False)
+    unknownNames = set(args.benchmarks) - set(b[0] for b in BENCHMARKS)
+    if unknownNames:
+        parser.error('Unknown benchmarks: {0}'.format(', '.join(sorted(unknownNames))))
+
+    results = runBenchmarks(args.benchmarks, args.scale, args.usesPersistentConnection)
+    print('{0:<22} {1:>12} {2:>9} {3:>9} {4:>9} {5:>9} {6:>11}'.format('benchmark', 'ops/s', 'p50 (ms)', 'p90 (ms)', 'p99 (ms)', 'max (ms)', 'peak (B)'))
+    for name, stats in results['benchmarks'].items():
+        print('{0:<22} {1:>12.1f} {2:>9.3f} {3:>9.3f} {4:>9.3f} {5:>9.3f} {6:>11}'.format(name, stats['throughput'], stats['p50'], stats['p90'], stats['p99'], stats['max'], stats['peakAllocatedBytes']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        hasRegressed = False
+        print('\n{0:<22} {1:<11} {2:>12} {3:>12} {4:>8}'.format('benchmark', 'metric', 'baseline', 'current', 'change'))
+        for name, metric, baselineValue, value, isRegression in compareResults(results, baseline, args.tolerance):
+            hasRegressed = hasRegressed or isRegression
+            change = (value - baselineValue) / baselineValue * 100 if baselineValue else 0
+            print('{0:<22} {1:<11} {2:>12.3f} {3:>12.3f} {4:>+7.1f}% {5}'.format(name, metric, baselineValue, value, change, 'REGRESSION' if isRegression else ''))
+        sys.exit(1 if hasRegressed else 0)
@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+"""
+Measures the import time of the modules loaded by the command line clients, in a fresh interpreter each time, as reported by "python3 -X importtime".
+Exits with a non-zero code if the median import time of a module exceeds the budget, so that this script can be used to catch start-up regressions.
+"""
+
+import sys
+import os
+import argparse
+import subprocess
+packageDirectory = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+sys.path.append(packageDirectory)
+from pyknx import logger
+
+# Modules imported by the client scripts before contacting linknx or the client daemon.
+DEFAULT_MODULES = ('pyknx.cli', 'pyknx.client', 'pyknx.clientdaemon', 'pyknx.logger')
+
+def measureImportTime(moduleName, runCount):
+    """ Return the median cumulative import time of moduleName, in milliseconds, measured in runCount fresh interpreters. """
+    durations = []
+    environment = dict(os.environ, PYTHONPATH=packageDirectory)
+    for i in range(runCount):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import {0}'.format(moduleName)], stderr=subprocess.PIPE, env=environment, universal_newlines=True, check=True)
+        for line in result.stderr.splitlines():
+            # Lines are like "import time: self [us] | cumulative | imported package".
+            tokens = line.split('|')
+            if len(tokens) == 3 and tokens[2].strip() == moduleName:
+                durations.append(int(tokens[1]) / 1000.0)
+    durations.sort()
+    return durations[len(durations) // 2]
+
+def getImportedModules(moduleName):
+    """ Return the set of modules that importing moduleName loads, besides those loaded at interpreter start-up. """
+    script = 'import sys; before = set(sys.modules); import {0}; print("\\n".join(sorted(set(sys.modules) - before)))'.format(moduleName)
+    environment = dict(os.environ, PYTHONPATH=packageDirectory)
+    result = subprocess.run([sys.executable, '-c', script], stdout=subprocess.PIPE, env=environment, universal_newlines=True, check=True)
+    return set(result.stdout.split())
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('modules', help='modules to measure. Default is {0}.'.format(', '.join(DEFAULT_MODULES)), metavar='MODULE', nargs='*')
+    parser.add_argument('-n', '--runs', dest='runCount', help='number of measures per module. Default is 11.', type=int, default=11)
+    parser.add_argument('--budget', help='maximum median import time of each module, in milliseconds. Default is 50.', type=float, default=50.0)
+    args = parser.parse_args()
+
+    logger.initLogger(None, 'ERROR', usesDetailedLogging=False)
+    exceedsBudget = False
+    print('{0:<22} {1:>10} {2:>8}'.format('module', 'time (ms)', 'budget'))
+    for moduleName in args.modules or DEFAULT_MODULES:
+        duration = measureImportTime(moduleName, args.runCount)
+        isOverBudget = duration > args.budget
+        exceedsBudget = exceedsBudget or isOverBudget
+        print('{0:<22} {1:>10.1f} {2:>8}'.format(moduleName, duration, 'EXCEEDED' if isOverBudget else 'ok'))
+    sys.exit(1 if exceedsBudget else 0)
@@ -0,0 +1,65 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+"""
+Compares the rule generation strategies of the configurator: number of rules and conditions linknx has to load, size of the generated configuration and generation time.
+"""
+
+import sys
+import os
+import time
+import argparse
+import tempfile
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+from pyknx import logger, configurator
+from pyknx.testing import configgenerator
+
+def runBenchmark(objectCount, callbackCount, maxGroupSize):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        sourceFile = os.path.join(directory, 'source.xml')
+        configgenerator.writeConfig(sourceFile, objectCount, callbackCount=callbackCount, types=['1.001'])
+        for strategy in configurator.Configurator.RULE_STRATEGIES:
+            outputFile = os.path.join(directory, '{0}.xml'.format(strategy))
+            startTime = time.perf_counter()
+            conf = configurator.Configurator(sourceFile, outputFile, ('127.0.0.1', 1029), ruleStrategy=strategy, maxGroupSize=maxGroupSize)
+            conf.cleanConfig()
+            conf.generateConfig()
+            conf.writeConfig()
+            duration = time.perf_counter() - startTime
+            rulesNode = conf.config.getElementsByTagName('rules')[0]
+            ruleCount = len(rulesNode.getElementsByTagName('rule'))
+            conditionCount = len(rulesNode.getElementsByTagName('condition'))
+            results.append((strategy, ruleCount, conditionCount, os.path.getsize(outputFile), duration))
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--objects', dest='objectCount', help='number of objects with a callback. Default is 3000.', type=int, default=3000)
+    parser.add_argument('-c', '--callbacks', dest='callbackCount', help='number of distinct callbacks. Default is 20.', type=int, default=20)
+    parser.add_argument('--group-size', dest='maxGroupSize', help='maximum number of objects per rule with the "grouped" strategy. Default is 50.', type=int, default=50)
+    args = parser.parse_args()
+
+    logger.initLogger(None, 'ERROR', usesDetailedLogging=False)
+    print('{0:<12} {1:>8} {2:>11} {3:>12} {4:>10}'.format('strategy', 'rules', 'conditions', 'size (B)', 'time (s)'))
+    for strategy, ruleCount, conditionCount, size, duration in runBenchmark(args.objectCount, args.callbackCount, args.maxGroupSize):
+        print('{0:<12} {1:>8} {2:>11} {3:>12} {4:>10.3f}'.format(strategy, ruleCount, conditionCount, size, duration))
@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+import sys
+sys.path.append('../')
+from pyknx.testing import base
+from pyknx.testing.benchmarks import hotpathbenchmark
+import unittest
+
+class HotPathBenchmarkTestCase(base.TestCaseBase):
+    def testPercentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(hotpathbenchmark.getPercentile(values, 50), 50)
+        self.assertEqual(hotpathbenchmark.getPercentile(values, 99), 99)
+        self.assertEqual(hotpathbenchmark.getPercentile(values, 100), 100)
+        self.assertEqual(hotpathbenchmark.getPercentile([3], 90), 3)
+
+    def testCompareResults(self):
+        baseline = {'benchmarks' : {'a' : {'throughput' : 100, 'p50' : 1.0, 'p90' : 2.0}, 'b' : {'throughput' : 100, 'p50' : 1.0, 'p90' : 2.0}}}
+        results = {'benchmarks' : {'a' : {'throughput' : 85, 'p50' : 1.1, 'p90' : 2.5}, 'c' : {'throughput' : 1, 'p50' : 1, 'p90' : 1}}}
+        comparisons = hotpathbenchmark.compareResults(results, baseline, 0.2)
+        self.assertEqual(comparisons, [('a', 'throughput', 100, 85, False), ('a', 'p50', 1.0, 1.1, False), ('a', 'p90', 2.0, 2.5, True)])
+
+    def testRunBenchmarks(self):
+        names = ['read.single', 'write', 'configload.100', 'communicator.dispatch']
+        results = hotpathbenchmark.runBenchmarks(names, scale=0.05)
+        self.assertEqual(sorted(results['benchmarks'].keys()), sorted(names))
+        for name, stats in results['benchmarks'].items():
+            self.assertGreater(stats['throughput'], 0, name)
+            self.assertLessEqual(stats['p50'], stats['p99'], name)
+            self.assertGreater(stats['peakAllocatedBytes'], 0, name)
+        self.assertEqual(results['benchmarks']['configload.100']['operationsPerCall'], 100)
+
+if __name__ == '__main__':
+    unittest.main()
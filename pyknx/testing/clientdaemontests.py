@@ -0,0 +1,165 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+import sys
+sys.path.append('../')
+from pyknx import logger, clientdaemon
+from pyknx.testing import base
+from threading import Thread
+import os
+import socket
+import tempfile
+import unittest
+
+class FakeObject(object):
+    def __init__(self, id, linknx):
+        self.id = id
+        self._linknx = linknx
+        self.typeCategory = 'bool' if isinstance(linknx.values[id], bool) else 'string'
+
+    @property
+    def value(self):
+        return self._linknx.values[self.id]
+
+    @value.setter
+    def value(self, objValue):
+        self._linknx.values[self.id] = objValue
+
+    def convertValueToString(self, objValue):
+        return str(objValue).lower()
+
+class FakeObjectCollection(list):
+    def iterValues(self):
+        for obj in self:
+            yield obj.id, obj.value
+
+class FakeLinknx(object):
+    def __init__(self):
+        self.host = 'localhost'
+        self.port = 1028
+        self.values = {'Boolean' : True, 'Int' : 3}
+        self.actions = []
+        self.clearCacheCount = 0
+
+    def getObject(self, id):
+        if id not in self.values:
+            raise Exception('No such object {0}'.format(id))
+        return FakeObject(id, self)
+
+    def getObjects(self, patterns=None, objectIds=None):
+        return FakeObjectCollection([self.getObject(id) for id in objectIds])
+
+    def executeAction(self, actionDetails, waitsForAnswer=False):
+        self.actions.append(actionDetails)
+
+    def clearCache(self):
+        self.clearCacheCount += 1
+
+class ClientDaemonTestCase(base.TestCaseBase):
+    def setUp(self):
+        base.TestCaseBase.setUp(self)
+        self.linknx = FakeLinknx()
+        self.socketPath = os.path.join(tempfile.mkdtemp(), 'daemon.sock')
+        self.daemon = clientdaemon.ClientDaemon(self.linknx, self.socketPath)
+        self.daemonThread = Thread(target=self.daemon.serveForever)
+        self.daemonThread.start()
+        self.waitFor(self.isDaemonListening, 'waiting for daemon to listen.')
+
+    def isDaemonListening(self):
+        client = clientdaemon.DaemonClient.tryConnect(socketPath=self.socketPath)
+        if client is None: return False
+        client.close()
+        return True
+
+    def tearDown(self):
+        self.daemon.shutdown()
+        self.daemonThread.join()
+        self.assertFalse(os.path.exists(self.socketPath))
+
+    def testDefaultSocketPath(self):
+        self.assertIn('localhost-1028', clientdaemon.getDefaultSocketPath())
+        self.assertNotEqual(clientdaemon.getDefaultSocketPath('localhost', 1028), clientdaemon.getDefaultSocketPath('localhost', 1029))
+        environment = dict(os.environ)
+        try:
+            os.environ.pop('PYKNX_DAEMON_DIR', None)
+            os.environ['XDG_RUNTIME_DIR'] = '/run/user/1000'
+            self.assertEqual(os.path.dirname(clientdaemon.getDefaultSocketPath()), '/run/user/1000')
+            del os.environ['XDG_RUNTIME_DIR']
+            self.assertEqual(os.path.dirname(clientdaemon.getDefaultSocketPath()), '/tmp/pyknx-{0}'.format(os.getuid()))
+        finally:
+            os.environ.clear()
+            os.environ.update(environment)
+
+    def testSocketPermissions(self):
+        self.assertEqual(os.stat(self.socketPath).st_mode & 0o777, 0o600)
+
+        # Sockets are not created in directories that other users can write
+        # to.
+        directory = tempfile.mkdtemp()
+        os.chmod(directory, 0o777)
+        daemon = clientdaemon.ClientDaemon(self.linknx, os.path.join(directory, 'daemon.sock'))
+        with self.assertRaises(Exception):
+            daemon.serveForever()
+
+    def testTryConnect(self):
+        self.assertIsNone(clientdaemon.DaemonClient.tryConnect(socketPath=self.socketPath + '.missing'))
+        client = clientdaemon.DaemonClient.tryConnect(socketPath=self.socketPath)
+        self.assertIsNotNone(client)
+        client.close()
+
+        # Files that are not sockets are ignored.
+        fakeSocketPath = self.socketPath + '.file'
+        open(fakeSocketPath, 'w').close()
+        self.assertIsNone(clientdaemon.DaemonClient.tryConnect(socketPath=fakeSocketPath))
+
+    @unittest.skipUnless(os.getuid() == 0, 'changing the owner of the socket requires root privileges')
+    def testTryConnectToSocketOfOtherUser(self):
+        os.chown(self.socketPath, 1, -1)
+        try:
+            self.assertIsNone(clientdaemon.DaemonClient.tryConnect(socketPath=self.socketPath))
+        finally:
+            os.chown(self.socketPath, os.getuid(), -1)
+
+    def testRequests(self):
+        client = clientdaemon.DaemonClient(self.socketPath)
+        try:
+            # Several requests on the same connection.
+            self.assertEqual(client.read(['Int', 'Boolean']), ([['Int', 3], ['Boolean', True]], True))
+            self.assertEqual(client.read(['Boolean'], expectedValue='true'), ([['Boolean', True]], True))
+            self.assertEqual(client.read(['Boolean'], expectedValue='false'), ([['Boolean', True]], False))
+            client.write('Int', '5')
+            self.assertEqual(self.linknx.values['Int'], '5')
+            client.execute('<action type="set-value" id="Int" value="6"/>')
+            self.assertEqual(self.linknx.actions, ['<action type="set-value" id="Int" value="6"/>'])
+            client.request('reload')
+            self.assertEqual(self.linknx.clearCacheCount, 1)
+
+            # Errors do not close the connection.
+            with self.assertRaises(clientdaemon.DaemonError):
+                client.read(['Unknown'])
+            with self.assertRaises(clientdaemon.DaemonError):
+                client.request('unsupported')
+            self.assertEqual(client.read(['Int']), ([['Int', '5']], True))
+        finally:
+            client.close()
+
+if __name__ == '__main__':
+    unittest.main()
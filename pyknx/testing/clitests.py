@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+import sys
+sys.path.append('../')
+from pyknx import logger, cli, client
+from pyknx.testing import base
+from pyknx.testing.benchmarks import importtimebenchmark
+import io
+import json
+import unittest
+
+class CommandLineTestCase(base.TestCaseBase):
+    def testLazyImports(self):
+        # The client daemon path must not pay for the XML machinery.
+        for moduleName in ('pyknx.cli', 'pyknx.client'):
+            importedModules = importtimebenchmark.getImportedModules(moduleName)
+            self.assertIn(moduleName, importedModules)
+            self.assertNotIn('pyknx.linknx', importedModules)
+            self.assertNotIn('xml.dom.minidom', importedModules)
+        self.assertNotIn('pyknx.client', importtimebenchmark.getImportedModules('pyknx.cli'))
+
+    def testUsage(self):
+        stderr = sys.stderr
+        sys.stderr = io.StringIO()
+        try:
+            self.assertEqual(cli.main([]), 2)
+            self.assertIn('usage: python3 -m pyknx COMMAND', sys.stderr.getvalue())
+            self.assertEqual(cli.main(['unknown']), 2)
+            self.assertIn('Unknown command "unknown".', sys.stderr.getvalue())
+        finally:
+            sys.stderr = stderr
+
+    def testWatchOptions(self):
+        stderr = sys.stderr
+        sys.stderr = io.StringIO()
+        try:
+            for options in (['--format', 'json'], ['--expected-value', 'on'], ['--value-only']):
+                with self.assertRaises(SystemExit) as context:
+                    client.handleRequest('read', None, ['Boolean', '--watch', '1'] + options, prog='pyknxread.py')
+                self.assertEqual(context.exception.code, 2)
+            self.assertIn('--watch always outputs JSON lines', sys.stderr.getvalue())
+        finally:
+            sys.stderr = stderr
+
+    def testWriteValues(self):
+        rows = [('Int', 3), ('Boolean', True), ('Long"Identifier', 'a,b')]
+        expectedOutputs = {
+            'table' : 'Boolean          True\nInt              3\nLong"Identifier  a,b\n',
+            'json' : '{\n  "Int": 3,\n  "Boolean": true,\n  "Long\\"Identifier": "a,b"\n}\n',
+            'jsonl' : '{"id": "Int", "value": 3}\n{"id": "Boolean", "value": true}\n{"id": "Long\\"Identifier", "value": "a,b"}\n',
+            'csv' : 'id,value\nInt,3\nBoolean,True\n"Long""Identifier","a,b"\n',
+            'tsv' : 'id\tvalue\nInt\t3\nBoolean\tTrue\n"Long""Identifier"\ta,b\n'}
+        for outputFormat in client.OUTPUT_FORMATS:
+            output = io.StringIO()
+            client.writeValues(iter(rows), outputFormat, output)
+            self.assertEqual(output.getvalue(), expectedOutputs[outputFormat])
+        output = io.StringIO()
+        client.writeValues(iter(rows), 'table', output, valueOnly=True)
+        self.assertEqual(output.getvalue(), 'True\n3\na,b\n')
+
+    def testWatchValues(self):
+        values = iter([{'A' : 1, 'B' : True}, {'A' : 1, 'B' : False}, None, {'A' : 1, 'B' : False}, {'A' : 2, 'B' : False}])
+        def readValues():
+            value = next(values)
+            if value is None: raise Exception('Read failure.')
+            return value
+
+        output = io.StringIO()
+        self.assertTrue(client.watchValues(readValues, 0.01, output, roundCount=5))
+        changes = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual([(change['id'], change['value']) for change in changes], [('A', 1), ('B', True), ('B', False), ('A', 2)])
+
+        # Nothing to watch.
+        self.assertFalse(client.watchValues(lambda: {}, 0.01, output, roundCount=2))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,251 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+import sys
+sys.path.append('../')
+from pyknx import logger, communicator, rpc, framing, history, linknx
+from pyknx.testing import base
+from pyknx.testing.fakelinknx import FakeLinknxServer
+import types
+import socket
+import time
+import unittest
+
+class FakeObject(object):
+    typeCategory = 'int'
+    value = 0 # As read from linknx.
+
+    def __init__(self, id):
+        self.id = id
+
+    def convertStringToValue(self, valueString):
+        return int(valueString)
+
+class FakeLinknx(object):
+    history = None
+    writeScheduler = None
+    valueTracker = None
+
+    def getObject(self, id):
+        return FakeObject(id)
+
+class CommunicatorTestCase(base.TestCaseBase):
+    def setUp(self):
+        base.TestCaseBase.setUp(self)
+        self.calls = []
+        self.communicator = communicator.Communicator(FakeLinknx(), None)
+        self.communicator._userModule = types.SimpleNamespace(onEvent=lambda context: self.calls.append(context.objectId))
+
+    def testParseMessage(self):
+        self.assertEqual(communicator.parseMessage('onEvent'), ('onEvent', {}))
+        self.assertEqual(communicator.parseMessage('onEvent|objectId= Boolean |expr=a=b'), ('onEvent', {'objectId' : 'Boolean', 'expr' : 'a=b'}))
+
+    def testObjectGroupEvents(self):
+        def sendGroupEvent(values):
+            args = {'objectGroup' : 'pyknxgroup-onEvent-0'}
+            for index, (objectId, value) in enumerate(values):
+                args['o{0}'.format(index)] = objectId
+                args['v{0}'.format(index)] = value
+            self.communicator._executeObjectGroupCallbacks('onEvent', args)
+
+        # Without previous values, all objects are considered as changed.
+        sendGroupEvent([('A', '1'), ('B', '2'), ('C', '3')])
+        self.assertEqual(self.calls, ['A', 'B', 'C'])
+
+        # Then only changed objects trigger the callback.
+        del self.calls[:]
+        sendGroupEvent([('A', '1'), ('B', '4'), ('C', '3')])
+        self.assertEqual(self.calls, ['B'])
+        sendGroupEvent([('A', '1'), ('B', '4'), ('C', '3')])
+        self.assertEqual(self.calls, ['B'])
+
+        # Values of group events are recorded in the history.
+        self.communicator.linknx.history = history.HistoryStore(10)
+        sendGroupEvent([('A', '1'), ('B', '5'), ('C', '3')])
+        self.assertEqual(self.communicator.linknx.history.get('B').last[1], 5)
+        self.assertEqual(len(self.communicator.linknx.history.get('A')), 1)
+
+    def testChangeOnlyCallbacks(self):
+        self.communicator.setChangeOnly('onEvent')
+        self.communicator._userModule.onOther = lambda context: self.calls.append('other ' + context.objectId)
+        listener = communicator.Communicator.Listener(('localhost', 0), self.communicator)
+        try:
+            for callbackName, objectId, value in [('onEvent', 'A', '1'), ('onEvent', 'A', '1'), ('onEvent', 'B', '1'), ('onEvent', 'A', '2'), ('onOther', 'A', '2'), ('onOther', 'A', '2')]:
+                listener._handleCall(callbackName, {'objectId' : objectId, 'value' : value}, None)
+        finally:
+            listener._socket.close()
+        self.assertEqual(self.calls, ['A', 'B', 'A', 'other A', 'other A'])
+        self.assertEqual(self.communicator.droppedEventCounts, {'onEvent' : 1})
+
+        # All callbacks but some.
+        self.communicator.setChangeOnly('*')
+        self.communicator.setChangeOnly('onEvent', False)
+        self.assertTrue(self.communicator._isChangeOnly('onOther'))
+        self.assertFalse(self.communicator._isChangeOnly('onEvent'))
+
+    def testChangeOnlyTypedValues(self):
+        class BooleanObject(FakeObject):
+            typeCategory = 'bool'
+            def convertStringToValue(self, valueString):
+                return valueString.lower() in ['on', 'true', '1', 'yes']
+        self.communicator.linknx.getObject = BooleanObject
+        self.communicator.setChangeOnly('onEvent')
+        listener = communicator.Communicator.Listener(('localhost', 0), self.communicator)
+        try:
+            for value in [True, True, False, 'off', 'on', True]:
+                listener._handleCall('onEvent', {'objectId' : 'A', 'value' : value}, None)
+        finally:
+            listener._socket.close()
+        self.assertEqual(self.calls, ['A', 'A', 'A'])
+
+    def testChangeOnlyReadsValueOnce(self):
+        reads = []
+        class ReadObject(FakeObject):
+            @property
+            def value(self):
+                reads.append(self.id)
+                return 0
+        self.communicator.linknx.getObject = ReadObject
+        self.communicator.setChangeOnly('onValue')
+        values = []
+        self.communicator._userModule.onValue = lambda context: values.append(context.value)
+        listener = communicator.Communicator.Listener(('localhost', 0), self.communicator)
+        try:
+            listener._handleCall('onValue', {'objectId' : 'A'}, None)
+        finally:
+            listener._socket.close()
+        self.assertEqual(values, [0])
+        self.assertEqual(reads, ['A'])
+
+    def testEventValues(self):
+        values = []
+        self.communicator._userModule.onValue = lambda context: values.append((context.objectId, context.value))
+        self.communicator.linknx.history = history.HistoryStore(10)
+        listener = communicator.Communicator.Listener(('localhost', 0), self.communicator)
+        try:
+            listener._handleCall('onValue', {'objectId' : 'A', 'value' : '5'}, None)
+            listener._handleCall('onValue', {'objectId' : 'B'}, None)
+            listener._handleCall('onValue', {'objectId' : 'C', 'value' : 'garbage'}, None)
+            listener._handleCall('onValue', {'objectId' : 'D', 'value' : 7}, None)
+            self.communicator._executeObjectGroupCallbacks('onValue', {'objectGroup' : 'group', 'o0' : 'E', 'v0' : '8'})
+        finally:
+            listener._socket.close()
+        self.assertEqual(values, [('A', 5), ('B', 0), ('C', 0), ('D', 7), ('E', 8)])
+        self.assertEqual(self.communicator.linknx.history.get('A').last[1], 5)
+        self.assertIsNone(self.communicator.linknx.history.get('B'))
+
+    def testObjectGroupValuesFromLinknx(self):
+        config = """<config><services><ioports><ioport id="pyknx" type="tcp" host="127.0.0.1" port="1029"/></ioports></services>
+            <objects><object id="A" type="5.xxx" init="3"/><object id="B" type="5.xxx" init="4"/></objects>
+            <rules><rule id="pyknxgroup-onEvent-0"><condition type="or"><condition type="object" id="A" trigger="true"/><condition type="object" id="B" trigger="true"/></condition>
+            <actionlist><action type="ioport-tx" ioport="pyknx" var="true" data="onEvent|objectGroup=pyknxgroup-onEvent-0|o0=A|v0=${A}|o1=B|v1=${B}$"/></actionlist></rule></rules></config>"""
+        with FakeLinknxServer(config) as server:
+            communicatorInstance = communicator.Communicator(linknx.Linknx(*server.address), None)
+            communicatorInstance._primeObjectGroups()
+            self.assertEqual(communicatorInstance._objectGroupValues, {'pyknxgroup-onEvent-0' : {'A' : 3, 'B' : 4}})
+
+            # A failed read falls back to considering all objects as changed.
+            communicatorInstance = communicator.Communicator(linknx.Linknx(*server.address), None)
+            communicatorInstance.linknx.objectConfig
+            server.errorRate = 1
+            communicatorInstance._primeObjectGroups()
+            self.assertEqual(communicatorInstance._objectGroupValues, {})
+
+    def testChangeOnlyValuesFromLinknx(self):
+        config = """<config><services><ioports><ioport id="pyknx" type="tcp" host="127.0.0.1" port="1029"/></ioports></services>
+            <objects><object id="Status" type="5.xxx" init="3"/><object id="Other" type="5.xxx" init="3"/></objects>
+            <rules><rule id="pyknxStatus"><condition type="object" id="Status" trigger="true"/>
+            <actionlist><action type="ioport-tx" ioport="pyknx" data="onEvent|objectId=Status$"/></actionlist></rule></rules></config>"""
+        with FakeLinknxServer(config) as server:
+            communicatorInstance = communicator.Communicator(linknx.Linknx(*server.address), None, changeOnlyCallbacks=['*'])
+            communicatorInstance._primeChangeOnlyValues()
+            self.assertEqual(server.requestCounts['read'], 2) # Configuration, then values.
+            self.assertTrue(communicatorInstance._isUnchangedEvent('onEvent', {'objectId' : 'Status'}))
+            server.setValue('Status', '4')
+            self.assertFalse(communicatorInstance._isUnchangedEvent('onEvent', {'objectId' : 'Status'}))
+            self.assertTrue(communicatorInstance._isUnchangedEvent('onEvent', {'objectId' : 'Status'}))
+
+            # Objects of other rules are not primed.
+            self.assertFalse(communicatorInstance._isUnchangedEvent('onEvent', {'objectId' : 'Other'}))
+
+    def testListenerMessageFormats(self):
+        server = socket.socket()
+        server.bind(('localhost', 0))
+        address = server.getsockname()
+        server.close()
+
+        self.communicator.isUserScriptInitialized = True
+        listener = communicator.Communicator.Listener(address, self.communicator)
+        listener.start()
+        try:
+            self.assertTrue(listener.readyEvent.wait(2))
+            connection = socket.create_connection(address)
+            connection.sendall(b'onEvent|objectId=A$')
+            connection.close()
+            framing.sendCalls(address, [('onEvent', {'objectId' : 'B'}), ('onEvent', {'objectId' : 'C|$'})])
+
+            # Oversized frames are rejected without waiting for their payload.
+            connection = socket.create_connection(address)
+            connection.sendall(framing.MAGIC + bytes([framing.VERSION]) + b'\xff\xff\xff\xff')
+            connection.close()
+            connection = socket.create_connection(address)
+            connection.sendall(b'onEvent|objectId=D$')
+            connection.close()
+            self.waitFor(lambda: len(self.calls) >= 4, 'waiting for calls.')
+            self.assertEqual(self.calls, ['A', 'B', 'C|$', 'D'])
+        finally:
+            listener.stop()
+            listener.join()
+
+    def testFraming(self):
+        calls = [('onEvent', {'none' : None, 'true' : True, 'false' : False, 'int' : -2**40, 'float' : 0.25, 'str' : 'a|b=c$é'}), ('noArgs', {})]
+        frame = framing.encodeCalls(calls)
+        self.assertEqual(frame[0:1], framing.MAGIC)
+        self.assertEqual(framing.decodeHeader(frame[:framing.HEADER_LENGTH]), len(frame) - framing.HEADER_LENGTH)
+        decodedCalls = framing.decodeCalls(frame[framing.HEADER_LENGTH:])
+        self.assertEqual(decodedCalls, calls)
+        self.assertIs(decodedCalls[0][1]['true'], True)
+        self.assertIsInstance(decodedCalls[0][1]['int'], int)
+
+        with self.assertRaises(Exception):
+            framing.decodeCalls(frame[framing.HEADER_LENGTH:-3])
+        with self.assertRaises(Exception):
+            framing.encodeCalls([('onEvent', {'list' : [1]})])
+        with self.assertRaises(Exception):
+            framing.decodeHeader(framing.MAGIC + bytes([framing.VERSION]) + (framing.MAX_PAYLOAD_LENGTH + 1).to_bytes(4, 'big'))
+
+    def testRPCCall(self):
+        def getStatus(context):
+            if context.level < 0: raise ValueError('Negative level.')
+            return {'level' : context.level * 2, 'caller' : context.getArgument('caller')}
+        self.communicator._userModule.getStatus = getStatus
+
+        self.assertEqual(self.communicator._executeRPCCall('getStatus', {'level' : 2, 'caller' : 'test'}), {'level' : 4, 'caller' : 'test'})
+        with self.assertRaises(ValueError):
+            self.communicator._executeRPCCall('getStatus', {'level' : -1})
+        with self.assertRaises(rpc.RPCError):
+            self.communicator._executeRPCCall('missingFunction', {})
+        with self.assertRaises(rpc.RPCError):
+            self.communicator._executeRPCCall('__init__', {})
+
+if __name__ == '__main__':
+    unittest.main()
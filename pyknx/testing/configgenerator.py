@@ -0,0 +1,159 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+
+"""
+Generator of synthetic linknx configurations, for scale tests and benchmarks.
+
+The generated configurations hold objects of every type family that pyknx.linknx.ObjectConfig recognizes, callback attributes on a chosen
+fraction of them, user rules that react to object changes and ioports. Object identifiers are "Object0", "Object1", ... The same parameters
+and seed always produce the same configuration.
+"""
+
+import sys
+import os
+import random
+import argparse
+from xml.sax.saxutils import quoteattr, escape
+
+# One entry per type family recognized by ObjectConfig: (type, init value,
+# value set by rules). Families without an init value are read from the bus
+# at linknx start-up.
+OBJECT_TYPES = (
+    ('1.001', 'off', 'on'),
+    ('4.002', 'a', 'b'),
+    ('5.xxx', '0', '255'),
+    ('5.001', '0', '100'),
+    ('5.003', '0', '360'),
+    ('6.xxx', '0', '-128'),
+    ('7.xxx', '0', '65535'),
+    ('8.xxx', '0', '-32768'),
+    ('9.xxx', '0.0', '-5.5'),
+    ('9.001', '20.5', '19.0'),
+    ('10.001', None, '12:30:00'),
+    ('11.001', None, '2014-01-01'),
+    ('12.xxx', '0', '4294967295'),
+    ('13.xxx', '0', '-2147483648'),
+    ('14.xxx', '0.0', '3.14'),
+    ('16.000', 'text', 'other text'),
+    ('16.001', 'text', 'other text'),
+    ('28.001', 'text', 'other text'),
+    ('29.xxx', '0', '-1'))
+
+def getGroupAddress(index):
+    """ Return the index-th three-level group address. Addresses wrap around after 65536 objects, linknx accepts several objects on the same address. """
+    return '{0}/{1}/{2}'.format(index // 2048 % 32, index // 256 % 8, index % 256)
+
+def iterConfigLines(objectCount, callbackFraction=1.0, callbackCount=20, ruleCount=0, ioportCount=0, types=None, communicatorName='pyknx', seed=0):
+    """
+    Yield the lines of a synthetic linknx configuration.
+
+    objectCount -- Number of objects.
+    callbackFraction -- Fraction of the objects that have a callback attribute, evenly spread over the objects. 1 gives a callback to every object.
+    callbackCount -- Number of distinct callbacks ("onObject0Changed", "onObject1Changed", ...) objects with a callback are spread over.
+    ruleCount -- Number of user rules. Each rule is triggered by a change of an object and sets another one, or sends a message to an ioport if there is any.
+    ioportCount -- Number of UDP ioports.
+    types -- Types of the objects, which are cycled through. Defaults to the types of OBJECT_TYPES.
+    communicatorName -- Name of the communicator, which prefixes the callback attribute name.
+    seed -- Seed of the random generator that picks initial values and rule objects.
+
+    """
+    randomGenerator = random.Random(seed)
+    initValues = dict((t, init) for t, init, ruleValue in OBJECT_TYPES)
+    ruleValues = dict((t, ruleValue) for t, init, ruleValue in OBJECT_TYPES)
+    if types is None:
+        types = [t for t, init, ruleValue in OBJECT_TYPES]
+    callbackAttributeName = '{0}callback'.format(communicatorName)
+
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<config>\n'
+    yield '\t<services>\n\t\t<xmlserver port="1028" type="inet"/>\n\t</services>\n'
+    yield '\t<objects>\n'
+    callbackIndex = 0
+    for i in range(objectCount):
+        objectType = types[i % len(types)]
+        attributes = 'id="Object{0}" type="{1}" gad="{2}"'.format(i, objectType, getGroupAddress(i))
+        initValue = initValues.get(objectType)
+        if initValue is not None:
+            if initValue == 'off':
+                initValue = randomGenerator.choice(('on', 'off'))
+            elif initValue == '0':
+                initValue = str(randomGenerator.randint(0, 100))
+            attributes += ' init={0}'.format(quoteattr(initValue))
+        if int((i + 1) * callbackFraction) > int(i * callbackFraction):
+            attributes += ' {0}="onObject{1}Changed"'.format(callbackAttributeName, callbackIndex % callbackCount)
+            callbackIndex += 1
+        yield '\t\t<object {0}>{1}</object>\n'.format(attributes, escape('Synthetic {0} object {1}'.format(objectType, i)))
+    yield '\t</objects>\n'
+
+    if ruleCount and objectCount > 1:
+        yield '\t<rules>\n'
+        for i in range(ruleCount):
+            sourceIndex, targetIndex = randomGenerator.sample(range(objectCount), 2)
+            yield '\t\t<rule id="rule{0}">\n'.format(i)
+            yield '\t\t\t<condition type="object" id="Object{0}" trigger="true"/>\n'.format(sourceIndex)
+            yield '\t\t\t<actionlist>\n'
+            if ioportCount and i % 2:
+                yield '\t\t\t\t<action type="ioport-tx" ioport="ioport{0}" data="Object{1}=${{Object{1}}}" var="true"/>\n'.format(i % ioportCount, sourceIndex)
+            else:
+                targetValue = ruleValues.get(types[targetIndex % len(types)], '0')
+                yield '\t\t\t\t<action type="set-value" id="Object{0}" value={1}/>\n'.format(targetIndex, quoteattr(targetValue))
+            yield '\t\t\t</actionlist>\n'
+            yield '\t\t</rule>\n'
+        yield '\t</rules>\n'
+
+    if ioportCount:
+        yield '\t<ioports>\n'
+        for i in range(ioportCount):
+            yield '\t\t<ioport id="ioport{0}" type="udp" host="192.168.{1}.{2}" port="{3}"/>\n'.format(i, i // 250 % 250, i % 250 + 1, 10000 + i)
+        yield '\t</ioports>\n'
+
+    yield '\t<logging level="INFO"/>\n'
+    yield '</config>\n'
+
+def generateConfig(objectCount, **options):
+    """ Return a synthetic linknx configuration as a string. See iterConfigLines() for the options. """
+    return ''.join(iterConfigLines(objectCount, **options))
+
+def writeConfig(fileName, objectCount, **options):
+    """ Write a synthetic linknx configuration to fileName. See iterConfigLines() for the options. """
+    with open(fileName, 'w') as f:
+        f.writelines(iterConfigLines(objectCount, **options))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('objectCount', help='number of objects.', metavar='COUNT', type=int)
+    parser.add_argument('-o', '--output', help='write the configuration to FILE rather than to the standard output.', metavar='FILE', default=None)
+    parser.add_argument('-f', '--callback-fraction', dest='callbackFraction', help='fraction of the objects that have a callback. Default is 1.', type=float, default=1.0)
+    parser.add_argument('-c', '--callbacks', dest='callbackCount', help='number of distinct callbacks. Default is 20.', type=int, default=20)
+    parser.add_argument('-r', '--rules', dest='ruleCount', help='number of user rules. Default is 0.', type=int, default=0)
+    parser.add_argument('-i', '--ioports', dest='ioportCount', help='number of ioports. Default is 0.', type=int, default=0)
+    parser.add_argument('-t', '--types', help='comma-separated list of object types. Default is one type of each family.', default=None)
+    parser.add_argument('--comm-name', dest='communicatorName', help='name of the communicator, which prefixes the callback attribute name. Default is "pyknx".', default='pyknx')
+    parser.add_argument('--seed', help='seed of the random generator. Default is 0.', type=int, default=0)
+    args = parser.parse_args()
+
+    options = dict(callbackFraction=args.callbackFraction, callbackCount=args.callbackCount, ruleCount=args.ruleCount, ioportCount=args.ioportCount, types=args.types.split(',') if args.types else None, communicatorName=args.communicatorName, seed=args.seed)
+    if args.output:
+        writeConfig(args.output, args.objectCount, **options)
+    else:
+        sys.stdout.writelines(iterConfigLines(args.objectCount, **options))
@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+import sys
+sys.path.append('../')
+from pyknx import configurator
+from pyknx.linknx import ObjectConfig
+from pyknx.testing import base, configgenerator
+from pyknx.testing.fakelinknx import FakeLinknxServer
+from xml.dom.minidom import parseString
+import unittest
+
+class ConfigGeneratorTestCase(base.TestCaseBase):
+    def testObjects(self):
+        doc = parseString(configgenerator.generateConfig(1000, callbackFraction=0.25, callbackCount=7))
+        objectConfigs = [ObjectConfig(node) for node in doc.getElementsByTagName('object')]
+        self.assertEqual(len(objectConfigs), 1000)
+        self.assertEqual(len(set(o.id for o in objectConfigs)), 1000)
+        self.assertEqual(set(o.typeCategory for o in objectConfigs), set(['bool', 'int', 'float', 'string', 'time', 'date']))
+        self.assertEqual(set(o.type for o in objectConfigs), set(t[0] for t in configgenerator.OBJECT_TYPES))
+        callbacks = [node.getAttribute('pyknxcallback') for node in doc.getElementsByTagName('object') if node.hasAttribute('pyknxcallback')]
+        self.assertEqual(len(callbacks), 250)
+        self.assertEqual(len(set(callbacks)), 7)
+
+    def testRulesAndIOPorts(self):
+        config = configgenerator.generateConfig(100, ruleCount=30, ioportCount=3, communicatorName='foo')
+        self.assertEqual(config, configgenerator.generateConfig(100, ruleCount=30, ioportCount=3, communicatorName='foo'))
+        self.assertNotEqual(config, configgenerator.generateConfig(100, ruleCount=30, ioportCount=3, communicatorName='foo', seed=1))
+        doc = parseString(config)
+        self.assertEqual(len(doc.getElementsByTagName('rule')), 30)
+        self.assertEqual(len(doc.getElementsByTagName('ioport')), 3)
+        self.assertEqual(len([n for n in doc.getElementsByTagName('action') if n.getAttribute('type') == 'ioport-tx']), 15)
+        self.assertTrue(all(n.hasAttribute('foocallback') for n in doc.getElementsByTagName('object')))
+
+        # The generated configuration can be configured for a communicator
+        # and served by the fake linknx.
+        sourceFile = self.getOutputFullName('source.xml')
+        outputFile = self.getOutputFullName('output.xml')
+        configgenerator.writeConfig(sourceFile, 100, ruleCount=30, ioportCount=3)
+        conf = configurator.Configurator(sourceFile, outputFile, ('127.0.0.1', 1029))
+        conf.cleanConfig()
+        conf.generateConfig()
+        conf.writeConfig()
+        rulesNode = conf.config.getElementsByTagName('rules')[0]
+        self.assertEqual(len(rulesNode.getElementsByTagName('rule')), 130)
+        with FakeLinknxServer(outputFile) as server:
+            for objectIndex in range(100):
+                objectId = 'Object{0}'.format(objectIndex)
+                server.setValue(objectId, server.getValue(objectId) + '1')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+import sys
+sys.path.append('../')
+from pyknx import logger, diagnostics, communicator
+from pyknx.testing import base
+import os
+import time
+import types
+import unittest
+import threading
+
+class DiagnosticsTestCase(base.TestCaseBase):
+    def setUp(self):
+        base.TestCaseBase.setUp(self)
+        self.outputDirectory = os.path.dirname(self.getOutputFullName(None, appendsTestName=False))
+
+    def testWatchdog(self):
+        watchdog = diagnostics.CallbackWatchdog(0.1, checkPeriod=0.05)
+        releaseEvent = threading.Event()
+        def slowCallback():
+            watchdog.enter('onSlowCallback')
+            releaseEvent.wait(5)
+            watchdog.leave()
+        callbackThread = threading.Thread(target=slowCallback)
+        callbackThread.start()
+        try:
+            watchdog.check()
+            self.assertEqual(watchdog.overrunCount, 0)
+            time.sleep(0.2)
+            watchdog.check()
+            self.assertEqual(watchdog.overrunCount, 1)
+
+            # Overruns are reported once per call.
+            watchdog.check()
+            self.assertEqual(watchdog.overrunCount, 1)
+        finally:
+            releaseEvent.set()
+            callbackThread.join()
+
+    def testProfilingAroundCallbacks(self):
+        def onEvent(context):
+            return sum(range(1000))
+        comm = communicator.Communicator(None, None, profiler=diagnostics.CallbackProfiler('cprofile', 60, self.outputDirectory))
+        comm._userModule = types.SimpleNamespace(onEvent=onEvent)
+        comm.profiler.start()
+        self.assertTrue(comm.profiler.isActive)
+        self.assertEqual(comm._executeUserCallback('onEvent', None), 499500)
+        comm.profiler.stop()
+        self.assertFalse(comm.profiler.isActive)
+        with open(comm.profiler.lastReportFile) as report:
+            self.assertIn('onEvent', report.read())
+        os.remove(comm.profiler.lastReportFile)
+
+    def testStopWaitsForProfiledCallbacks(self):
+        def onEvent():
+            return sum(range(1000))
+        profiler = diagnostics.CallbackProfiler('cprofile', 60, self.outputDirectory)
+        profiler.start()
+        token = profiler.enter()
+        self.assertIsNotNone(token)
+        stopThread = threading.Thread(target=profiler.stop)
+        stopThread.start()
+        stopThread.join(0.2)
+        self.assertTrue(stopThread.is_alive())
+        self.assertIsNone(profiler.enter()) # No new callback is profiled once stopping.
+        onEvent()
+        profiler.leave(token)
+        stopThread.join()
+        with open(profiler.lastReportFile) as report:
+            self.assertIn('onEvent', report.read())
+        os.remove(profiler.lastReportFile)
+
+    def testIdleProfilingWindow(self):
+        profiler = diagnostics.CallbackProfiler('cprofile', 60, self.outputDirectory)
+        profiler.start()
+        profiler.stop()
+        self.assertFalse(profiler.isActive)
+        with open(profiler.lastReportFile) as report:
+            self.assertIn('No callback executed', report.read())
+        os.remove(profiler.lastReportFile)
+
+    def testTracemallocProfiling(self):
+        profiler = diagnostics.CallbackProfiler('tracemalloc', 60, self.outputDirectory)
+        profiler.start()
+        data = [str(i) for i in range(10000)]
+        profiler.stop()
+        self.assertTrue(os.path.getsize(profiler.lastReportFile) > 0)
+        os.remove(profiler.lastReportFile)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+import sys
+sys.path.append('../')
+from pyknx import tcpsocket
+from pyknx.eventstorm import EventStorm, readTargets
+from pyknx.testing import base, configgenerator
+import collections
+import socket
+import threading
+import time
+import unittest
+
+class EventStormTestCase(base.TestCaseBase):
+    def setUp(self):
+        base.TestCaseBase.setUp(self)
+        self.targets = [('onObject{0}Changed'.format(i % 2), 'Object{0}'.format(i)) for i in range(10)]
+
+    def testSchedule(self):
+        storm = EventStorm(('localhost', 1029), self.targets, rate=100, distribution='sequential')
+        schedule = list(storm.iterSchedule(eventCount=25))
+        self.assertEqual(len(schedule), 25)
+        self.assertEqual([s[0] for s in schedule[:3]], [0.0, 0.01, 0.02])
+        self.assertEqual([s[2] for s in schedule[:11]], ['Object{0}'.format(i) for i in range(10)] + ['Object0'])
+        self.assertEqual(schedule[1][1], 'onObject1Changed')
+        self.assertEqual(len(list(storm.iterSchedule(duration=0.5))), 50)
+
+        storm = EventStorm(('localhost', 1029), self.targets, rate=100, shape='burst', burstSize=10)
+        offsets = [s[0] for s in storm.iterSchedule(eventCount=25)]
+        self.assertEqual(offsets, [0.0] * 10 + [0.1] * 10 + [0.2] * 5)
+
+        storm = EventStorm(('localhost', 1029), self.targets, rate=100, shape='poisson', seed=1)
+        offsets = [s[0] for s in storm.iterSchedule(eventCount=2000)]
+        self.assertEqual(offsets, sorted(offsets))
+        self.assertAlmostEqual(offsets[-1], 20, delta=2)
+
+    def testDistributions(self):
+        storm = EventStorm(('localhost', 1029), self.targets, distribution='zipf', zipfExponent=1.5, seed=1)
+        counts = collections.Counter(s[2] for s in storm.iterSchedule(eventCount=5000))
+        self.assertGreater(counts['Object0'], 2 * counts['Object1'])
+        self.assertGreater(counts['Object1'], counts['Object9'])
+
+        storm = EventStorm(('localhost', 1029), self.targets, seed=1)
+        counts = collections.Counter(s[2] for s in storm.iterSchedule(eventCount=5000))
+        self.assertEqual(len(counts), 10)
+        self.assertLess(max(counts.values()), 2 * min(counts.values()))
+
+        with self.assertRaises(Exception):
+            EventStorm(('localhost', 1029), self.targets, distribution='gaussian')
+        with self.assertRaises(Exception):
+            EventStorm(('localhost', 1029), [])
+
+    def testRun(self):
+        # Receive messages the same way the communicator does.
+        receivedData = []
+        serverSocket = tcpsocket.Socket()
+        serverSocket.bind(('localhost', 0))
+        address = serverSocket._socket.getsockname()
+        def receive():
+            while len(receivedData) < 40:
+                data, conn = serverSocket.waitForString(endChar='$')
+                if data is None: break
+                receivedData.append(data)
+                conn.close()
+        receivingThread = threading.Thread(target=receive)
+        receivingThread.start()
+        try:
+            storm = EventStorm(address, self.targets, rate=200, concurrency=2, distribution='sequential')
+            statistics = storm.run(eventCount=40)
+        finally:
+            receivingThread.join()
+            serverSocket.close()
+
+        self.assertEqual(statistics.acceptedCount, 40)
+        self.assertEqual(statistics.failedCount, 0)
+        self.assertEqual(len(statistics.latencies), 40)
+        self.assertGreaterEqual(statistics.elapsed, 39 / 200.0)
+        self.assertLessEqual(statistics.getLatencyPercentile(50), statistics.getLatencyPercentile(100))
+        self.assertEqual(sorted(receivedData), sorted('onObject{0}Changed|objectId=Object{1}'.format(i % 2, i) for i in range(10) for j in range(4)))
+
+        # Nobody is listening anymore.
+        statistics = EventStorm(address, self.targets, rate=0).run(eventCount=10)
+        self.assertEqual(statistics.acceptedCount, 0)
+        self.assertEqual(statistics.failedCount, 10)
+        self.assertEqual(statistics.errors, {'ConnectionRefusedError' : 10})
+        self.assertIsNone(statistics.getLatencyPercentile(50))
+        self.assertEqual(statistics.toDict()['failed'], 10)
+
+    def testReadTargets(self):
+        configFile = self.getOutputFullName('config.xml')
+        configgenerator.writeConfig(configFile, 10, callbackFraction=0.5, callbackCount=2)
+        self.assertEqual(readTargets(configFile), [('onObject0Changed', 'Object1'), ('onObject1Changed', 'Object3'), ('onObject0Changed', 'Object5'), ('onObject1Changed', 'Object7'), ('onObject0Changed', 'Object9')])
+        self.assertEqual(readTargets(configFile, 'foo'), [])
+
+if __name__ == '__main__':
+    unittest.main()
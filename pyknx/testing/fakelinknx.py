@@ -0,0 +1,311 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+"""
+In-process stand-in for linknx.
+
+FakeLinknxServer speaks the subset of the linknx XML protocol that pyknx uses: reading the configuration, reading and writing objects and
+executing actions. Rules whose object conditions are triggered by a write have their ioport-tx actions delivered to the tcp ioports of
+the configuration (e.g. to a communicator), with variable substitution. Latency, error statuses and dropped connections can be injected
+so that client and communicator code can be tested and benchmarked without a linknx binary.
+"""
+
+import re
+import time
+import random
+import socket
+import collections
+from queue import Queue
+from threading import Thread, Lock, Condition
+from xml.dom.minidom import parse, parseString, Document
+from xml.sax.saxutils import quoteattr, escape
+from pyknx import logger
+from pyknx.linknx import ObjectConfig
+
+class FakeLinknxServer(object):
+    """ A linknx stand-in that runs in a background thread. """
+    def __init__(self, config, address=('localhost', 0), latency=0, errorRate=0, disconnectRate=0, executeDuration=0, seed=None):
+        """
+        Initialize the server. Call start() to start serving.
+
+        config -- The linknx configuration: a filename, an XML string or a minidom Document.
+        address -- Address to listen on, as a tuple (ip address, port). Port 0 picks a free port, see the address property.
+        latency -- Time to wait before answering each request, in seconds.
+        errorRate -- Probability that a request is answered with an error status.
+        disconnectRate -- Probability that the connection is closed instead of answering a request.
+        executeDuration -- If not 0, <execute> requests are first answered with an "ongoing" status, followed by the final status after this time.
+        seed -- Seed of the random generator used for error injection, for reproducible runs.
+
+        """
+        if isinstance(config, Document):
+            self._document = config
+        elif config.lstrip().startswith('<'):
+            self._document = parseString(config)
+        else:
+            self._document = parse(config)
+        self._address = address
+        self.latency = latency
+        self.errorRate = errorRate
+        self.disconnectRate = disconnectRate
+        self.executeDuration = executeDuration
+        self._random = random.Random(seed)
+        self._server = None
+        self._lock = Lock()
+        self.requestCounts = collections.Counter() # Key is command name (read, write, execute).
+        self.connectionCount = 0
+        self._connections = set()
+        self.deliveredCount = 0
+        self.failedDeliveryCount = 0
+        self._deliveries = Queue()
+        self._pendingDeliveryCount = 0
+        self._idleCondition = Condition()
+        self._loadConfig()
+
+    def _loadConfig(self):
+        configNode = self._document.getElementsByTagName('config')[0]
+        self._configXML = configNode.toxml()
+
+        # Object values are stored in the linknx string format.
+        self._objectConfigs = {}
+        self._values = {}
+        for objectsNode in configNode.getElementsByTagName('objects'):
+            for objectNode in objectsNode.getElementsByTagName('object'):
+                objectConfig = ObjectConfig(objectNode)
+                self._objectConfigs[objectConfig.id] = objectConfig
+                init = objectNode.getAttribute('init')
+                if init and init not in ('request', 'persist'):
+                    self._values[objectConfig.id] = self._normalizeValue(objectConfig, init)
+                else:
+                    self._values[objectConfig.id] = {'bool' : 'off', 'int' : '0', 'float' : '0'}.get(objectConfig.typeCategory, '')
+
+        # Key is ioport id, value is the address (host, port) of tcp ioports and
+        # None for other types, whose messages are dropped.
+        self._ioports = {}
+        for ioportNode in configNode.getElementsByTagName('ioport'):
+            if ioportNode.getAttribute('type') == 'tcp':
+                self._ioports[ioportNode.getAttribute('id')] = (ioportNode.getAttribute('host'), int(ioportNode.getAttribute('port')))
+            else:
+                self._ioports[ioportNode.getAttribute('id')] = None
+
+        # Key is object id, value is the list of action nodes to execute when
+        # the object is written to.
+        self._triggeredActions = collections.defaultdict(list)
+        for ruleNode in configNode.getElementsByTagName('rule'):
+            actions = []
+            for actionListNode in ruleNode.getElementsByTagName('actionlist'):
+                if actionListNode.getAttribute('type') in ('', 'if-true', 'on-true'):
+                    actions.extend(actionListNode.getElementsByTagName('action'))
+            for conditionNode in ruleNode.getElementsByTagName('condition'):
+                if conditionNode.getAttribute('type') == 'object' and conditionNode.getAttribute('trigger') == 'true':
+                    self._triggeredActions[conditionNode.getAttribute('id')].extend(actions)
+
+    @staticmethod
+    def _normalizeValue(objectConfig, value):
+        if objectConfig.typeCategory == 'bool':
+            return 'on' if value.lower() in ('on', '1', 'true', 'yes') else 'off'
+        return value
+
+    @property
+    def address(self):
+        """ Return the actual listening address. """
+        return self._server.server_address if self._server else self._address
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        import socketserver
+        fakeLinknx = self
+
+        class RequestHandler(socketserver.BaseRequestHandler):
+            def handle(self):
+                with fakeLinknx._lock:
+                    fakeLinknx.connectionCount += 1
+                    fakeLinknx._connections.add(self.request)
+                try:
+                    buffer = b''
+                    while True:
+                        chunk = self.request.recv(65536)
+                        if not chunk: return
+                        buffer += chunk
+                        while b'\x04' in buffer:
+                            message, sep, buffer = buffer.partition(b'\x04')
+                            if not fakeLinknx._handleMessage(self.request, message.decode('utf8')):
+                                return
+                except OSError:
+                    # The connection has been dropped.
+                    return
+                finally:
+                    with fakeLinknx._lock:
+                        fakeLinknx._connections.discard(self.request)
+
+        class Server(socketserver.ThreadingTCPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+
+        self._server = Server(self._address, RequestHandler)
+        Thread(target=self._server.serve_forever, name='Fake Linknx Server Thread', daemon=True).start()
+        Thread(target=self._deliver, name='Fake Linknx Delivery Thread', daemon=True).start()
+        logger.reportInfo('Fake linknx listening on {0}'.format(self.address))
+
+    def stop(self):
+        if self._server is None: return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        self._deliveries.put(None)
+
+    def dropConnections(self):
+        """ Close the connections of all clients, as linknx does when it restarts. The server keeps accepting new connections. """
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def getValue(self, objectId):
+        """ Return the current value of an object, in the linknx string format. """
+        with self._lock:
+            return self._values[objectId]
+
+    def setValue(self, objectId, value):
+        """ Change the value of an object, as if it came from the KNX bus. Rules triggered by the object are executed, even if the value does not change, like linknx does. """
+        objectConfig = self._objectConfigs.get(objectId)
+        if objectConfig is None:
+            raise Exception('Object ID not found {0}'.format(objectId))
+        value = self._normalizeValue(objectConfig, value)
+        with self._lock:
+            self._values[objectId] = value
+        for actionNode in self._triggeredActions.get(objectId, ()):
+            self._executeAction(actionNode)
+
+    def waitForDeliveries(self, timeout=5):
+        """ Wait until all ioport messages queued so far have been delivered. Returns False on timeout. """
+        with self._idleCondition:
+            return self._idleCondition.wait_for(lambda: self._pendingDeliveryCount == 0, timeout)
+
+    def _handleMessage(self, connection, message):
+        """ Process a request and send the answer. Returns False if the connection must be closed. """
+        # Linknx prepends its own XML declaration to messages that may already
+        # have one (see Object.value's setter): only keep the request itself.
+        document = parseString(re.sub(r'<\?xml[^>]*\?>', '', message))
+        requestNode = document.documentElement
+        command = requestNode.tagName
+        with self._lock:
+            self.requestCounts[command] += 1
+
+        if self.latency:
+            time.sleep(self.latency)
+        if self.disconnectRate and self._random.random() < self.disconnectRate:
+            connection.close()
+            return False
+        if self.errorRate and self._random.random() < self.errorRate:
+            self._send(connection, '<{0} status="error">Injected error</{0}>'.format(command))
+            return True
+
+        try:
+            if command == 'read':
+                answer = self._read(requestNode)
+            elif command == 'write':
+                for objectNode in requestNode.getElementsByTagName('object'):
+                    self.setValue(objectNode.getAttribute('id'), objectNode.getAttribute('value'))
+                answer = '<write status="success"/>'
+            elif command == 'execute':
+                if self.executeDuration:
+                    self._send(connection, '<execute status="ongoing"/>')
+                    time.sleep(self.executeDuration)
+                for actionNode in requestNode.getElementsByTagName('action'):
+                    self._executeAction(actionNode)
+                answer = '<execute status="success"/>'
+            else:
+                raise Exception('Unsupported command {0}'.format(command))
+        except Exception as e:
+            answer = '<{0} status="error">{1}</{0}>'.format(command, escape(str(e)))
+        self._send(connection, answer)
+        return True
+
+    def _read(self, requestNode):
+        if requestNode.getElementsByTagName('config'):
+            return '<read status="success">{0}</read>'.format(self._configXML)
+        objectsNodes = requestNode.getElementsByTagName('objects')
+        if not objectsNodes:
+            raise Exception('Unsupported read request')
+        objectAnswers = []
+        with self._lock:
+            for objectNode in objectsNodes[0].getElementsByTagName('object'):
+                objectId = objectNode.getAttribute('id')
+                if not objectId in self._values:
+                    raise Exception('Object ID not found {0}'.format(objectId))
+                objectAnswers.append('<object id={0} value={1}/>'.format(quoteattr(objectId), quoteattr(self._values[objectId])))
+        return '<read status="success"><objects>{0}</objects></read>'.format(''.join(objectAnswers))
+
+    def _executeAction(self, actionNode):
+        actionType = actionNode.getAttribute('type')
+        if actionType == 'set-value':
+            self.setValue(actionNode.getAttribute('id'), actionNode.getAttribute('value'))
+        elif actionType == 'ioport-tx':
+            data = actionNode.getAttribute('data')
+            if actionNode.getAttribute('var') == 'true':
+                with self._lock:
+                    data = re.sub(r'\$\{([^}]*)\}', lambda match: self._values.get(match.group(1), match.group(0)), data)
+            ioportId = actionNode.getAttribute('ioport')
+            if ioportId not in self._ioports:
+                raise Exception('IOPort not found {0}'.format(ioportId))
+            address = self._ioports[ioportId]
+            if address is None:
+                logger.reportDebug('Fake linknx drops message {0} to non-tcp ioport {1}.'.format(data, ioportId))
+                return
+            with self._idleCondition:
+                self._pendingDeliveryCount += 1
+            self._deliveries.put((address, data))
+        else:
+            logger.reportDebug('Fake linknx ignores action of type {0}.'.format(actionType))
+
+    def _deliver(self):
+        # Like linknx, open a connection per message and close it once sent.
+        while True:
+            delivery = self._deliveries.get()
+            if delivery is None: return
+            address, data = delivery
+            try:
+                connection = socket.create_connection(address, timeout=5)
+                try:
+                    connection.sendall(data.encode('utf8'))
+                finally:
+                    connection.close()
+                self.deliveredCount += 1
+            except OSError as e:
+                logger.reportWarning('Fake linknx could not deliver {0} to {1}: {2}'.format(data, address, e))
+                self.failedDeliveryCount += 1
+            with self._idleCondition:
+                self._pendingDeliveryCount -= 1
+                self._idleCondition.notify_all()
+
+    @staticmethod
+    def _send(connection, answer):
+        connection.sendall(answer.encode('utf8') + b'\x04')
@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+import sys
+sys.path.append('../')
+from pyknx import logger, linknx, configurator, communicator
+from pyknx.testing import base
+from pyknx.testing.fakelinknx import FakeLinknxServer
+import time
+import unittest
+
+class FakeLinknxTestCase(base.TestCaseBase):
+    def setUp(self):
+        base.TestCaseBase.setUp(self)
+        self.communicatorAddress = ('127.0.0.1', base.getFreePort('127.0.0.1'))
+        self.server = None
+
+    def tearDown(self):
+        if self.server: self.server.stop()
+
+    def startServer(self, ruleStrategy='per-object', **options):
+        patchedConfigFile = self.getOutputFullName('conf.xml')
+        conf = configurator.Configurator('linknx_test_conf.xml', patchedConfigFile, self.communicatorAddress, ruleStrategy=ruleStrategy)
+        conf.cleanConfig()
+        conf.generateConfig()
+        conf.writeConfig()
+        self.server = FakeLinknxServer(patchedConfigFile, **options)
+        self.server.start()
+        return linknx.Linknx(*self.server.address)
+
+    def testReadWrite(self):
+        linknxInstance = self.startServer()
+        self.assertEqual(len(linknxInstance.objectConfig), 19)
+        boolean = linknxInstance.getObject('Boolean')
+        self.assertFalse(boolean.value)
+        boolean.value = True
+        self.assertTrue(boolean.value)
+        self.assertEqual(self.server.getValue('Boolean'), 'on')
+        self.server.setValue('Float16', '21.5')
+        self.assertEqual(linknxInstance.getObjects(objectIds=['Boolean', 'Float16', 'String']).getValues(), {'Boolean' : True, 'Float16' : 21.5, 'String' : 'default value for 28.001'})
+        self.assertEqual(self.server.requestCounts['write'], 1)
+
+    def testExecute(self):
+        linknxInstance = self.startServer(executeDuration=0.1)
+        linknxInstance.executeAction('<action type="set-value" id="Int16" value="12"/>', waitsForAnswer=True)
+        self.assertEqual(linknxInstance.getObject('Int16').value, 12)
+
+    def testInjection(self):
+        linknxInstance = self.startServer(latency=0.1)
+        startTime = time.time()
+        linknxInstance.objectConfig
+        self.assertGreaterEqual(time.time() - startTime, 0.1)
+        self.server.latency = 0
+
+        self.server.errorRate = 1
+        with self.assertRaises(Exception):
+            linknxInstance.getObject('Boolean').value
+        self.server.errorRate = 0
+        self.server.disconnectRate = 1
+        with self.assertRaises(Exception):
+            linknxInstance.getObject('Boolean').value
+        self.server.disconnectRate = 0
+        self.assertFalse(linknxInstance.getObject('Boolean').value)
+
+    def testEventDelivery(self):
+        for ruleStrategy in configurator.Configurator.RULE_STRATEGIES:
+            calls = []
+            linknxInstance = self.startServer(ruleStrategy)
+            comm = communicator.Communicator(linknxInstance, 'linknxuserfile.py', self.communicatorAddress)
+            comm.startListening()
+            try:
+                def onBooleanChanged(context):
+                    calls.append((context.objectId, context.object.value))
+                    self.notifyStateChanged()
+                with base.PatchHandle(comm._userModule, {'onBooleanChanged' : onBooleanChanged}):
+                    self.server.setValue('Boolean', 'on')
+                    self.server.setValue('Boolean', 'on') # Linknx sends an event on every write.
+                    self.assertTrue(self.server.waitForDeliveries())
+                    self.assertEqual(self.server.deliveredCount, 2)
+
+                    # Grouped rules only call callbacks for changed values.
+                    expectedCalls = [('Boolean', True)] * (1 if ruleStrategy == 'grouped' else 2)
+                    self.waitFor(lambda: len(calls) >= len(expectedCalls), 'waiting for callbacks.')
+                    self.assertEqual(calls, expectedCalls, 'Strategy: {0}'.format(ruleStrategy))
+            finally:
+                comm.stopListening()
+                self.server.stop()
+
+    def testChangeOnlyEventDelivery(self):
+        calls = []
+        linknxInstance = self.startServer()
+        comm = communicator.Communicator(linknxInstance, 'linknxuserfile.py', self.communicatorAddress, changeOnlyCallbacks=['onBooleanChanged'])
+        comm.startListening()
+        try:
+            def onBooleanChanged(context):
+                calls.append(context.value)
+            with base.PatchHandle(comm._userModule, {'onBooleanChanged' : onBooleanChanged}):
+                # Values are read when events are handled: wait for each event
+                # before the next write.
+                for eventCount, value in enumerate(['on', 'on', 'off', 'off'], 1):
+                    self.server.setValue('Boolean', value)
+                    self.waitFor(lambda: sum(comm.droppedEventCounts.values()) + len(calls) >= eventCount, 'waiting for event.')
+                self.assertEqual(self.server.deliveredCount, 4)
+                self.assertEqual(calls, [True, False])
+                self.assertEqual(comm.droppedEventCounts['onBooleanChanged'], 2)
+        finally:
+            comm.stopListening()
+            self.server.stop()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+import sys
+sys.path.append('../')
+from pyknx import history, linknx
+from pyknx.testing import base
+from pyknx.testing.fakelinknx import FakeLinknxServer
+import unittest
+
+class ValueHistoryTestCase(base.TestCaseBase):
+    usesNumPy = False
+
+    def setUp(self):
+        base.TestCaseBase.setUp(self)
+        self.history = history.ValueHistory(5, usesNumPy=self.usesNumPy)
+
+    def testRingBuffer(self):
+        self.assertEqual(len(self.history), 0)
+        self.assertIsNone(self.history.last)
+        self.assertIsNone(self.history.mean())
+        self.assertIsNone(self.history.getRateOfChange())
+        for i in range(8):
+            self.history.append(1000.0 + i, float(i * i))
+        self.assertEqual(len(self.history), 5)
+        timestamps, values = self.history.getWindow()
+        self.assertEqual(list(timestamps), [1003.0, 1004.0, 1005.0, 1006.0, 1007.0])
+        self.assertEqual(list(values), [9.0, 16.0, 25.0, 36.0, 49.0])
+        self.assertEqual(self.history.last, (1007.0, 49.0))
+
+    def testOutOfOrderAppends(self):
+        for timestamp in (1000.0, 1002.0, 1001.0, 1003.0):
+            self.history.append(timestamp, timestamp - 1000.0)
+        timestamps, values = self.history.getWindow()
+        self.assertEqual(list(timestamps), [1000.0, 1001.0, 1002.0, 1003.0])
+        self.assertEqual(list(values), [0.0, 1.0, 2.0, 3.0])
+        self.assertEqual(self.history.last, (1003.0, 3.0))
+        self.assertEqual(list(self.history.getWindow(1.5, now=1003.0)[1]), [2.0, 3.0])
+
+        # Full history: a late value replaces the oldest one, unless it is older than all values kept.
+        self.history.append(1004.0, 4.0)
+        self.history.append(1001.5, 1.5)
+        timestamps, values = self.history.getWindow()
+        self.assertEqual(list(timestamps), [1001.0, 1001.5, 1002.0, 1003.0, 1004.0])
+        self.assertEqual(list(values), [1.0, 1.5, 2.0, 3.0, 4.0])
+        self.history.append(1000.5, 0.5)
+        self.assertEqual(list(self.history.getWindow()[0]), [1001.0, 1001.5, 1002.0, 1003.0, 1004.0])
+        self.history.append(1003.5, 3.5)
+        self.assertEqual(list(self.history.getWindow()[1]), [1.5, 2.0, 3.0, 3.5, 4.0])
+        self.assertEqual(self.history.last, (1004.0, 4.0))
+
+    def testQueries(self):
+        for i in range(5):
+            self.history.append(1000.0 + i, 10.0 + 2 * i)
+        self.assertEqual(self.history.min(), 10.0)
+        self.assertEqual(self.history.max(), 18.0)
+        self.assertEqual(self.history.mean(), 14.0)
+        self.assertAlmostEqual(self.history.getRateOfChange(), 2.0)
+
+        # Last 2.5 seconds before 1004: values at 1002, 1003 and 1004.
+        self.assertEqual(list(self.history.getWindow(2.5, now=1004.0)[1]), [14.0, 16.0, 18.0])
+        self.assertEqual(self.history.min(2.5, now=1004.0), 14.0)
+        self.assertEqual(self.history.mean(2.5, now=1004.0), 16.0)
+        self.assertIsNone(self.history.max(1, now=2000.0))
+
+    def testResample(self):
+        for timestamp, value in ((1000.0, 1.0), (1001.0, 3.0), (1002.5, 5.0), (1007.0, 7.0), (1007.5, 2.0)):
+            self.history.append(timestamp, value)
+        for aggregation, expectedValues in (('mean', [2.0, 5.0, 4.5]), ('min', [1.0, 5.0, 2.0]), ('max', [3.0, 5.0, 7.0]), ('last', [3.0, 5.0, 2.0])):
+            periods, values = self.history.resample(2, aggregation)
+            self.assertEqual(list(periods), [1000.0, 1002.0, 1006.0], aggregation)
+            self.assertEqual(list(values), expectedValues, aggregation)
+        self.assertEqual(list(self.history.resample(4, duration=3, now=1008.0)[1]), [4.5])
+        with self.assertRaises(Exception):
+            self.history.resample(2, 'median')
+
+@unittest.skipIf(history.numpy is None, 'NumPy is not installed.')
+class NumPyValueHistoryTestCase(ValueHistoryTestCase):
+    usesNumPy = True
+
+class HistoryStoreTestCase(base.TestCaseBase):
+    def testRecord(self):
+        store = history.HistoryStore(3)
+        store.record('A', 'float', 1.5, 1000.0)
+        store.record('A', 'float', 2.5, 1001.0)
+        store.record('B', 'bool', True, 1000.0)
+        store.record('C', 'string', 'foo', 1000.0)
+        store.record('D', 'int', 'not a number', 1000.0)
+        self.assertEqual(sorted(store.objectIds), ['A', 'B'])
+        self.assertEqual(store.get('A').mean(), 2.0)
+        self.assertEqual(store.get('B').last, (1000.0, 1.0))
+        self.assertIsNone(store.get('C'))
+        store.clear()
+        self.assertNotIn('A', store)
+
+    def testLinknxIntegration(self):
+        with FakeLinknxServer('linknx_test_conf.xml') as server:
+            linknxInstance = linknx.Linknx(*server.address)
+            self.assertIsNone(linknxInstance.history)
+            linknxInstance.getObject('Float16').value
+            store = linknxInstance.enableHistory(capacity=10, usesNumPy=False)
+            self.assertIs(linknxInstance.enableHistory(), store)
+
+            linknxInstance.getObject('Float16').value = 21.5
+            server.setValue('Float16', '22.5')
+            linknxInstance.getObjects(objectIds=['Float16', 'String', 'Boolean']).getValues()
+            self.assertEqual(list(linknxInstance.getObject('Float16').history.getWindow()[1]), [21.5, 22.5])
+            self.assertEqual(list(linknxInstance.getObject('Boolean').history.getWindow()[1]), [0.0])
+            self.assertIsNone(linknxInstance.getObject('String').history)
+
+if __name__ == '__main__':
+    unittest.main()
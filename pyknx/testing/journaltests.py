@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+import sys
+sys.path.append('../')
+from pyknx import logger, journal, tcpsocket
+from pyknx.testing import base
+import os
+import unittest
+import threading
+
+class JournalTestCase(base.TestCaseBase):
+    def setUp(self):
+        base.TestCaseBase.setUp(self)
+        self.journalFile = self.getOutputFullName('journal', appendsTestName=False)
+        if not os.path.exists(os.path.dirname(self.journalFile)):
+            os.makedirs(os.path.dirname(self.journalFile))
+        if os.path.exists(self.journalFile):
+            os.remove(self.journalFile)
+
+    def testWriteAndRead(self):
+        writer = journal.JournalWriter(self.journalFile)
+        writer.record(1000.0, 0.5, 'onBooleanChanged|objectId=Boolean')
+        writer.record(1001.25, 0.001, 'onStringChanged|objectId=String|arg=é"|')
+        writer.close()
+
+        # Simulate a line truncated by a crash.
+        with open(self.journalFile, 'a') as f:
+            f.write('[1002.0,0.1,"onBool')
+
+        entries = list(journal.readJournal(self.journalFile))
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(entries[0].receivedTime, 1000.0)
+        self.assertEqual(entries[0].callbackDuration, 0.5)
+        self.assertEqual(entries[0].data, 'onBooleanChanged|objectId=Boolean')
+        self.assertEqual(entries[1].data, 'onStringChanged|objectId=String|arg=é"|')
+
+    def testReplay(self):
+        writer = journal.JournalWriter(self.journalFile)
+        for i in range(5):
+            writer.record(1000.0 + i * 0.1, 0.0, 'onByteChanged|objectId=Byte|index={0}'.format(i))
+        writer.close()
+
+        # Receive messages the same way the communicator does.
+        receivedData = []
+        serverSocket = tcpsocket.Socket()
+        serverSocket.bind(('localhost', 0))
+        address = serverSocket._socket.getsockname()
+        def receive():
+            while len(receivedData) < 5:
+                data, conn = serverSocket.waitForString(endChar='$')
+                if data is None: break
+                receivedData.append(data)
+                conn.close()
+        receivingThread = threading.Thread(target=receive)
+        receivingThread.start()
+        try:
+            player = journal.JournalPlayer(self.journalFile, address, speed=10)
+            elapsed = player.play()
+        finally:
+            receivingThread.join()
+            serverSocket.close()
+
+        self.assertEqual(player.sentCount, 5)
+        self.assertEqual(player.failedCount, 0)
+        self.assertGreaterEqual(elapsed, 0.04)
+        self.assertEqual(receivedData, ['onByteChanged|objectId=Byte|index={0}'.format(i) for i in range(5)])
+
+if __name__ == '__main__':
+    unittest.main()
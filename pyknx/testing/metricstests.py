@@ -0,0 +1,81 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+import sys
+sys.path.append('../')
+from pyknx import logger, metrics
+from pyknx.testing import base
+import unittest
+import urllib.request
+
+class MetricsTestCase(base.TestCaseBase):
+    def testHistogram(self):
+        histogram = metrics.Histogram((0.1, 1.0))
+        self.assertIsNone(histogram.getQuantile(0.5))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.count, 4)
+        self.assertAlmostEqual(histogram.sum, 2.65)
+        self.assertEqual(histogram.getCumulativeCounts(), [(0.1, 2), (1.0, 3), (float('inf'), 4)])
+        self.assertAlmostEqual(histogram.getQuantile(0.5), 0.1)
+        self.assertEqual(histogram.getQuantile(1), 1.0)
+
+    def testSnapshotAndExposition(self):
+        registry = metrics.Metrics(buckets=(0.01, 0.1))
+        registry.observeCallback('onBooleanChanged', 0.005, queueTime=0.001)
+        registry.observeCallback('onBooleanChanged', 0.05, failed=True)
+        registry.observeCommand('read', 0.002)
+        registry.observeCommand('config', 0.2, failed=True)
+
+        snapshot = registry.getSnapshot()
+        self.assertEqual(snapshot['callbacks']['onBooleanChanged']['count'], 2)
+        self.assertEqual(snapshot['callbacks']['onBooleanChanged']['errors'], 1)
+        self.assertEqual(snapshot['callbackQueueTimes']['onBooleanChanged']['count'], 1)
+        self.assertEqual(snapshot['commands']['config']['errors'], 1)
+        self.assertEqual(snapshot['commands']['read']['errors'], 0)
+
+        text = registry.toPrometheus()
+        self.assertIn('pyknx_callback_calls_total{callback="onBooleanChanged"} 2\n', text)
+        self.assertIn('pyknx_callback_errors_total{callback="onBooleanChanged"} 1\n', text)
+        self.assertIn('pyknx_callback_duration_seconds_bucket{callback="onBooleanChanged",le="0.01"} 1\n', text)
+        self.assertIn('pyknx_callback_duration_seconds_bucket{callback="onBooleanChanged",le="+Inf"} 2\n', text)
+        self.assertIn('pyknx_linknx_request_duration_seconds_count{command="config"} 1\n', text)
+        self.assertIn('# TYPE pyknx_linknx_errors_total counter\n', text)
+
+        registry.isEnabled = False
+        registry.observeCommand('read', 0.002)
+        self.assertEqual(registry.getSnapshot()['commands']['read']['count'], 1)
+
+    def testServer(self):
+        registry = metrics.Metrics()
+        registry.observeCommand('write', 0.003)
+        server = metrics.MetricsServer(('localhost', 0), registry)
+        server.start()
+        try:
+            with urllib.request.urlopen('http://{0}:{1}/metrics'.format(*server.address)) as response:
+                body = response.read().decode('utf8')
+        finally:
+            server.stop()
+        self.assertIn('pyknx_linknx_requests_total{command="write"} 1', body)
+
+if __name__ == '__main__':
+    unittest.main()
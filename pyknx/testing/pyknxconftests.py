@@ -63,5 +63,137 @@ class PyknxConfTestCase(pyknx.testing.base.TestCaseBase):
             self.assertShellCommand([self.pyknxConfPyFile, '-o', generatedFile], stdin=input)
         self.assertFilesAreEqual(generatedFile, self.getResourceFullName('out2'))
 
+    def testIncrementalConfiguration(self):
+        generatedFile = self.getOutputFullName('output.xml')
+        if os.path.exists(generatedFile):
+            os.remove(generatedFile)
+        conf = configurator.Configurator('linknx_test_conf.xml', generatedFile, ('127.0.0.1', 1029))
+        diff = conf.updateConfig()
+        self.assertEqual(len(diff.addedRules), 6)
+        self.assertEqual(diff.ioportChange, 'added')
+        self.assertTrue(conf.writeConfig(skipsIfUnchanged=True))
+
+        # Incremental and full generation are equivalent.
+        fullConf = configurator.Configurator('linknx_test_conf.xml', None, ('127.0.0.1', 1029))
+        fullConf.cleanConfig()
+        fullConf.generateConfig()
+        self.assertEqual(conf.config.toxml(), fullConf.config.toxml())
+
+        # Nothing to do on an up-to-date configuration.
+        conf = configurator.Configurator(generatedFile, generatedFile, ('127.0.0.1', 1029))
+        self.assertTrue(conf.updateConfig().isEmpty)
+        self.assertFalse(conf.writeConfig(skipsIfUnchanged=True))
+
+        # Changes are relative to the existing output, not to the source.
+        conf = configurator.Configurator('linknx_test_conf.xml', generatedFile, ('127.0.0.1', 1029))
+        self.assertTrue(conf.updateConfig().isEmpty)
+        self.assertFalse(conf.writeConfig(skipsIfUnchanged=True))
+        conf = configurator.Configurator('linknx_test_conf.xml', generatedFile, ('127.0.0.1', 1030))
+        diff = conf.updateConfig()
+        self.assertEqual(diff.addedRules, [])
+        self.assertEqual(diff.ioportChange, 'changed')
+
+        # Only modified callbacks are touched.
+        conf = configurator.Configurator(generatedFile, generatedFile, ('127.0.0.1', 1030))
+        for objectNode in conf.config.getElementsByTagName('object'):
+            if objectNode.getAttribute('id') == 'Boolean':
+                objectNode.removeAttribute('pyknxcallback')
+            elif objectNode.getAttribute('id') == 'Byte':
+                objectNode.setAttribute('pyknxcallback', 'onOtherByteChanged')
+            elif objectNode.getAttribute('id') == 'Int16':
+                objectNode.setAttribute('pyknxcallback', 'onIntChanged')
+        diff = conf.updateConfig()
+        self.assertEqual(diff.addedRules, ['pyknxInt16'])
+        self.assertEqual(diff.removedRules, ['pyknxBoolean'])
+        self.assertEqual(diff.changedRules, ['pyknxByte'])
+        self.assertEqual(diff.ioportChange, 'changed')
+
+        # Clean.
+        diff = conf.updateConfig(cleansOnly=True)
+        self.assertEqual(len(diff.removedRules), 6)
+        self.assertEqual(diff.ioportChange, 'removed')
+        self.assertEqual(conf.config.getElementsByTagName('rule'), [])
+
+    def testStreamingConfiguration(self):
+        def generate(configuratorClass, sourceFile, outputFile):
+            conf = configuratorClass(sourceFile, outputFile, ('127.0.0.1', 1029))
+            if configuratorClass is configurator.StreamingConfigurator:
+                conf.process()
+            else:
+                conf.cleanConfig()
+                conf.generateConfig()
+                conf.writeConfig()
+
+        # Streaming and in-memory configurators produce the same output, from
+        # a raw or an already generated configuration.
+        streamedFile = self.getOutputFullName('streamed.xml')
+        generatedFile = self.getOutputFullName('generated.xml')
+        generate(configurator.StreamingConfigurator, 'linknx_test_conf.xml', streamedFile)
+        generate(configurator.Configurator, 'linknx_test_conf.xml', generatedFile)
+        self.assertFilesAreEqual(streamedFile, generatedFile)
+        generate(configurator.StreamingConfigurator, generatedFile, streamedFile)
+        self.assertFilesAreEqual(streamedFile, generatedFile)
+
+        # In place.
+        generate(configurator.StreamingConfigurator, streamedFile, streamedFile)
+        self.assertFilesAreEqual(streamedFile, generatedFile)
+
+        # Clean.
+        conf = configurator.StreamingConfigurator(generatedFile, streamedFile, ('127.0.0.1', 1029))
+        conf.process(cleansOnly=True)
+        with open(streamedFile) as f:
+            content = f.read()
+        self.assertNotIn('<rule ', content)
+        self.assertNotIn('<ioport ', content)
+
+    def testGroupedRuleStrategy(self):
+        conf = configurator.Configurator('linknx_test_conf.xml', None, ('127.0.0.1', 1029), ruleStrategy='grouped', maxGroupSize=3)
+        conf.cleanConfig()
+        conf.generateConfig()
+        ruleNodes = conf.config.getElementsByTagName('rule')
+        self.assertEqual([ruleNode.getAttribute('id') for ruleNode in ruleNodes], ['pyknxgroup-onBooleanChanged-0', 'pyknxgroup-onByteChanged-0', 'pyknxgroup-onByteChanged-1', 'pyknxgroup-onFloatChanged-0'])
+        byteRuleNode = ruleNodes[2]
+        self.assertEqual([c.getAttribute('id') for c in byteRuleNode.getElementsByTagName('condition')[1:]], ['Byte'])
+        actionNode = byteRuleNode.getElementsByTagName('action')[0]
+        self.assertEqual(actionNode.getAttribute('data'), 'onByteChanged|objectGroup=pyknxgroup-onByteChanged-1|o0=Byte|v0=${Byte}$')
+        self.assertEqual(actionNode.getAttribute('var'), 'true')
+
+        # String values may contain message delimiters and are not grouped.
+        sourceFile = self.getOutputFullName('source.xml')
+        with open(sourceFile, 'w') as f:
+            f.write('<config><objects><object id="Light" type="1.001" pyknxcallback="onChanged"/><object id="Label" type="16.000" pyknxcallback="onChanged"/><object id="Dimmer" type="5.001" pyknxcallback="onChanged"/></objects></config>')
+        for stringConf in (configurator.Configurator(sourceFile, None, ('127.0.0.1', 1029), ruleStrategy='grouped'), configurator.StreamingConfigurator(sourceFile, None, ('127.0.0.1', 1029), ruleStrategy='grouped')):
+            ruleNodes = stringConf.createRuleNodes(stringConf.getCallbacks())
+            self.assertEqual([ruleNode.getAttribute('id') for ruleNode in ruleNodes], ['pyknxLabel', 'pyknxgroup-onChanged-0'])
+            self.assertEqual(ruleNodes[1].getElementsByTagName('action')[0].getAttribute('data'), 'onChanged|objectGroup=pyknxgroup-onChanged-0|o0=Light|v0=${Light}|o1=Dimmer|v1=${Dimmer}$')
+
+        # Grouped rules are cleaned like other rules.
+        conf.cleanConfig()
+        self.assertEqual(conf.config.getElementsByTagName('rule'), [])
+
+    def testEmbeddedValues(self):
+        sourceFile = self.getOutputFullName('source.xml')
+        with open(sourceFile, 'w') as f:
+            f.write('<config><objects><object id="Light" type="1.001" pyknxcallback="onChanged"/><object id="Label" type="16.000" pyknxcallback="onChanged"/></objects></config>')
+        conf = configurator.Configurator(sourceFile, None, ('127.0.0.1', 1029), embedsValues=True)
+        conf.cleanConfig()
+        conf.generateConfig()
+        actionNodes = dict((actionNode.parentNode.parentNode.getAttribute('id'), actionNode) for actionNode in conf.config.getElementsByTagName('action'))
+        self.assertEqual(actionNodes['pyknxLight'].getAttribute('data'), 'onChanged|objectId=Light|value=${Light}$')
+        self.assertEqual(actionNodes['pyknxLight'].getAttribute('var'), 'true')
+
+        # String values may contain message delimiters.
+        self.assertEqual(actionNodes['pyknxLabel'].getAttribute('data'), 'onChanged|objectId=Label$')
+        self.assertFalse(actionNodes['pyknxLabel'].hasAttribute('var'))
+
+        generatedFile = self.getOutputFullName('generated.xml')
+        streamedFile = self.getOutputFullName('streamed.xml')
+        conf = configurator.Configurator(sourceFile, generatedFile, ('127.0.0.1', 1029), embedsValues=True)
+        conf.cleanConfig()
+        conf.generateConfig()
+        conf.writeConfig()
+        configurator.StreamingConfigurator(sourceFile, streamedFile, ('127.0.0.1', 1029), embedsValues=True).process()
+        self.assertFilesAreEqual(streamedFile, generatedFile)
+
 if __name__ == '__main__':
     unittest.main()
@@ -56,6 +56,12 @@ class PyknxReadTestCase(pyknx.testing.base.WithLinknxTestCase):
             for value in ('0', 'false', 'False', 'FALSE', 'off', 'OFF', 'no', 'NO'):
                 self.assertShellCommand([self.pyknxReadPyFile, '-s', self.linknx.address[0], '-p', str(self.linknx.address[1]), '-v', 'error', '--expected-value', value, 'Boolean'], expectedReturnCode=100 if v else 0, expectedStdOut=expectedStdOut)
 
+    def testReadFormats(self):
+        self.linknx.getObject('Boolean').value = False
+        for outputFormat in ('json', 'jsonl', 'csv', 'tsv'):
+            self.assertShellCommand([self.pyknxReadPyFile, '-v', 'error', '-s', self.linknx.address[0], '-p', str(self.linknx.address[1]), '--format', outputFormat, 'Boolean'], self.getResourceFullName(outputFormat))
+            self.assertShellCommand([self.pyknxReadPyFile, '-v', 'error', '-s', self.linknx.address[0], '-p', str(self.linknx.address[1]), '--format', outputFormat, '--expected-value', 'on', 'Boolean'], expectedReturnCode=100, expectedStdOut=self.getResourceFullName(outputFormat))
+
     # def testWrite(self):
 
 
@@ -0,0 +1,104 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+import sys
+sys.path.append('../')
+from pyknx import linknx
+from pyknx.testing import base
+from pyknx.testing.fakelinknx import FakeLinknxServer
+from threading import Thread
+import unittest
+
+class ReadCoalescingTestCase(base.TestCaseBase):
+    def setUp(self):
+        base.TestCaseBase.setUp(self)
+        self.server = FakeLinknxServer('linknx_test_conf.xml', latency=0.05)
+        self.server.start()
+        self.linknx = linknx.Linknx(*self.server.address)
+        self.linknx.objectConfig
+
+    def tearDown(self):
+        self.server.stop()
+        base.TestCaseBase.tearDown(self)
+
+    def readConcurrently(self, objectIdLists):
+        """ Read each list of objects from its own thread and return the list of results, which are dictionaries or exceptions. """
+        results = [None] * len(objectIdLists)
+        def read(index):
+            try:
+                results[index] = self.linknx.getObjects(objectIds=objectIdLists[index]).getValues()
+            except Exception as e:
+                results[index] = e
+        threads = [Thread(target=read, args=(index,)) for index in range(len(objectIdLists))]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join(10)
+        return results
+
+    def testCoalescing(self):
+        coalescer = self.linknx.enableReadCoalescing(window=0.1)
+        self.assertIs(self.linknx.enableReadCoalescing(), coalescer)
+        self.server.setValue('Int16', '5')
+        self.server.setValue('Int32', '7')
+        requestCount = self.server.requestCounts['read']
+        results = self.readConcurrently([['Int16'], ['Int16', 'Int32'], ['Int32', 'Boolean'], ['Int16']])
+        self.assertEqual(results[0], {'Int16' : 5})
+        self.assertEqual(results[1], {'Int16' : 5, 'Int32' : 7})
+        self.assertEqual(results[2], {'Int32' : 7, 'Boolean' : False})
+        self.assertEqual(results[3], {'Int16' : 5})
+        self.assertEqual(self.server.requestCounts['read'] - requestCount, 1)
+        self.assertEqual(coalescer.getStatistics(), {'reads' : 4, 'sharedReads' : 3, 'requests' : 1})
+
+        # Reads that come after a request has been answered send a new one.
+        self.server.setValue('Int16', '6')
+        self.assertEqual(self.linknx.getObject('Int16').value, 6)
+        self.assertEqual(self.server.requestCounts['read'] - requestCount, 2)
+
+    def testInFlightSharing(self):
+        # Without window, reads still share the request that is in flight
+        # for the same objects.
+        coalescer = self.linknx.enableReadCoalescing(window=0)
+        self.server.latency = 0.3
+        results = self.readConcurrently([['Int16', 'Int32']] + [['Int16']] * 4)
+        self.assertTrue(all(isinstance(result, dict) for result in results), results)
+        statistics = coalescer.getStatistics()
+        self.assertEqual(statistics['reads'], 5)
+        self.assertLess(statistics['requests'], 5)
+        self.assertEqual(statistics['requests'] + statistics['sharedReads'], 5)
+
+    def testErrors(self):
+        self.linknx.enableReadCoalescing(window=0.1)
+        self.server.errorRate = 1
+        results = self.readConcurrently([['Int16'], ['Int16', 'Int32']])
+        self.assertTrue(all(isinstance(result, Exception) for result in results), results)
+
+        # A failed request does not prevent later reads.
+        self.server.errorRate = 0
+        self.assertEqual(self.linknx.getObject('Int16').value, 0)
+
+    def testDisabled(self):
+        self.assertIsNone(self.linknx.readCoalescer)
+        requestCount = self.server.requestCounts['read']
+        self.readConcurrently([['Int16']] * 3)
+        self.assertEqual(self.server.requestCounts['read'] - requestCount, 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+import sys
+sys.path.append('../')
+from pyknx import logger, rpc
+from pyknx.testing import base
+import time
+import unittest
+
+class RPCTestCase(base.TestCaseBase):
+    def setUp(self):
+        base.TestCaseBase.setUp(self)
+        self.calls = []
+        self.server = rpc.RPCServer(('localhost', 0), self.handleCall)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def handleCall(self, functionName, arguments):
+        self.calls.append((functionName, arguments))
+        if functionName == 'add':
+            return arguments['a'] + arguments['b']
+        elif functionName == 'sleep':
+            time.sleep(arguments['duration'])
+            return arguments['duration']
+        elif functionName == 'getObject':
+            return object()
+        elif functionName == 'expire':
+            raise rpc.RPCTimeoutError('Expired.')
+        raise ValueError('Unknown function {0}.'.format(functionName))
+
+    def testCall(self):
+        with rpc.RPCClient(self.server.address, timeout=5) as client:
+            # Types are preserved and the connection is reused.
+            self.assertEqual(client.call('add', {'a' : 1, 'b' : 2}), 3)
+            self.assertEqual(client.call('add', {'a' : 0.5, 'b' : 2}), 2.5)
+            self.assertEqual(client.call('add', {'a' : [1], 'b' : ['x']}), [1, 'x'])
+            self.assertEqual(self.calls[0], ('add', {'a' : 1, 'b' : 2}))
+
+            # Errors.
+            with self.assertRaises(rpc.RPCError) as context:
+                client.call('unknown')
+            self.assertEqual(context.exception.type, 'ValueError')
+            with self.assertRaises(rpc.RPCError) as context:
+                client.call('getObject')
+            self.assertEqual(context.exception.type, 'TypeError')
+            self.assertEqual(client.call('add', {'a' : 1, 'b' : 1}), 2)
+
+    def testCallMany(self):
+        with rpc.RPCClient(self.server.address, timeout=5) as client:
+            results = client.callMany([('add', {'a' : i, 'b' : 1}) for i in range(200)] + [('unknown', None)])
+            self.assertEqual(results[:200], list(range(1, 201)))
+            self.assertIsInstance(results[200], rpc.RPCError)
+
+    def testTimeout(self):
+        with rpc.RPCClient(self.server.address, timeout=5) as client:
+            with self.assertRaises(rpc.RPCTimeoutError):
+                client.call('sleep', {'duration' : 0.5}, timeout=0.1)
+
+            # The late answer is dropped and the connection remains usable.
+            self.assertEqual(client.call('sleep', {'duration' : 0.6}), 0.6)
+            self.assertEqual(client.call('add', {'a' : 1, 'b' : 2}), 3)
+
+    def testQueueTimeout(self):
+        # A call that waits in the queue past its timeout is not executed.
+        answers = []
+        self.server._processRequest({'id' : 1, 'function' : 'add', 'arguments' : {'a' : 1, 'b' : 2}, 'timeout' : 0.5}, time.monotonic() - 1, answers.append)
+        self.assertEqual(answers, [{'id' : 1, 'error' : {'type' : 'Timeout', 'message' : 'Call to add waited more than 0.5s in queue.'}}])
+        self.assertEqual(self.calls, [])
+
+        # Clients report Timeout answers, such as this one, as timeouts rather
+        # than as errors raised by the function.
+        with rpc.RPCClient(self.server.address, timeout=5) as client:
+            with self.assertRaises(rpc.RPCTimeoutError) as context:
+                client.call('expire')
+            self.assertEqual(context.exception.message, 'Expired.')
+            results = client.callMany([('expire', None), ('unknown', None)])
+            self.assertIsInstance(results[0], rpc.RPCTimeoutError)
+            self.assertNotIsInstance(results[1], rpc.RPCTimeoutError)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+import sys
+sys.path.append('../')
+from pyknx import linknx, client, logger
+from pyknx.snapshot import Snapshot
+from pyknx.testing import base
+from pyknx.testing.fakelinknx import FakeLinknxServer
+import io
+import unittest
+
+class SnapshotTestCase(base.TestCaseBase):
+    def setUp(self):
+        base.TestCaseBase.setUp(self)
+        self.server = FakeLinknxServer('linknx_test_conf.xml')
+        self.server.start()
+        self.linknx = linknx.Linknx(*self.server.address)
+
+    def tearDown(self):
+        self.server.stop()
+        base.TestCaseBase.tearDown(self)
+
+    def testSaveAndLoad(self):
+        self.server.setValue('Float16', '21.5')
+        snapshot = self.linknx.takeSnapshot(patterns='^(Float16|Boolean|String)$')
+        self.assertEqual(snapshot.values, {'Float16' : 21.5, 'Boolean' : False, 'String' : 'default value for 28.001'})
+        self.assertEqual(self.server.requestCounts['read'], 2) # Configuration, then values.
+        self.assertEqual(len(self.linknx.takeSnapshot()), len(self.linknx.objectConfig))
+        self.assertEqual(len(self.linknx.takeSnapshot(patterns='^NoSuchObject$')), 0)
+
+        for fileName in ('snapshot.json', 'snapshot.json.gz'):
+            fullName = self.getOutputFullName(fileName)
+            snapshot.save(fullName)
+            loadedSnapshot = Snapshot.load(fullName)
+            self.assertEqual(loadedSnapshot.values, snapshot.values)
+            self.assertEqual(loadedSnapshot.takenTime, snapshot.takenTime)
+
+    def testRestore(self):
+        snapshot = Snapshot({'Float16' : 21.5, 'Boolean' : True, 'Int16' : 0, 'String' : 'restored', 'Removed' : 3})
+        writeCount = self.server.requestCounts['write']
+        report = self.linknx.restoreSnapshot(snapshot, chunkSize=2)
+        self.assertEqual(report.writtenIds, ['Boolean', 'Float16', 'String'])
+        self.assertEqual(report.unchangedIds, ['Int16'])
+        self.assertEqual(report.missingIds, ['Removed'])
+        self.assertTrue(report.succeeds)
+        self.assertEqual(self.server.requestCounts['write'] - writeCount, 2)
+        self.assertEqual(self.server.getValue('Float16'), '21.5')
+        self.assertEqual(self.server.getValue('Boolean'), 'on')
+        self.assertEqual(self.server.getValue('String'), 'restored')
+
+        # Nothing left to write.
+        report = self.linknx.restoreSnapshot(snapshot)
+        self.assertEqual(report.writtenIds, [])
+        self.assertEqual(len(report.unchangedIds), 4)
+
+    def testRestoreFilters(self):
+        snapshot = Snapshot({'Float16' : 21.5, 'Boolean' : True})
+        report = self.linknx.restoreSnapshot(snapshot, typeCategories=['bool'])
+        self.assertEqual(report.writtenIds, ['Boolean'])
+        self.assertEqual(report.filteredIds, ['Float16'])
+        report = self.linknx.restoreSnapshot(snapshot, flags='w')
+        self.assertEqual(report.filteredIds, ['Boolean', 'Float16'])
+        report = self.linknx.restoreSnapshot(snapshot, flags='r', skipsUnchanged=False)
+        self.assertEqual(report.writtenIds, ['Boolean', 'Float16'])
+
+    def testRestoreIsolatesFailures(self):
+        self.linknx.objectConfig
+        self.server.errorRate = 1
+        report = self.linknx.restoreSnapshot(Snapshot({'Float16' : 21.5, 'Boolean' : True}), skipsUnchanged=False)
+        self.assertEqual(report.failedIds, ['Boolean', 'Float16'])
+        self.assertFalse(report.succeeds)
+        self.assertEqual(self.server.requestCounts['write'], 3) # The chunk, then each object.
+
+    def testCommandLine(self):
+        fileName = self.getOutputFullName('snapshot.json.gz')
+        host, port = self.server.address
+        self.server.setValue('Float16', '21.5')
+        # Keep logging to the test's log file.
+        with base.PatchHandle(logger, {'initLogger' : lambda *args: None}), base.PatchHandle(sys, {'stdout' : io.StringIO()}):
+            client.handleRequest('snapshot', None, ['-s', host, '-p', str(port), '-R', fileName, '^Float'])
+        self.server.setValue('Float16', '0')
+        stdout = io.StringIO()
+        with base.PatchHandle(logger, {'initLogger' : lambda *args: None}), base.PatchHandle(sys, {'stdout' : stdout}):
+            client.handleRequest('restore', None, ['-s', host, '-p', str(port), '--type', 'float', fileName])
+        self.assertEqual(stdout.getvalue(), 'Restored {0}: 1 written, 2 unchanged, 0 filtered out, 0 missing, 0 failed.\n'.format(fileName))
+        self.assertEqual(self.server.getValue('Float16'), '21.5')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -29,6 +29,7 @@ import os.path
 import subprocess
 import unittest
 import time
+import threading
 import traceback
 import inspect
 import stat
@@ -41,12 +42,11 @@ class PyknxTestCase(base.WithLinknxTestCase):
     def mockForTestMultipleConnections(self, context):
         logger.reportDebug('Mock called with objectId={0}'.format(context.objectId))
         self.callbackCalledFor.append(context.object)
-        while self.blockCallback:
-            time.sleep(0.5)
-        logger.reportDebug('Mock ended for objectId={0}'.format(context.objectId))
+        self.notifyStateChanged()
 
-        # Make sure next callback is blocked!
-        self.blockCallback = True
+        # Each call waits for its own release.
+        self.callbackReleases.acquire()
+        logger.reportDebug('Mock ended for objectId={0}'.format(context.objectId))
 
     # def testGAddressesUniqueness(self):
         # GAs={}
@@ -57,27 +57,33 @@ class PyknxTestCase(base.WithLinknxTestCase):
 # 
     def testMultipleConnections(self):
         """ Checks that communicator can handle several connections at once (with a queue of connections when a connection is being treated). """
-        # Set state to a known one.
+        # Set state to a known one and wait for the resulting events, so that
+        # they are not mistaken for the ones below.
         booleanObject = self.linknx.getObject('Boolean')
         floatObject = self.linknx.getObject('Float16')
-        booleanObject.value = False
-        floatObject.value = 0.0
-        self.waitDuring(2, 'Initializing...')
+        initialEvents = []
+        def recordInitialEvent(context):
+            initialEvents.append(context.objectId)
+            self.notifyStateChanged()
+        with self.patchUserModule({'onBooleanChanged' : recordInitialEvent, 'onFloatChanged' : recordInitialEvent}):
+            changedIds = set()
+            for obj, value in ((booleanObject, False), (floatObject, 0.0)):
+                if obj.value != value:
+                    obj.value = value
+                    changedIds.add(obj.id)
+            self.waitFor(lambda: set(initialEvents) >= changedIds, 'waiting for initial events.', timeout=10)
 
         # Redirect some events to be able to block them.
         self.callbackCalledFor = []
+        self.callbackReleases = threading.Semaphore(0)
         try:
-            self.blockCallback = True
-
             with self.patchUserModule({'onBooleanChanged' : self.mockForTestMultipleConnections, 'onFloatChanged' : self.mockForTestMultipleConnections}):
 
                 # Change an object.
                 booleanObject.value = True
 
                 # Wait for callback.
-                while not self.callbackCalledFor:
-                    logger.reportDebug('Waiting for first callback...')
-                    time.sleep(1)
+                self.waitFor(lambda: self.callbackCalledFor, 'waiting for first callback.', timeout=10)
                 self.assertEqual(self.callbackCalledFor, [booleanObject])
                 self.assertTrue(booleanObject.value)
 
@@ -89,15 +95,15 @@ class PyknxTestCase(base.WithLinknxTestCase):
                 self.waitDuring(5, 'Checking that second callback is not called until first callback is released.', [lambda: self.assertEqual(self.callbackCalledFor, [booleanObject])])
 
                 # Release callback.
-                self.blockCallback = False
+                self.callbackReleases.release()
 
                 # Wait for second callback.
-                self.waitDuring(3, 'Waiting for second callback...')
+                self.waitFor(lambda: len(self.callbackCalledFor) >= 2, 'waiting for second callback.', timeout=3)
                 self.assertEqual(self.callbackCalledFor, [booleanObject, floatObject])
 
         finally:
             # Release all threads in case test went wrong.
-            self.blockCallback = False
+            self.callbackReleases.release(10)
 
     def testObjectValueTypes(self):
         def testValues(objectId, values):
@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+import sys
+sys.path.append('../')
+from pyknx import linknx, writescheduler
+from pyknx.testing import base, configgenerator
+from pyknx.testing.fakelinknx import FakeLinknxServer
+import unittest
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class TokenBucketTestCase(base.TestCaseBase):
+    def testBucket(self):
+        clock = FakeClock()
+        bucket = writescheduler.TokenBucket(10, 2, clock)
+        for i in range(2):
+            self.assertEqual(bucket.getDelay(), 0)
+            bucket.consume()
+        self.assertAlmostEqual(bucket.getDelay(), 0.1)
+        clock.now += 0.05
+        self.assertAlmostEqual(bucket.getDelay(), 0.05)
+        clock.now += 10
+        bucket.consume()
+        bucket.consume()
+        self.assertGreater(bucket.getDelay(), 0) # Never more than the burst.
+
+    def testInvalidParameters(self):
+        self.assertRaises(Exception, writescheduler.TokenBucket, 0)
+        self.assertRaises(Exception, writescheduler.TokenBucket, 10, 0.5)
+        self.assertRaises(Exception, writescheduler.TokenBucket, 10, 0)
+        self.assertEqual(writescheduler.TokenBucket(0.5).burst, 1)
+
+    def testLine(self):
+        self.assertEqual(writescheduler.getLine('1/2/3'), '1/2')
+        self.assertEqual(writescheduler.getLine('1/234'), '1')
+        self.assertIsNone(writescheduler.getLine(''))
+
+class WriteSchedulerTestCase(base.TestCaseBase):
+    def setUp(self):
+        base.TestCaseBase.setUp(self)
+        self.server = FakeLinknxServer('linknx_test_conf.xml')
+        self.server.start()
+        self.linknx = linknx.Linknx(*self.server.address)
+        self.linknx.objectConfig
+
+    def tearDown(self):
+        self.linknx.disableWriteScheduler()
+        self.server.stop()
+        base.TestCaseBase.tearDown(self)
+
+    def createScheduler(self, **options):
+        # The scheduler is driven by a fake clock and is not started, so
+        # that batches can be taken one at a time.
+        self.clock = FakeClock()
+        return writescheduler.WriteScheduler(self.linknx, clock=self.clock, **options)
+
+    def takeIds(self, scheduler):
+        batch, delay = scheduler._takeBatch(self.clock())
+        return [request.object.id if request.action is None else request.action for laneIndex, request in batch], delay
+
+    def testPriorities(self):
+        scheduler = self.createScheduler(rate=10, burst=2, priorityRules=[('^Float', 'high'), ('String', 'low')])
+        self.assertEqual(scheduler.getPriority('Float16'), 'high')
+        self.assertEqual(scheduler.getPriority('Ascii String14'), 'low')
+        for objectId in ('String', 'Int16', 'Float16', 'Int32'):
+            scheduler.write(self.linknx.getObject(objectId), '1')
+        scheduler.write(self.linknx.getObject('String'), '1', priority='high')
+        self.assertEqual(self.takeIds(scheduler), (['Float16', 'String'], 0.1)) # Promoted writes join the end of their new lane.
+        self.assertEqual(self.takeIds(scheduler), ([], 0.1))
+        self.clock.now += 0.1
+        self.assertEqual(self.takeIds(scheduler)[0], ['Int16'])
+        self.assertEqual(scheduler.pendingCount, 1)
+
+    def testCoalescing(self):
+        scheduler = self.createScheduler(rate=10, burst=5)
+        scheduler.write(self.linknx.getObject('Int16'), '1')
+        scheduler.write(self.linknx.getObject('Int32'), '1')
+        scheduler.write(self.linknx.getObject('Int16'), '2')
+        batch, delay = scheduler._takeBatch(self.clock())
+        self.assertEqual([(request.object.id, request.value) for laneIndex, request in batch], [('Int16', '2'), ('Int32', '1')])
+        statistics = scheduler.getStatistics()
+        self.assertEqual((statistics['writes'], statistics['coalesced'], statistics['pending']), (3, 1, 0))
+
+    def testLineRate(self):
+        with FakeLinknxServer(configgenerator.generateConfig(600)) as server:
+            self.linknx = linknx.Linknx(*server.address)
+            scheduler = self.createScheduler(rate=100, burst=10, lineRate=1, lineBurst=1)
+            for objectId in ('Object0', 'Object1', 'Object256', 'Object257', 'Object512'):
+                scheduler.write(self.linknx.getObject(objectId), '1')
+            self.assertEqual(self.takeIds(scheduler), (['Object0', 'Object256', 'Object512'], 1.0))
+            self.clock.now += 1
+            self.assertEqual(self.takeIds(scheduler), (['Object1', 'Object257'], None))
+
+    def testActions(self):
+        scheduler = self.createScheduler(rate=10, burst=5)
+        scheduler.write(self.linknx.getObject('Int16'), '1')
+        scheduler.execute('<action type="set-value" id="Int32" value="2"/>')
+        scheduler.write(self.linknx.getObject('Int32'), '1')
+        self.assertEqual(self.takeIds(scheduler)[0], ['Int16'])
+        self.assertEqual(self.takeIds(scheduler)[0], ['<action type="set-value" id="Int32" value="2"/>'])
+        self.assertEqual(self.takeIds(scheduler)[0], ['Int32'])
+
+    def testLinknxIntegration(self):
+        scheduler = self.linknx.enableWriteScheduler(rate=50, burst=5, priorityRules=[('^Float', 'high')])
+        self.assertIs(self.linknx.enableWriteScheduler(), scheduler)
+        for i in range(20):
+            self.linknx.getObject('Int16').value = i
+            self.linknx.getObject('Float16').value = i + 0.5
+        self.linknx.executeAction('<action type="set-value" id="Int32" value="3"/>', waitsForAnswer=True)
+        self.assertEqual(self.server.getValue('Int32'), '3')
+        self.assertTrue(scheduler.flush(5))
+        self.assertEqual(self.server.getValue('Int16'), '19')
+        self.assertEqual(self.server.getValue('Float16'), '19.5')
+        statistics = scheduler.getStatistics()
+        self.assertEqual(statistics['sent'] + statistics['coalesced'], 41)
+        self.assertEqual(statistics['failed'], 0)
+        self.assertLess(self.server.requestCounts['write'], 40)
+        self.assertEqual(statistics['queueTimes']['high']['count'] + statistics['queueTimes']['normal']['count'], statistics['sent'])
+
+        self.linknx.getObject('Int16').value = 7
+        self.linknx.disableWriteScheduler()
+        self.assertIsNone(self.linknx.writeScheduler)
+        self.assertEqual(self.server.getValue('Int16'), '7')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+import sys
+sys.path.append('../')
+from pyknx import linknx
+from pyknx.testing import base
+from pyknx.testing.fakelinknx import FakeLinknxServer
+import unittest
+
+class ValueTrackerTestCase(base.TestCaseBase):
+    def testRefresh(self):
+        tracker = linknx.ValueTracker(refreshInterval=10, refreshIntervals={'Fast' : 1})
+        self.assertFalse(tracker.isRedundant('Slow', 'on', 0))
+        tracker.observe('Slow', 'on', 0)
+        tracker.observe('Fast', 'on', 0)
+        self.assertTrue(tracker.isRedundant('Slow', 'on', 5))
+        self.assertFalse(tracker.isRedundant('Slow', 'off', 5))
+        self.assertFalse(tracker.isRedundant('Fast', 'on', 5))
+        self.assertFalse(tracker.isRedundant('Slow', 'on', 10))
+        self.assertEqual(tracker.suppressedCounts, {'Slow' : 1})
+        tracker.forget('Slow')
+        self.assertIsNone(tracker.getValue('Slow'))
+        self.assertEqual(tracker.getValue('Fast'), 'on')
+
+    def testVersions(self):
+        tracker = linknx.ValueTracker()
+        version = tracker.getVersion('Int')
+        tracker.observeWrite('Int', '2')
+        tracker.observe('Int', '1', version=version)
+        self.assertEqual(tracker.getValue('Int'), '2')
+        version = tracker.getVersion('Int')
+        tracker.observe('Int', '3', version=version)
+        self.assertEqual(tracker.getValue('Int'), '3')
+        tracker.invalidateReads('Int')
+        tracker.observe('Int', '4', version=version)
+        self.assertEqual(tracker.getValue('Int'), '3')
+
+class WriteSuppressionTestCase(base.TestCaseBase):
+    def setUp(self):
+        base.TestCaseBase.setUp(self)
+        self.server = FakeLinknxServer('linknx_test_conf.xml')
+        self.server.start()
+        self.linknx = linknx.Linknx(*self.server.address)
+        self.linknx.objectConfig
+
+    def tearDown(self):
+        self.linknx.disableWriteScheduler()
+        self.server.stop()
+        base.TestCaseBase.tearDown(self)
+
+    def testSuppression(self):
+        tracker = self.linknx.enableWriteSuppression()
+        self.assertIs(self.linknx.enableWriteSuppression(), tracker)
+        boolean = self.linknx.getObject('Boolean')
+        boolean.value = 'off'
+        boolean.value = False
+        boolean.value = 0
+        boolean.value = 'on'
+        self.assertEqual(self.server.requestCounts['write'], 2)
+        self.assertEqual(tracker.suppressedCounts, {'Boolean' : 2})
+
+        # Values read from linknx count as known values.
+        self.server.setValue('Int16', '5')
+        self.assertEqual(self.linknx.getObject('Int16').value, 5)
+        self.linknx.getObject('Int16').value = 5
+        self.assertEqual(self.server.requestCounts['write'], 2)
+        self.assertEqual(tracker.suppressedCount, 3)
+
+        # Batched writes update known values too.
+        self.linknx.getObjects(objectIds=['Int32']).setValues({'Int32' : 3})
+        self.linknx.getObject('Int32').value = '3'
+        self.assertEqual(self.server.requestCounts['write'], 3)
+
+    def testNormalizedValues(self):
+        tracker = self.linknx.enableWriteSuppression()
+        float16 = self.linknx.getObject('Float16')
+        self.server.setValue('Float16', '20')
+        self.assertEqual(float16.value, 20.0)
+        float16.value = 20.0
+        float16.value = '20'
+        self.assertEqual(self.server.requestCounts['write'], 0)
+        float16.value = 21
+        float16.value = 21.0
+        self.assertEqual(self.server.requestCounts['write'], 1)
+        self.assertEqual(tracker.getValue('Float16'), '21.0')
+
+    def testReadDuringWrite(self):
+        tracker = self.linknx.enableWriteSuppression()
+        values = self.linknx.getObjects(objectIds=['Int16', 'Int32']).iterValues()
+        self.assertEqual(next(values), ('Int16', 0))
+
+        # Int32 is written after it has been read, but before the value read
+        # is known to the tracker.
+        self.linknx.getObject('Int32').value = 7
+        self.assertEqual(next(values), ('Int32', 0))
+        self.assertEqual(tracker.getValue('Int32'), '7')
+        self.linknx.getObject('Int32').value = 0
+        self.assertEqual(self.server.getValue('Int32'), '0')
+
+    def testRefreshInterval(self):
+        tracker = self.linknx.enableWriteSuppression(refreshInterval=0)
+        for i in range(3):
+            self.linknx.getObject('Boolean').value = True
+        self.assertEqual(self.server.requestCounts['write'], 3)
+        self.assertEqual(tracker.suppressedCount, 0)
+
+    def testWithScheduler(self):
+        tracker = self.linknx.enableWriteSuppression()
+        scheduler = self.linknx.enableWriteScheduler(rate=100, burst=10)
+        for i in range(5):
+            self.linknx.getObject('Int16').value = 2
+        self.assertTrue(scheduler.flush(5))
+        self.assertEqual(scheduler.getStatistics()['writes'], 1)
+        self.assertEqual(tracker.suppressedCount, 4)
+
+        # Values of failed writes are not known anymore.
+        self.server.errorRate = 1
+        self.linknx.getObject('Int16').value = 3
+        self.assertTrue(scheduler.flush(5))
+        self.assertIsNone(tracker.getValue('Int16'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,369 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2012-2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+"""
+Scheduling of writes to the KNX bus.
+
+A KNX TP1 bus runs at 9600 bit/s, which is a few tens of telegrams per second. When user callbacks write bursts of objects, linknx
+queues telegrams faster than the bus can carry them. Once enabled on a Linknx instance (see Linknx.enableWriteScheduler()), a
+WriteScheduler queues the writes of Object.value and the actions of Linknx.executeAction() and sends them from a background thread:
+    - at most 'rate' telegrams per second overall, and optionally 'lineRate' per line of group addresses (main/middle group), with
+      token buckets that allow short bursts,
+    - lane by lane, so that objects matched by 'high' priority rules (e.g. safety, lighting) go before 'normal' ones, which go before
+      'low' ones (e.g. logging),
+    - with a single pending write per object: writing an object again before its previous value was sent replaces that value,
+    - several ready writes at once in a single request to linknx.
+The time writes and actions spend in the queue is recorded per lane (see getStatistics()).
+"""
+
+import re
+import time
+import collections
+from threading import Thread, Condition, Event
+from pyknx import logger, metrics
+
+# Lanes, from the first served to the last.
+PRIORITIES = ('high', 'normal', 'low')
+
+class TokenBucket(object):
+    """ Rate limiter that allows 'rate' operations per second on average and bursts of up to 'burst' operations. """
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        if rate <= 0:
+            raise Exception('Rate must be positive.')
+        if burst is None:
+            burst = max(1, rate)
+        elif burst < 1:
+            # Tokens would never reach 1 and no operation would ever be allowed.
+            raise Exception('Burst must be at least 1.')
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = self.burst
+        self._updateTime = clock()
+
+    def _refill(self, now):
+        if now > self._updateTime:
+            self._tokens = min(self.burst, self._tokens + (now - self._updateTime) * self.rate)
+            self._updateTime = now
+
+    def getDelay(self, now=None):
+        """ Return the time to wait before an operation is allowed, 0 if it is allowed now. """
+        self._refill(self._clock() if now is None else now)
+        return 0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def consume(self, now=None):
+        """ Account for an operation. Tokens may become negative if getDelay() was not checked beforehand. """
+        self._refill(self._clock() if now is None else now)
+        self._tokens -= 1
+
+def getLine(gad):
+    """ Return the line of a group address, i.e. its main and middle groups ("1/2" for "1/2/3"), or its main group for two-level addresses. None if there is no address. """
+    if not gad: return None
+    return gad.rsplit('/', 1)[0]
+
+class _Request(object):
+    def __init__(self, enqueueTime, line, obj=None, value=None, action=None, isWaited=False):
+        self.enqueueTime = enqueueTime
+        self.line = line
+        self.object = obj
+        self.value = value
+        self.action = action
+        self.doneEvent = Event() if isWaited else None
+        self.error = None
+
+class WriteScheduler(object):
+    """ Rate-limited, prioritized queue of writes and actions sent to linknx by a background thread. """
+    def __init__(self, linknx, rate=20, burst=5, lineRate=None, lineBurst=None, priorityRules=(), maxBatchSize=20, clock=time.monotonic):
+        """
+        Initialize a scheduler. It does nothing until start() is called.
+
+        linknx -- The Linknx instance to send requests to.
+        rate -- Maximum number of telegrams per second on average, over the whole bus.
+        burst -- Number of telegrams that can be sent at once after a quiet period.
+        lineRate -- If set, maximum number of telegrams per second to each line of group addresses.
+        lineBurst -- Burst allowed to each line. Defaults to lineRate.
+        priorityRules -- List of tuples (regex, priority) where priority is one of PRIORITIES. The first regex that matches the id of an object gives the priority of its writes. Other objects are 'normal'.
+        maxBatchSize -- Maximum number of writes sent with a single request to linknx.
+        clock -- Function that returns the current time in seconds.
+
+        """
+        self._linknx = linknx
+        self._clock = clock
+        self._bucket = TokenBucket(rate, burst, clock)
+        self._lineRate = lineRate
+        self._lineBurst = lineBurst
+        self._lineBuckets = {} # Key is line, value is a TokenBucket.
+        self._priorityRules = []
+        for pattern, priority in priorityRules:
+            if priority not in PRIORITIES:
+                raise Exception('Unknown priority "{0}". Expecting one of {1}.'.format(priority, ', '.join(PRIORITIES)))
+            self._priorityRules.append((re.compile(pattern), PRIORITIES.index(priority)))
+        self._priorities = {} # Cache of priority indices, key is object id.
+        self.maxBatchSize = maxBatchSize
+
+        # One FIFO per priority. Keys are object ids for writes, so that
+        # pending writes can be coalesced, and sequence numbers for actions.
+        self._lanes = [collections.OrderedDict() for priority in PRIORITIES]
+        self._pendingLanes = {} # Key is object id, value is the index of the lane of its pending write.
+        self._actionCount = 0
+        self._inFlightCount = 0
+        self._condition = Condition()
+        self._thread = None
+        self._isStopping = False
+
+        self._counts = collections.Counter() # Keys are 'writes', 'actions', 'coalesced', 'sent', 'failed', 'requests'.
+        self._queueTimes = [metrics.Histogram() for priority in PRIORITIES]
+        self._maxQueueTimes = [0.0] * len(PRIORITIES)
+
+    @property
+    def pendingCount(self):
+        with self._condition:
+            return sum(len(lane) for lane in self._lanes)
+
+    def getPriority(self, objectId):
+        """ Return the priority of writes to the given object, according to the priority rules. """
+        return PRIORITIES[self._getPriorityIndex(objectId)]
+
+    def _getPriorityIndex(self, objectId):
+        index = self._priorities.get(objectId)
+        if index is None:
+            index = PRIORITIES.index('normal')
+            for regex, ruleIndex in self._priorityRules:
+                if regex.search(objectId):
+                    index = ruleIndex
+                    break
+            self._priorities[objectId] = index
+        return index
+
+    def start(self):
+        self._isStopping = False
+        self._thread = Thread(target=self._run, name='WriteScheduler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, flushes=True, timeout=None):
+        """
+        Stop the sending thread.
+
+        flushes -- If True, pending requests are sent first, still within rate limits. Otherwise, they are dropped.
+        timeout -- Maximum time to wait for the thread to end.
+
+        """
+        with self._condition:
+            if not flushes:
+                droppedCount = sum(len(lane) for lane in self._lanes)
+                if droppedCount:
+                    logger.reportWarning('Dropping {0} pending writes to linknx.'.format(droppedCount))
+                for lane in self._lanes:
+                    for request in lane.values():
+                        if request.doneEvent is not None:
+                            request.error = 'Write scheduler stopped.'
+                            request.doneEvent.set()
+                    lane.clear()
+                self._pendingLanes.clear()
+            self._isStopping = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logger.reportWarning('Write scheduler is still sending {0} pending requests.'.format(self.pendingCount))
+            else:
+                self._thread = None
+
+    def flush(self, timeout=None):
+        """ Wait until all requests queued so far have been sent. Returns False on timeout. """
+        with self._condition:
+            return self._condition.wait_for(lambda: self._inFlightCount == 0 and not any(self._lanes), timeout)
+
+    def write(self, obj, value, priority=None):
+        """
+        Queue a write of value to the Object obj.
+
+        value -- The value to write, preferably already converted with obj.convertValueToString().
+        priority -- One of PRIORITIES. Defaults to the priority given by the rules.
+        If a write to the same object is still pending, its value is replaced and it keeps its place in the queue, moving to a higher lane if needed.
+
+        """
+        laneIndex = self._getPriorityIndex(obj.id) if priority is None else PRIORITIES.index(priority)
+        with self._condition:
+            self._counts['writes'] += 1
+            pendingLaneIndex = self._pendingLanes.get(obj.id)
+            if pendingLaneIndex is not None:
+                self._counts['coalesced'] += 1
+                request = self._lanes[pendingLaneIndex][obj.id]
+                request.value = value
+                if laneIndex < pendingLaneIndex:
+                    del self._lanes[pendingLaneIndex][obj.id]
+                    self._lanes[laneIndex][obj.id] = request
+                    self._pendingLanes[obj.id] = laneIndex
+            else:
+                self._lanes[laneIndex][obj.id] = _Request(self._clock(), getLine(obj.gad), obj=obj, value=value)
+                self._pendingLanes[obj.id] = laneIndex
+            self._condition.notify_all()
+
+    def execute(self, actionXML, priority='normal', waits=False):
+        """
+        Queue the execution of an action, given as an XML string.
+
+        Actions are sent one per request and count as a single telegram.
+        waits -- If True, block until linknx has executed the action and raise an exception if it failed.
+
+        """
+        request = _Request(self._clock(), None, action=actionXML, isWaited=waits)
+        with self._condition:
+            self._counts['actions'] += 1
+            self._actionCount += 1
+            self._lanes[PRIORITIES.index(priority)][self._actionCount] = request
+            self._condition.notify_all()
+        if waits:
+            request.doneEvent.wait()
+            if request.error is not None:
+                raise Exception(request.error)
+
+    def _getLineBucket(self, line):
+        if self._lineRate is None or line is None: return None
+        bucket = self._lineBuckets.get(line)
+        if bucket is None:
+            bucket = TokenBucket(self._lineRate, self._lineBurst, self._clock)
+            self._lineBuckets[line] = bucket
+        return bucket
+
+    def _takeBatch(self, now):
+        """ Take the requests that can be sent now. Returns a tuple (requests, delay) where delay is the time until a pending request may be sent, None if nothing is pending. """
+        batch = [] # List of tuples (lane index, key, request).
+        delay = None
+        isComplete = False
+        for laneIndex, lane in enumerate(self._lanes):
+            for key, request in lane.items():
+                globalDelay = self._bucket.getDelay(now)
+                if globalDelay > 0:
+                    delay = globalDelay
+                    isComplete = True
+                elif request.action is not None and batch:
+                    # Actions go alone.
+                    isComplete = True
+                if isComplete: break
+
+                lineBucket = self._getLineBucket(request.line)
+                if lineBucket is not None:
+                    lineDelay = lineBucket.getDelay(now)
+                    if lineDelay > 0:
+                        delay = lineDelay if delay is None else min(delay, lineDelay)
+                        continue
+                    lineBucket.consume(now)
+                self._bucket.consume(now)
+                batch.append((laneIndex, key, request))
+                isComplete = request.action is not None or len(batch) == self.maxBatchSize
+                if isComplete: break
+            if isComplete: break
+
+        for laneIndex, key, request in batch:
+            del self._lanes[laneIndex][key]
+            if request.action is None:
+                del self._pendingLanes[key]
+        return [(laneIndex, request) for laneIndex, key, request in batch], delay
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    batch, delay = self._takeBatch(self._clock())
+                    if batch: break
+                    if self._isStopping and not any(self._lanes): return
+                    self._condition.wait(delay)
+                self._inFlightCount = len(batch)
+            try:
+                self._send(batch)
+            except:
+                logger.reportException('Write scheduler failed to send {0} requests.'.format(len(batch)))
+            finally:
+                with self._condition:
+                    self._inFlightCount = 0
+                    self._condition.notify_all()
+
+    def _send(self, batch):
+        from pyknx.linknx import ObjectCollection
+        sendTime = self._clock()
+        with self._condition:
+            for laneIndex, request in batch:
+                queueTime = sendTime - request.enqueueTime
+                self._queueTimes[laneIndex].observe(queueTime)
+                self._maxQueueTimes[laneIndex] = max(self._maxQueueTimes[laneIndex], queueTime)
+            self._counts['requests'] += 1
+
+        request = batch[0][1]
+        if request.action is not None:
+            try:
+                self._linknx._executeAction(request.action, waitsForAnswer=True)
+                self._count('sent')
+            except Exception as e:
+                logger.reportError('Scheduled action {0} failed: {1}'.format(request.action, e))
+                request.error = str(e)
+                self._count('failed')
+            finally:
+                if request.doneEvent is not None:
+                    request.doneEvent.set()
+            return
+
+        requests = [request for laneIndex, request in batch]
+        try:
+            # Values were remembered when queued. A newer write of the same
+            # objects may be pending: only make sure that reads that started
+            # before this one was sent are not remembered.
+            ObjectCollection(self._linknx, [request.object for request in requests]).setValues(dict((request.object.id, request.value) for request in requests), tracksValues=False)
+            tracker = self._linknx.valueTracker
+            if tracker is not None:
+                for request in requests:
+                    tracker.invalidateReads(request.object.id)
+            self._count('sent', len(requests))
+        except Exception as e:
+            logger.reportError('Scheduled write of {0} failed: {1}'.format(', '.join(request.object.id for request in requests), e))
+            self._count('failed', len(requests))
+            # The values were taken for granted when queued.
+            tracker = self._linknx.valueTracker
+            if tracker is not None:
+                for request in requests:
+                    tracker.forget(request.object.id)
+
+    def _count(self, key, count=1):
+        with self._condition:
+            self._counts[key] += count
+
+    def getStatistics(self):
+        """
+        Return a dictionary that summarizes the activity of the scheduler.
+
+        Keys are 'pending', 'writes' and 'actions' (number of requests queued), 'coalesced' (writes that replaced a pending one), 'sent',
+        'failed' and 'requests' (number of requests to linknx). 'queueTimes' maps each priority to a dictionary with the count, mean,
+        estimated 50th/90th/99th percentiles and max of the time spent in the queue, in seconds.
+
+        """
+        with self._condition:
+            statistics = dict((key, self._counts[key]) for key in ('writes', 'actions', 'coalesced', 'sent', 'failed', 'requests'))
+            statistics['pending'] = sum(len(lane) for lane in self._lanes)
+            statistics['queueTimes'] = {}
+            for laneIndex, priority in enumerate(PRIORITIES):
+                histogram = self._queueTimes[laneIndex]
+                statistics['queueTimes'][priority] = {'count' : histogram.count, 'mean' : histogram.sum / histogram.count if histogram.count else None,
+                                                      'p50' : histogram.getQuantile(0.5), 'p90' : histogram.getQuantile(0.9), 'p99' : histogram.getQuantile(0.99),
+                                                      'max' : self._maxQueueTimes[laneIndex]}
+            return statistics
@@ -25,10 +25,17 @@ Let the communicator call a given function of the user script.
 
 USAGE:
 pyknxcall.py [-c communicatoraddress] [-a|--argument argname=argvalue [-a|--argument argname=argvalue [...]]] [-v level] functionName
+pyknxcall.py -b [-c communicatoraddress] [-a|--argument argname=argvalue [...]] [-v level] functionName
+pyknxcall.py -r rpcaddress [-t timeout] [-a|--argument argname=argvalue [...]] [-v level] functionName
 
 OPTIONS:
     -c --comm-addr              Address of the communicator. This must be of the form <hostname:port> of <ipaddress:port>. Default is localhost:1029
     -a --argument               Argument to pass to user function. It is of the form argument_name=argument_value. Be careful not to insert whitespaces around the "=" sign.
+    -b --binary                 Send the call as a binary frame rather than as a text message. Argument values are typed as in RPC mode (see below) and may contain any character, including "|", "=" and "$".
+    -r --rpc-addr               Address of the RPC server of the communicator (see the --rpc-addr option of pyknxcommunicator.py). This must be of the form <hostname:port> or <ipaddress:port>.
+                                In this mode, the call waits for the function to complete and its return value is written to standard output as JSON. Argument values
+                                are interpreted as JSON when possible (e.g. 3, true, [1, 2]) and as strings otherwise. Exit code is 6 if the function raised an error, 7 on timeout.
+    -t --timeout                Maximum time to wait for the function to complete, in seconds, in RPC mode. Default is 30.
     -v --verbose                Level of verbosity. Value must be one of the logging module (error, warning, info, debug)
     --help                      Display this help message and exit.
 
@@ -41,6 +48,7 @@ EXAMPLE:
 """
 
 import sys
+import json
 import getopt
 import logging
 from pyknx import logger, tcpsocket
@@ -48,6 +56,17 @@ from pyknx import logger, tcpsocket
 def printUsage():
     print(__doc__)
 
+def parseTypedArguments(arguments):
+    """ Return a dictionary from a list of 'name=value' strings. Values are parsed as JSON when possible and kept as strings otherwise. """
+    typedArguments = {}
+    for arg in arguments:
+        argName, sep, argValue = arg.partition('=')
+        try:
+            typedArguments[argName] = json.loads(argValue)
+        except ValueError:
+            typedArguments[argName] = argValue
+    return typedArguments
+
 def parseAddress(addrStr, option):
     ix = addrStr.find(':')
     if ix < 0:
@@ -57,18 +76,27 @@ def parseAddress(addrStr, option):
 if __name__ == '__main__':
     logger.initLogger(None, logging.INFO, usesDetailedLogging=False)
     try:
-        options, remainder = getopt.getopt(sys.argv[1:], 'c:a:v:', ['comm-addr=', 'argument=', 'verbose=', 'help'])
+        options, remainder = getopt.getopt(sys.argv[1:], 'c:a:br:t:v:', ['comm-addr=', 'argument=', 'binary', 'rpc-addr=', 'timeout=', 'verbose=', 'help'])
     except getopt.GetoptError as err:
         logger.reportException()
         sys.exit(2)
 
     # Parse command line arguments.
     communicatorAddress = ('127.0.0.1',1029)
+    rpcAddress = None
+    usesBinaryFraming = False
+    timeout = 30
     arguments = []
     verbosity = logging.INFO
     for option, value in options:
         if option == '-c' or option == '--comm-addr':
             communicatorAddress = parseAddress(value, option)
+        elif option == '-b' or option == '--binary':
+            usesBinaryFraming = True
+        elif option == '-r' or option == '--rpc-addr':
+            rpcAddress = parseAddress(value, option)
+        elif option == '-t' or option == '--timeout':
+            timeout = float(value)
         elif option == '-a' or option == '--argument':
             arguments.append(value)
         elif option == '--help':
@@ -95,6 +123,32 @@ if __name__ == '__main__':
     # Init logger.
     logger.initLogger(None, verbosity, usesDetailedLogging=False)
 
+    if rpcAddress:
+        from pyknx.rpc import RPCClient, RPCError, RPCTimeoutError
+        try:
+            with RPCClient(rpcAddress, timeout) as client:
+                result = client.call(functionName, parseTypedArguments(arguments))
+        except RPCTimeoutError as e:
+            logger.reportError('Call to {0} timed out: {1}'.format(functionName, e.message))
+            sys.exit(7)
+        except RPCError as e:
+            logger.reportError('Call to {0} failed. {1}'.format(functionName, e))
+            sys.exit(6)
+        except OSError as e:
+            logger.reportError('Could not reach the RPC server at {0}: {1}'.format(rpcAddress, e))
+            sys.exit(5)
+        print(json.dumps(result))
+        sys.exit(0)
+
+    if usesBinaryFraming:
+        from pyknx import framing
+        try:
+            framing.sendCalls(communicatorAddress, [(functionName, parseTypedArguments(arguments))])
+        except Exception as e:
+            logger.reportError('Could not send call to {0}: {1}'.format(communicatorAddress, e))
+            sys.exit(5)
+        sys.exit(0)
+
     s = tcpsocket.Socket()
     s.connect(communicatorAddress)
     message=functionName
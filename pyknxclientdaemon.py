@@ -0,0 +1,60 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2012-2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+"""
+Starts a resident client daemon for linknx.
+The daemon keeps a connection to linknx and its configuration in memory, and serves pyknxread.py, pyknxwrite.py and pyknxexecute.py
+over a local Unix socket. These scripts use the daemon automatically when it is running and connect to linknx directly otherwise.
+"""
+
+import argparse
+import sys
+from pyknx import logger
+from pyknx.clientdaemon import ClientDaemon
+
+def parseAddress(addrStr, option):
+    ix = addrStr.find(':')
+    if ix < 0:
+        raise Exception('Malformed value for ' + option +'. Expecting a tuple (hostname:port)')
+    return (addrStr[0:ix], int(addrStr[ix + 1:]))
+
+def makeArgumentParser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-l', '--linknx-addr', dest='linknxAddress', help='Address of the linknx server to connect to. This argument must specify the hostname or the ip address followed by a colon and the port to connect to. Default is "localhost:1028"', default='localhost:1028')
+    parser.add_argument('--socket', dest='socketPath', help='listen on the Unix socket SOCKET. Client scripts only find the daemon on the default socket, which depends on the user and on the linknx address.', metavar='SOCKET')
+    parser.add_argument('--log-file', dest='logFile', help='write daemon\'s output to FILE rather than to standard output.', metavar='FILE', default=None)
+    parser.add_argument('-d', '--daemonize', help='ask daemon to detach and run as a background daemon.', action='store_true', default=False)
+    parser.add_argument('--pid-file', dest='pidFile', help='writes the PID of the daemon process to PIDFILE.', metavar='PIDFILE')
+    parser.add_argument('-v', '--verbose', dest='verbosityLevel', help='set verbosity level. Default is "info".', metavar='LEVEL', choices=[l.lower() for l in logger.getLevelsToString()], default='info')
+    return parser
+
+if __name__ == '__main__':
+    parser = makeArgumentParser(__doc__)
+    args = parser.parse_args()
+
+    try:
+        ClientDaemon.run(parseAddress(args.linknxAddress, 'linknx address'), args.socketPath, verbosityLevel=args.verbosityLevel.upper(), logFile=args.logFile, daemonizes=args.daemonize, pidFile=args.pidFile)
+    except SystemExit:
+        raise
+    except:
+        logger.reportException()
+        sys.exit(3)
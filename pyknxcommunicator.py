@@ -49,6 +49,19 @@ def makeArgumentParser(description):
     parser.add_argument('--log-file', dest='logFile', help='write communicator\'s output to FILE rather than to standard output.', metavar='FILE', default=None)
     parser.add_argument('-d', '--daemonize', help='ask daemon to detach and run as a background daemon.', action='store_true', default=False)
     parser.add_argument('--pid-file', dest='pidFile', help='writes the PID of the daemon process to PIDFILE.', metavar='PIDFILE')
+    parser.add_argument('--journal', dest='journalFile', help='append every message received from linknx to JOURNAL, along with its reception time and callback duration. The journal can be replayed with pyknxreplay.py.', metavar='JOURNAL', default=None)
+    parser.add_argument('--metrics-addr', dest='metricsAddress', help='serve callback and linknx request metrics over HTTP in the Prometheus text format on this address. This argument must specify the hostname or the ip address followed by a colon and the port. Metrics are not served by default.', default=None)
+    parser.add_argument('--rpc-addr', dest='rpcAddress', help='accept calls of user functions with request/response semantics on this address (see pyknxcall.py --rpc-addr). This argument must specify the hostname or the ip address followed by a colon and the port. RPC is disabled by default.', default=None)
+    parser.add_argument('--callback-budget', dest='callbackBudget', help='report user callbacks that run longer than SECONDS, along with the stack of the thread that executes them.', metavar='SECONDS', type=float, default=None)
+    parser.add_argument('--profile-mode', dest='profileMode', help='profiler to run during PROFILEDURATION seconds when the communicator receives the USR2 signal. Default is "cprofile".', choices=['cprofile', 'tracemalloc'], default='cprofile')
+    parser.add_argument('--profile-duration', dest='profileDuration', help='duration of the profiling window started by the USR2 signal. Default is 60 seconds.', metavar='PROFILEDURATION', type=float, default=60)
+    parser.add_argument('--profile-dir', dest='profileDirectory', help='write profiling reports to DIR. Default is the system\'s temporary directory.', metavar='DIR', default=None)
+    parser.add_argument('--write-rate', dest='writeRate', help='queue object writes and actions of user callbacks and send at most RATE of them per second to linknx, so that bursts do not saturate the KNX bus. Writes are sent immediately by default.', metavar='RATE', type=float, default=None)
+    parser.add_argument('--write-burst', dest='writeBurst', help='number of writes that can be sent at once after a quiet period when --write-rate is set. Default is 5.', metavar='COUNT', type=float, default=5)
+    parser.add_argument('--line-rate', dest='lineRate', help='when --write-rate is set, also send at most LINERATE writes per second to each line of group addresses. Lines are not limited by default.', metavar='LINERATE', type=float, default=None)
+    parser.add_argument('--line-burst', dest='lineBurst', help='number of writes that can be sent at once to a line after a quiet period. Default is LINERATE.', metavar='COUNT', type=float, default=None)
+    parser.add_argument('--write-priority', dest='writePriorityRules', help='when --write-rate is set, send writes to objects whose id matches REGEX with PRIORITY, one of "high", "normal" or "low". Can be repeated, the first matching REGEX wins. Writes are "normal" by default.', metavar=('REGEX', 'PRIORITY'), nargs=2, action='append', default=[])
+    parser.add_argument('--change-only', dest='changeOnlyCallbacks', help='only call the user function CALLBACK when the value of its object has changed since its previous call. Linknx calls it on every write otherwise. Can be repeated. Use "*" for all functions.', metavar='CALLBACK', action='append', default=None)
     parser.add_argument('-v', '--verbose', dest='verbosityLevel', help='set verbosity level. Default is "error".', metavar='LEVEL', choices=[l.lower() for l in logger.getLevelsToString()], default='error')
     return parser
 
@@ -60,9 +73,13 @@ if __name__ == '__main__':
     logger.initLogger(None, args.verbosityLevel.upper())
 
     args.communicatorAddress = parseAddress(args.communicatorAddress, 'communicator address')
+    if args.metricsAddress:
+        args.metricsAddress = parseAddress(args.metricsAddress, 'metrics address')
+    if args.rpcAddress:
+        args.rpcAddress = parseAddress(args.rpcAddress, 'RPC address')
 
     try:
-        Communicator.run(args.linknxAddress, args.userFile, args.communicatorAddress, logFile=args.logFile, verbosityLevel=args.verbosityLevel, daemonizes=args.daemonize, pidFile=args.pidFile)
+        Communicator.run(args.linknxAddress, args.userFile, args.communicatorAddress, logFile=args.logFile, verbosityLevel=args.verbosityLevel, daemonizes=args.daemonize, pidFile=args.pidFile, journalFile=args.journalFile, metricsAddress=args.metricsAddress, callbackBudget=args.callbackBudget, profileMode=args.profileMode, profileDuration=args.profileDuration, profileDirectory=args.profileDirectory, rpcAddress=args.rpcAddress, writeRate=args.writeRate, changeOnlyCallbacks=args.changeOnlyCallbacks, writeBurst=args.writeBurst, lineRate=args.lineRate, lineBurst=args.lineBurst, writePriorityRules=args.writePriorityRules)
     except SystemExit:
         # This is a normal exit.
         pass
@@ -24,10 +24,11 @@
 Modifies an XML config for Linknx so that it allows for communication with an instance of pyknxcommunicator.py
 This script adds an ioport and a rule for each object that holds a callback attribute in the source XML.
 It always starts by cleaning any autogenerated rule from the input file and generates new ones unless the --clean option is passed.
+With the --incremental option, only the rules that differ from what callback attributes imply are touched.
 Source XML configuration is read from standard input unless the -i option is set.
 """
 
-from pyknx.configurator import Configurator
+from pyknx.configurator import Configurator, StreamingConfigurator
 import argparse
 import getopt
 import sys
@@ -47,6 +48,11 @@ def makeArgumentParser(description):
     parser.add_argument('-c', '--comm-addr', dest='communicatorAddress', help='Address of the communicator. This argument must specify the hostname or the ip address followed by a colon and the port to listen on. Default is "localhost:1029"', default='localhost:1029')
     parser.add_argument('-n', '--comm-name', dest='communicatorName', help='Name of the communicator. Used to build the name of callback attributes on object definitions, to prefix name of rules generated by this script and to name the ioport service. Default is "pyknx" which leads to an ioport "pyknx" and callback attributes "pyknxcallback". This option is useful when several communicators have to connect to the same linknx instance without interfering with each other.', default='pyknx')
     parser.add_argument('--clean', help='Clean rules that were generated by this script but do not generate new rules.', action='store_true')
+    parser.add_argument('--incremental', help='Only add, remove or replace the rules and the ioport that differ from what callback attributes imply, and report these changes on standard error. The output file is not written if it is already up to date, which avoids needlessly restarting linknx.', action='store_true')
+    parser.add_argument('--streaming', help='Process the configuration as a stream rather than loading it in memory. This is much faster and lighter on very large configurations. Cannot be combined with --incremental.', action='store_true')
+    parser.add_argument('--rule-strategy', dest='ruleStrategy', help='Strategy used to generate rules. "per-object" generates one rule per object that has a callback. "grouped" generates one rule per callback and per group of objects, which reduces the number of rules linknx has to handle but only calls callbacks when values actually change. Objects whose values are strings keep a rule of their own. Default is "per-object".', choices=Configurator.RULE_STRATEGIES, default='per-object')
+    parser.add_argument('--group-size', dest='maxGroupSize', help='Maximum number of objects per rule with the "grouped" rule strategy. Default is 50.', metavar='SIZE', type=int, default=50)
+    parser.add_argument('--embed-values', dest='embedsValues', help='Make per-object rules send the new value of the object along with the event, so that callbacks can use context.value instead of reading the object from linknx. String objects are not concerned.', action='store_true')
     parser.add_argument('-v', '--verbose', dest='verbosityLevel', help='set verbosity level. Default is "warning".', metavar='LEVEL', choices=[l.lower() for l in logger.getLevelsToString()], default='warning')
     return parser
 
@@ -59,11 +65,23 @@ if __name__ == '__main__':
 
     args.communicatorAddress = parseAddress(args.communicatorAddress, 'communicator address')
 
+    if args.streaming and args.incremental:
+        parser.error('--streaming and --incremental cannot be combined.')
+
     # Start configurator.
-    configurator = Configurator(args.linknxConfig, args.outputFile, args.communicatorAddress, args.communicatorName)
+    if args.streaming:
+        configurator = StreamingConfigurator(args.linknxConfig, args.outputFile, args.communicatorAddress, args.communicatorName, args.ruleStrategy, args.maxGroupSize, args.embedsValues)
+        configurator.process(cleansOnly=args.clean)
+    else:
+        configurator = Configurator(args.linknxConfig, args.outputFile, args.communicatorAddress, args.communicatorName, args.ruleStrategy, args.maxGroupSize, args.embedsValues)
 
-    # Generate config.
-    configurator.cleanConfig()
-    if not args.clean:
-        configurator.generateConfig()
-    configurator.writeConfig()
+        # Generate config.
+        if args.incremental:
+            diff = configurator.updateConfig(cleansOnly=args.clean)
+            sys.stderr.write(str(diff) + '\n')
+            configurator.writeConfig(skipsIfUnchanged=True)
+        else:
+            configurator.cleanConfig()
+            if not args.clean:
+                configurator.generateConfig()
+            configurator.writeConfig()
@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2012-2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+"""
+Replays a journal recorded by pyknxcommunicator.py (see its --journal option) against a running communicator.
+Messages are sent the same way linknx does, with their original timing unless a speed factor is given. This is useful to reproduce event storms offline and to benchmark user scripts.
+"""
+
+import argparse
+import sys
+from pyknx import logger
+from pyknx.journal import JournalPlayer
+
+def parseAddress(addrStr, option):
+    ix = addrStr.find(':')
+    if ix < 0:
+        raise Exception('Malformed value for ' + option +'. Expecting a tuple (hostname:port)')
+    return (addrStr[0:ix], int(addrStr[ix + 1:]))
+
+def makeArgumentParser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('journalFile', help='replay the messages recorded in JOURNAL.', metavar='JOURNAL')
+    parser.add_argument('-c', '--comm-addr', dest='communicatorAddress', help='Address of the communicator. This argument must specify the hostname or the ip address followed by a colon and the port. Default is "localhost:1029"', default='localhost:1029')
+    parser.add_argument('--speed', help='replay SPEED times faster than recorded. Default is 1 (original timing). 0 sends messages as fast as possible.', metavar='SPEED', type=float, default=1.0)
+    parser.add_argument('-v', '--verbose', dest='verbosityLevel', help='set verbosity level. Default is "info".', metavar='LEVEL', choices=[l.lower() for l in logger.getLevelsToString()], default='info')
+    return parser
+
+if __name__ == '__main__':
+    parser = makeArgumentParser(__doc__)
+    args = parser.parse_args()
+
+    # Configure logger.
+    logger.initLogger(None, args.verbosityLevel.upper(), usesDetailedLogging=False)
+
+    try:
+        player = JournalPlayer(args.journalFile, parseAddress(args.communicatorAddress, 'communicator address'), args.speed)
+        player.play()
+        logger.reportInfo('Callbacks took {0:.3f}s when recorded.'.format(player.recordedCallbackDuration))
+        if player.failedCount: sys.exit(5)
+    except SystemExit:
+        raise
+    except:
+        logger.reportException()
+        sys.exit(3)
@@ -0,0 +1,99 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2012-2014 Cyrille Defranoux
+#
+# This file is part of Pyknx.
+#
+# Pyknx is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pyknx is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pyknx. If not, see <http://www.gnu.org/licenses/>.
+#
+# For any question, feature requests or bug reports, feel free to contact me at:
+# knx at aminate dot net
+
+
+"""
+Sends a storm of events to a running communicator, the way linknx does when objects change, to measure how many events per second the
+communicator and its user script can absorb. Reports the number of accepted and failed messages and the latency percentiles.
+"""
+
+import argparse
+import sys
+import json
+from pyknx import logger
+from pyknx.eventstorm import EventStorm, readTargets, DISTRIBUTIONS, SHAPES
+
+def parseAddress(addrStr, option):
+    ix = addrStr.find(':')
+    if ix < 0:
+        raise Exception('Malformed value for ' + option +'. Expecting a tuple (hostname:port)')
+    return (addrStr[0:ix], int(addrStr[ix + 1:]))
+
+def parseTarget(targetStr):
+    ix = targetStr.find(':')
+    if ix < 0:
+        raise Exception('Malformed target {0}. Expecting CALLBACK:OBJECTID'.format(targetStr))
+    return (targetStr[0:ix], targetStr[ix + 1:])
+
+def makeArgumentParser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('targets', help='send messages for these objects, given as CALLBACK:OBJECTID, e.g. onLightChanged:KitchenLight.', metavar='TARGET', nargs='*')
+    parser.add_argument('-c', '--comm-addr', dest='communicatorAddress', help='Address of the communicator. This argument must specify the hostname or the ip address followed by a colon and the port. Default is "localhost:1029"', default='localhost:1029')
+    parser.add_argument('-f', '--config', dest='configFile', help='send messages for all objects that have a callback in the linknx configuration FILE.', metavar='FILE', default=None)
+    parser.add_argument('--comm-name', dest='communicatorName', help='name of the communicator in the configuration given with --config. Default is "pyknx".', default='pyknx')
+    parser.add_argument('-r', '--rate', help='average number of messages per second. 0 sends as fast as possible. Default is 100.', type=float, default=100.0)
+    parser.add_argument('-j', '--concurrency', help='maximum number of messages being sent at the same time. Default is 4.', type=int, default=4)
+    parser.add_argument('-n', '--count', dest='eventCount', help='number of messages to send. Default is 1000 unless --duration is given.', type=int, default=None)
+    parser.add_argument('-d', '--duration', help='send messages during SECONDS.', metavar='SECONDS', type=float, default=None)
+    parser.add_argument('--distribution', help='how objects are picked. Default is "uniform".', choices=DISTRIBUTIONS, default='uniform')
+    parser.add_argument('--zipf-exponent', dest='zipfExponent', help='exponent of the zipf distribution. Default is 1.', type=float, default=1.0)
+    parser.add_argument('--shape', help='how messages are spread over time. Default is "constant".', choices=SHAPES, default='constant')
+    parser.add_argument('--burst-size', dest='burstSize', help='number of messages per burst with --shape burst. Default is 10.', type=int, default=10)
+    parser.add_argument('--timeout', help='time to wait for the communicator to process a message, in seconds. Default is 5.', type=float, default=5.0)
+    parser.add_argument('--seed', help='seed of the random generator, for reproducible storms.', type=int, default=None)
+    parser.add_argument('--json', dest='outputsJson', help='output statistics in the JSON format.', action='store_true', default=False)
+    parser.add_argument('-v', '--verbose', dest='verbosityLevel', help='set verbosity level. Default is "error".', metavar='LEVEL', choices=[l.lower() for l in logger.getLevelsToString()], default='error')
+    return parser
+
+if __name__ == '__main__':
+    parser = makeArgumentParser(__doc__)
+    args = parser.parse_args()
+
+    # Configure logger.
+    logger.initLogger(None, args.verbosityLevel.upper(), usesDetailedLogging=False)
+
+    try:
+        targets = [parseTarget(target) for target in args.targets]
+        if args.configFile:
+            targets.extend(readTargets(args.configFile, args.communicatorName))
+        if not targets:
+            parser.error('No target: give at least one TARGET or a configuration file with callbacks.')
+        if args.eventCount is None and args.duration is None:
+            args.eventCount = 1000
+
+        storm = EventStorm(parseAddress(args.communicatorAddress, 'communicator address'), targets, rate=args.rate, concurrency=args.concurrency, distribution=args.distribution, zipfExponent=args.zipfExponent, shape=args.shape, burstSize=args.burstSize, timeout=args.timeout, seed=args.seed)
+        statistics = storm.run(args.eventCount, args.duration)
+        if args.outputsJson:
+            print(json.dumps(statistics.toDict(), indent=2, sort_keys=True))
+        else:
+            print('Sent {0} messages in {1:.3f}s: {2} accepted ({3:.1f}/s), {4} failed.'.format(statistics.sentCount, statistics.elapsed, statistics.acceptedCount, statistics.rate, statistics.failedCount))
+            for errorName, count in sorted(statistics.errors.items()):
+                print('    {0}: {1}'.format(errorName, count))
+            if statistics.latencies:
+                print('Latency (ms): p50={0:.3f} p90={1:.3f} p99={2:.3f} max={3:.3f}'.format(*[statistics.getLatencyPercentile(p) * 1000 for p in (50, 90, 99, 100)]))
+            print('Maximum sending lag: {0:.3f}s'.format(statistics.maxLag))
+        if statistics.failedCount: sys.exit(5)
+    except SystemExit:
+        raise
+    except:
+        logger.reportException()
+        sys.exit(3)
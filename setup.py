@@ -40,4 +40,4 @@ setup(name='pyknx',
       url='https://github.com/2franix/pyknx/',
       packages=['pyknx'],
       data_files=[('.', ['README', 'README.md'])],
-      scripts=['pyknxcommunicator.py', 'pyknxcall.py', 'pyknxread.py', 'pyknxwrite.py', 'pyknxexecute.py', 'pyknxclient.py', 'pyknxconf.py', 'pyknxversion.py'])
+      scripts=['pyknxcommunicator.py', 'pyknxcall.py', 'pyknxread.py', 'pyknxwrite.py', 'pyknxexecute.py', 'pyknxclient.py', 'pyknxconf.py', 'pyknxversion.py', 'pyknxreplay.py', 'pyknxbatch.py', 'pyknxclientdaemon.py', 'pyknxstorm.py', 'pyknxsnapshot.py', 'pyknxrestore.py'])